@@ -25,6 +25,113 @@ RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))
 # Security Configuration
 BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
 
+# Chat Pipeline Configuration
+# Worker threads used to overlap chat DB round trips with the model call
+CHAT_IO_WORKERS = int(os.getenv("CHAT_IO_WORKERS", "8"))
+# Return the reply before the bot message row is written (bot_message.id is then null)
+CHAT_ASYNC_BOT_PERSIST = os.getenv("CHAT_ASYNC_BOT_PERSIST", "false").lower() == "true"
+# Prompt context: token budget for summary + recent turns, summary size, messages considered
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+CHAT_CONTEXT_SUMMARY_TOKENS = int(os.getenv("CHAT_CONTEXT_SUMMARY_TOKENS", "400"))
+CHAT_CONTEXT_MAX_MESSAGES = int(os.getenv("CHAT_CONTEXT_MAX_MESSAGES", "50"))
+# Most messages accepted by one offline sync request
+CHAT_SYNC_MAX_MESSAGES = int(os.getenv("CHAT_SYNC_MAX_MESSAGES", "500"))
+
+# Chat message write-behind (database.chat_write_behind)
+# Queue message inserts and flush them in batches instead of one transaction per message
+CHAT_WRITE_BEHIND_ENABLED = os.getenv("CHAT_WRITE_BEHIND_ENABLED", "false").lower() == "true"
+# Seconds between flushes; a flush also starts once CHAT_WRITE_BEHIND_BATCH_SIZE messages wait
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", "0.2"))
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", "500"))
+# Failed flushes of the same batch before it is retried message by message
+CHAT_WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("CHAT_WRITE_BEHIND_MAX_ATTEMPTS", "3"))
+
+# Chat message storage maintenance (database.chat_archive)
+# Move messages of sessions idle for CHAT_ARCHIVE_IDLE_DAYS into chat_messages_archive
+CHAT_ARCHIVE_ENABLED = os.getenv("CHAT_ARCHIVE_ENABLED", "false").lower() == "true"
+CHAT_ARCHIVE_IDLE_DAYS = int(os.getenv("CHAT_ARCHIVE_IDLE_DAYS", "90"))
+# Seconds between archive runs
+CHAT_ARCHIVE_INTERVAL = int(os.getenv("CHAT_ARCHIVE_INTERVAL", "3600"))
+# Rows per batch; well under SQL Server's 5000-lock escalation threshold
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "500"))
+# Convert chat_messages.content from TEXT to NVARCHAR(MAX) on the maintenance thread
+CHAT_CONTENT_MIGRATION_ENABLED = os.getenv("CHAT_CONTENT_MIGRATION_ENABLED", "false").lower() == "true"
+# Pause between batches so the mover yields to foreground traffic
+CHAT_MAINTENANCE_BATCH_PAUSE = float(os.getenv("CHAT_MAINTENANCE_BATCH_PAUSE", "0.1"))
+
+# Notification push channel (/notifications/ws)
+# Set to share events between workers, e.g. redis://localhost:6379/0
+NOTIFICATIONS_REDIS_URL = os.getenv("NOTIFICATIONS_REDIS_URL") or None
+# Events buffered per socket before a slow client starts missing them
+NOTIFICATIONS_WS_QUEUE_SIZE = int(os.getenv("NOTIFICATIONS_WS_QUEUE_SIZE", "100"))
+# Seconds between repairs of drifted per-user notification counters (0 disables)
+NOTIFICATION_COUNTER_RECONCILE_INTERVAL = int(os.getenv("NOTIFICATION_COUNTER_RECONCILE_INTERVAL", "3600"))
+# Users per transaction when one notification is sent to many users; well under
+# SQL Server's 5000-lock escalation threshold once index and counter locks are counted
+NOTIFICATION_FANOUT_BATCH_SIZE = int(os.getenv("NOTIFICATION_FANOUT_BATCH_SIZE", "1000"))
+# Days deletions are remembered for /notifications/changes; older cursors must reload
+NOTIFICATION_TOMBSTONE_DAYS = int(os.getenv("NOTIFICATION_TOMBSTONE_DAYS", "14"))
+# Most changes returned by one /notifications/changes call
+NOTIFICATION_CHANGES_LIMIT = int(os.getenv("NOTIFICATION_CHANGES_LIMIT", "200"))
+# Rows per transaction for bulk mark-read/delete (mark all, clear all, /notifications/bulk)
+NOTIFICATION_BULK_CHUNK_SIZE = int(os.getenv("NOTIFICATION_BULK_CHUNK_SIZE", "500"))
+# Seconds the admin notification stats are reused before they are recomputed
+NOTIFICATION_STATS_CACHE_TTL = int(os.getenv("NOTIFICATION_STATS_CACHE_TTL", "60"))
+# Seconds during which report alerts for the same disaster type and location are merged (0 disables)
+NOTIFICATION_DIGEST_WINDOW = int(os.getenv("NOTIFICATION_DIGEST_WINDOW", "900"))
+# How often closed digest windows are checked for a digest email
+NOTIFICATION_DIGEST_FLUSH_INTERVAL = int(os.getenv("NOTIFICATION_DIGEST_FLUSH_INTERVAL", "60"))
+# Retention: delete notifications once they are older than their type's limit
+NOTIFICATION_RETENTION_ENABLED = os.getenv("NOTIFICATION_RETENTION_ENABLED", "false").lower() == "true"
+# Days kept for types not listed below (0 keeps them forever)
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "180"))
+# Per-type overrides, e.g. "success:30,info:90,danger:365"
+NOTIFICATION_RETENTION_BY_TYPE = {
+    name.strip(): int(days)
+    for name, days in (
+        rule.split(":", 1) for rule in os.getenv("NOTIFICATION_RETENTION_BY_TYPE", "").split(",") if ":" in rule
+    )
+}
+# Rows per purge batch; well under SQL Server's 5000-lock escalation threshold
+NOTIFICATION_PURGE_BATCH_SIZE = int(os.getenv("NOTIFICATION_PURGE_BATCH_SIZE", "1000"))
+# Pause between batches so the purge yields to foreground traffic
+NOTIFICATION_PURGE_BATCH_PAUSE = float(os.getenv("NOTIFICATION_PURGE_BATCH_PAUSE", "0.1"))
+NOTIFICATION_PURGE_INTERVAL = int(os.getenv("NOTIFICATION_PURGE_INTERVAL", "3600"))
+
+# Local Whisper Transcription Configuration
+# Model sizes kept loaded in each worker (the first is the default)
+WHISPER_MODELS = [m.strip() for m in os.getenv("WHISPER_MODELS", "base").split(",") if m.strip()]
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", "2"))
+# Jobs allowed in flight (running + queued) before requests are turned away
+WHISPER_MAX_QUEUE = int(os.getenv("WHISPER_MAX_QUEUE", "8"))
+# Load models when the app starts instead of on the first request
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "false").lower() == "true"
+
+# Audio uploads for transcription
+TRANSCRIBE_MAX_UPLOAD_MB = int(os.getenv("TRANSCRIBE_MAX_UPLOAD_MB", "25"))
+# Where uploads are staged for local Whisper (defaults to the system temp dir)
+TRANSCRIBE_TEMP_DIR = os.getenv("TRANSCRIBE_TEMP_DIR") or None
+# Decode/resample/trim audio before transcription (utils.audio_preprocess)
+TRANSCRIBE_PREPROCESS = os.getenv("TRANSCRIBE_PREPROCESS", "true").lower() == "true"
+# Longer recordings are sent unprocessed; bounds decoded samples to 64 KB per second
+TRANSCRIBE_PREPROCESS_MAX_SECONDS = int(os.getenv("TRANSCRIBE_PREPROCESS_MAX_SECONDS", "1800"))
+# Frames quieter than this (dBFS) never count as speech
+TRANSCRIBE_VAD_THRESHOLD_DB = float(os.getenv("TRANSCRIBE_VAD_THRESHOLD_DB", "-50"))
+# Audio kept either side of the detected speech
+TRANSCRIBE_VAD_PAD_MS = int(os.getenv("TRANSCRIBE_VAD_PAD_MS", "300"))
+# Long recordings are split at silence into ~N second chunks transcribed in parallel
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_SECONDS", "30"))
+TRANSCRIBE_CHUNK_OVERLAP_SECONDS = float(os.getenv("TRANSCRIBE_CHUNK_OVERLAP_SECONDS", "1.0"))
+# Concurrent OpenAI API calls per chunked recording
+TRANSCRIBE_API_CONCURRENCY = int(os.getenv("TRANSCRIBE_API_CONCURRENCY", "4"))
+# Transcription results cached by audio hash + language + method
+TRANSCRIBE_CACHE_SIZE = int(os.getenv("TRANSCRIBE_CACHE_SIZE", "256"))
+TRANSCRIBE_CACHE_TTL = int(os.getenv("TRANSCRIBE_CACHE_TTL", "86400"))
+# Background transcription jobs (POST /transcribe/jobs)
+TRANSCRIBE_JOB_WORKERS = int(os.getenv("TRANSCRIBE_JOB_WORKERS", "4"))
+TRANSCRIBE_MAX_PENDING_JOBS = int(os.getenv("TRANSCRIBE_MAX_PENDING_JOBS", "32"))
+TRANSCRIBE_JOB_TTL = int(os.getenv("TRANSCRIBE_JOB_TTL", "3600"))
+
 # OpenAI Assistant API Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
@@ -2,6 +2,8 @@
 from .connection import DatabaseConnection, get_connection_pool, get_db_conn, format_timestamp
 from .reports import *
 from .chat import *
+from .chat_write_behind import shutdown_chat_write_behind, get_chat_write_behind_stats
+from .chat_archive import start_chat_maintenance, stop_chat_maintenance
 from .users import *
 from .admin import *
 from .faq import *
@@ -30,12 +32,22 @@ __all__ = [
     # Chat functions
     'create_chat_session',
     'get_user_chat_sessions',
+    'get_user_chat_sessions_page',
+    'make_session_cursor',
+    'parse_session_cursor',
     'get_chat_session', 
     'save_chat_message',
     'get_chat_messages',
+    'get_chat_messages_page',
+    'search_chat_messages',
+    'sync_chat_messages',
     'update_chat_session_title',
     'delete_chat_session',
     'create_chat_tables',
+    'shutdown_chat_write_behind',
+    'get_chat_write_behind_stats',
+    'start_chat_maintenance',
+    'stop_chat_maintenance',
     
     # User functions
     'update_users_table',
@@ -1,6 +1,90 @@
 from datetime import datetime
 from .connection import DatabaseConnection, format_timestamp
+from .chat_write_behind import get_chat_write_behind
 import json
+import re
+
+# Length of the denormalized last-message snippet kept on chat_sessions
+LAST_MESSAGE_PREVIEW_LENGTH = 200
+
+def make_message_preview(content):
+    """Collapse whitespace and truncate message content for session summaries"""
+    return " ".join((content or "").split())[:LAST_MESSAGE_PREVIEW_LENGTH]
+
+# Full-text catalog holding the chat_messages.content index used by search
+CHAT_SEARCH_CATALOG = "chat_search_catalog"
+# Characters of context shown on each side of the first match in a search snippet
+SEARCH_SNIPPET_RADIUS = 60
+MAX_SEARCH_TERMS = 8
+
+def tokenize_search_query(query):
+    """Split a search query into lowercase word tokens.
+    
+    Word characters are Unicode-aware, so English and Malay (including
+    hyphen-free affixed forms like "kebanjiran") tokenize the same way the
+    neutral full-text word breaker splits stored messages.
+    """
+    return re.findall(r"\w+", (query or "").lower())[:MAX_SEARCH_TERMS]
+
+def make_search_snippet(content, terms):
+    """Cut a snippet of content around the first word starting with one of the terms"""
+    text = " ".join((content or "").split())
+    match = None
+    for term in terms:
+        found = re.search(r"\b" + re.escape(term), text, re.IGNORECASE)
+        if found and (match is None or found.start() < match.start()):
+            match = found
+    if match is None:
+        return text[:SEARCH_SNIPPET_RADIUS * 2]
+    start = max(0, match.start() - SEARCH_SNIPPET_RADIUS)
+    end = min(len(text), match.end() + SEARCH_SNIPPET_RADIUS)
+    return ("..." if start > 0 else "") + text[start:end] + ("..." if end < len(text) else "")
+
+# chat_session_counters keeps each user's active session count, so the
+# session list total is a primary-key lookup instead of a COUNT(*) per page.
+# Session creation and deletion adjust it in their own transaction; a missing
+# row is seeded from the real count, so existing users need no backfill.
+
+def _ensure_session_counter(cursor, user_id):
+    """Create the user's session counter from the current count if missing, and lock it"""
+    cursor.execute("""
+        IF NOT EXISTS (SELECT 1 FROM chat_session_counters WITH (UPDLOCK, HOLDLOCK) WHERE user_id = ?)
+            INSERT INTO chat_session_counters (user_id, active_sessions)
+            SELECT ?, COUNT(*) FROM chat_sessions WHERE user_id = ? AND is_active = 1
+    """, (user_id, user_id, user_id))
+
+def _bump_session_counter(cursor, user_id, delta):
+    cursor.execute("""
+        UPDATE chat_session_counters
+        SET active_sessions = CASE WHEN active_sessions + ? < 0 THEN 0 ELSE active_sessions + ? END
+        WHERE user_id = ?
+    """, (delta, delta, user_id))
+
+def _read_session_counter(cursor, user_id):
+    """Return the user's active session count, seeding the counter on first use"""
+    cursor.execute("SELECT active_sessions FROM chat_session_counters WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    _ensure_session_counter(cursor, user_id)
+    cursor.execute("SELECT active_sessions FROM chat_session_counters WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def make_session_cursor(updated_at, session_id):
+    """Opaque keyset cursor for a session list position: the session's (updated_at, id) when it was read"""
+    if updated_at is None:
+        return None
+    return f"{updated_at.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}_{int(session_id)}"
+
+def parse_session_cursor(cursor):
+    """Return (updated_at string, id) from a session cursor; ValueError if it is malformed"""
+    try:
+        updated_at, session_id = cursor.split("_")
+        datetime.strptime(updated_at, "%Y-%m-%dT%H:%M:%S.%f")
+        return updated_at, int(session_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid session cursor: {cursor!r}")
 
 def create_chat_session(user_id, title=None, ai_provider="openai"):
     """Create a new chat session for a user"""
@@ -12,15 +96,22 @@ def create_chat_session(user_id, title=None, ai_provider="openai"):
             if not title:
                 title = f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}"
             
-            cursor.execute("""
-                INSERT INTO chat_sessions (user_id, title, ai_provider) 
-                OUTPUT INSERTED.id, INSERTED.title, INSERTED.ai_provider, INSERTED.created_at, INSERTED.updated_at
-                VALUES (?, ?, ?)
-            """, (user_id, title, ai_provider))
-            
-            row = cursor.fetchone()
-            if not conn.autocommit:
+            try:
+                conn.autocommit = False
+                _ensure_session_counter(cursor, user_id)
+                cursor.execute("""
+                    INSERT INTO chat_sessions (user_id, title, ai_provider) 
+                    OUTPUT INSERTED.id, INSERTED.title, INSERTED.ai_provider, INSERTED.created_at, INSERTED.updated_at
+                    VALUES (?, ?, ?)
+                """, (user_id, title, ai_provider))
+                row = cursor.fetchone()
+                _bump_session_counter(cursor, user_id, 1)
                 conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
             cursor.close()
             
             return {
@@ -30,48 +121,98 @@ def create_chat_session(user_id, title=None, ai_provider="openai"):
                 "ai_provider": row[2],
                 "created_at": format_timestamp(row[3]),
                 "updated_at": format_timestamp(row[4]),
-                "is_active": True
+                "is_active": True,
+                "message_count": 0,
+                "last_message_at": "",
+                "last_message_preview": ""
             }
             
     except Exception as e:
         print(f"Error creating chat session: {e}")
         raise
 
-def get_user_chat_sessions(user_id, limit=20, offset=0):
+def get_user_chat_sessions(user_id, limit=20, offset=0, before=None, after=None):
     """Get user's chat sessions with pagination"""
+    return get_user_chat_sessions_page(user_id, limit, offset, before, after)["sessions"]
+
+def get_user_chat_sessions_page(user_id, limit=20, offset=0, before=None, after=None):
+    """Get a page of a user's chat sessions (most recently updated first).
+    
+    ``before`` / ``after`` are (updated_at, id) positions from
+    parse_session_cursor and switch to keyset pagination: sessions older /
+    newer than that position are returned, seeking
+    IX_chat_sessions_user_active_updated instead of skipping ``offset`` rows.
+    Each page returns ``next_before`` (its oldest row) and ``next_after``
+    (its newest row) as cursors.
+    
+    updated_at changes with every message, so the order drifts while a
+    client pages. The cursor carries the position itself, so it stays
+    valid when its session moves or is deleted; a session updated in the
+    meantime rises above the first page and is picked up with
+    ``after=next_after`` rather than repeated or reordered in older pages.
+    """
     try:
         with DatabaseConnection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
-                SELECT id, title, ai_provider, metadata, created_at, updated_at, is_active
-                FROM chat_sessions 
-                WHERE user_id = ? AND is_active = 1
-                ORDER BY updated_at DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """, (user_id, offset, limit))
+            # Every column is in IX_chat_sessions_user_active_updated, so a page is
+            # a single covering index seek with no aggregate over chat_messages
+            columns = ("s.id, s.title, s.ai_provider, s.created_at, s.updated_at, s.is_active, "
+                       "s.message_count, s.last_message_at, s.last_message_preview")
+            if before is not None or after is not None:
+                newer = after is not None
+                position_at, position_id = after if newer else before
+                cursor.execute(f"""
+                    SELECT TOP (?) {columns}
+                    FROM chat_sessions s
+                    WHERE s.user_id = ? AND s.is_active = 1
+                      AND (s.updated_at {'>' if newer else '<'} CAST(? AS DATETIME)
+                           OR (s.updated_at = CAST(? AS DATETIME) AND s.id {'>' if newer else '<'} ?))
+                    ORDER BY s.updated_at {'ASC' if newer else 'DESC'}, s.id {'ASC' if newer else 'DESC'}
+                """, (limit + 1, user_id, position_at, position_at, position_id))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                # Newer pages are read in ascending order; present them newest first
+                if newer:
+                    rows = list(reversed(rows))
+            else:
+                cursor.execute(f"""
+                    SELECT {columns}
+                    FROM chat_sessions s
+                    WHERE s.user_id = ? AND s.is_active = 1
+                    ORDER BY s.updated_at DESC, s.id DESC
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                """, (user_id, offset, limit + 1))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
             
             sessions = []
-            for row in cursor.fetchall():
-                metadata = {}
-                if row[3]:  # metadata column
-                    try:
-                        metadata = json.loads(row[3])
-                    except:
-                        pass
-                
+            for row in rows:
                 sessions.append({
                     "id": row[0],
                     "title": row[1],
                     "ai_provider": row[2],
-                    "metadata": metadata,
-                    "created_at": format_timestamp(row[4]),
-                    "updated_at": format_timestamp(row[5]),
-                    "is_active": bool(row[6])
+                    "created_at": format_timestamp(row[3]),
+                    "updated_at": format_timestamp(row[4]),
+                    "is_active": bool(row[5]),
+                    "message_count": row[6] or 0,
+                    "last_message_at": format_timestamp(row[7]),
+                    "last_message_preview": row[8] or ""
                 })
             
+            # The total comes from the counter row, not a COUNT(*) per page
+            total = _read_session_counter(cursor, user_id)
+            
             cursor.close()
-            return sessions
+            return {
+                "sessions": sessions,
+                "total": total,
+                "has_more": has_more,
+                "next_before": make_session_cursor(rows[-1][4], rows[-1][0]) if rows else None,
+                "next_after": make_session_cursor(rows[0][4], rows[0][0]) if rows else None
+            }
             
     except Exception as e:
         print(f"Error getting user chat sessions: {e}")
@@ -118,8 +259,13 @@ def get_chat_session(session_id, user_id):
         print(f"Error getting chat session: {e}")
         raise
 
-def save_chat_message(session_id, sender_type, content, message_type="text"):
-    """Save a chat message to a session"""
+def save_chat_message(session_id, sender_type, content, message_type="text", metadata=None):
+    """Save a chat message to a session (optional metadata is stored as JSON)"""
+    write_behind = get_chat_write_behind()
+    if write_behind is not None:
+        # Persisted by the next batch flush; the session is re-checked there
+        return write_behind.enqueue(session_id, sender_type, content, message_type, metadata)
+
     try:
         with DatabaseConnection() as conn:
             # Temporarily disable autocommit for transaction
@@ -133,19 +279,23 @@ def save_chat_message(session_id, sender_type, content, message_type="text"):
             
             # Insert the message
             cursor.execute("""
-                INSERT INTO chat_messages (session_id, sender_type, content, message_type)
+                INSERT INTO chat_messages (session_id, sender_type, content, message_type, metadata)
                 OUTPUT INSERTED.id, INSERTED.timestamp
-                VALUES (?, ?, ?, ?)
-            """, (session_id, sender_type, content, message_type))
+                VALUES (?, ?, ?, ?, ?)
+            """, (session_id, sender_type, content, message_type,
+                  json.dumps(metadata) if metadata else None))
             
             row = cursor.fetchone()
             
-            # Update session's updated_at timestamp
+            # Update session's updated_at timestamp and denormalized summary
             cursor.execute("""
                 UPDATE chat_sessions 
-                SET updated_at = GETDATE() 
+                SET updated_at = GETDATE(),
+                    message_count = message_count + 1,
+                    last_message_at = ?,
+                    last_message_preview = ?
                 WHERE id = ?
-            """, (session_id,))
+            """, (row[1], make_message_preview(content), session_id))
             
             conn.commit()
             conn.autocommit = True
@@ -164,35 +314,265 @@ def save_chat_message(session_id, sender_type, content, message_type="text"):
         print(f"Error saving chat message: {e}")
         raise
 
-def get_chat_messages(session_id, user_id, limit=50, offset=0, order_desc=False):
+# Rows per bulk insert statement; 5 parameters each stays under the 2100 limit
+SYNC_ROWS_PER_INSERT = 400
+
+def sync_chat_messages(user_id, items):
+    """Store a batch of client-queued user messages, possibly across sessions.
+    
+    ``items`` are dicts with ``client_id``, ``session_id``, ``content`` and
+    optional ``message_type``. Session ownership is checked once per
+    session, new messages are inserted in bulk (in request order) and a
+    client_id already stored for that session is reported as a duplicate
+    instead of being inserted again, so replays are idempotent.
+    
+    Returns one ``{"client_id", "status", "message"}`` dict per item, where
+    status is "created", "duplicate" or "rejected".
+    """
+    if not items:
+        return []
+    
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            session_ids = sorted({item["session_id"] for item in items})
+            cursor.execute(f"""
+                SELECT id FROM chat_sessions
+                WHERE user_id = ? AND is_active = 1 AND id IN ({", ".join(["?"] * len(session_ids))})
+            """, (user_id, *session_ids))
+            owned = {row[0] for row in cursor.fetchall()}
+            
+            rejected = set()
+            to_insert = []
+            seen = set()
+            for item in items:
+                key = (item["session_id"], item["client_id"])
+                if item["session_id"] not in owned:
+                    rejected.add(key)
+                elif key not in seen:
+                    seen.add(key)
+                    to_insert.append(item)
+            
+            # Insert in request order; rows whose client id is already stored are
+            # skipped under a key-range lock so concurrent replays cannot both insert
+            inserted = {}
+            for start in range(0, len(to_insert), SYNC_ROWS_PER_INSERT):
+                chunk = to_insert[start:start + SYNC_ROWS_PER_INSERT]
+                values = ", ".join(["(?, ?, ?, ?, ?)"] * len(chunk))
+                params = []
+                for seq, item in enumerate(chunk):
+                    params.extend([seq, item["session_id"], item["client_id"], item["content"],
+                                   item.get("message_type") or "text"])
+                cursor.execute(f"""
+                    INSERT INTO chat_messages (session_id, sender_type, content, message_type, client_message_id)
+                    OUTPUT INSERTED.session_id, INSERTED.client_message_id, INSERTED.id, INSERTED.timestamp
+                    SELECT v.session_id, 'user', v.content, v.message_type, v.client_id
+                    FROM (VALUES {values}) AS v(seq, session_id, client_id, content, message_type)
+                    WHERE NOT EXISTS (SELECT 1 FROM chat_messages e WITH (UPDLOCK, HOLDLOCK)
+                                      WHERE e.session_id = v.session_id AND e.client_message_id = v.client_id)
+                      AND NOT EXISTS (SELECT 1 FROM chat_messages_archive a WITH (UPDLOCK, HOLDLOCK)
+                                      WHERE a.session_id = v.session_id AND a.client_message_id = v.client_id)
+                    ORDER BY v.seq
+                """, params)
+                for row in cursor.fetchall():
+                    inserted[(row[0], row[1])] = (row[2], row[3])
+            
+            # Replays: report the ids stored the first time (possibly archived since)
+            existing = {}
+            duplicates = [item for item in to_insert if (item["session_id"], item["client_id"]) not in inserted]
+            for start in range(0, len(duplicates), SYNC_ROWS_PER_INSERT):
+                chunk = duplicates[start:start + SYNC_ROWS_PER_INSERT]
+                conditions = " OR ".join(["(session_id = ? AND client_message_id = ?)"] * len(chunk))
+                params = []
+                for item in chunk:
+                    params.extend([item["session_id"], item["client_id"]])
+                cursor.execute(f"""
+                    SELECT session_id, client_message_id, id, timestamp FROM chat_messages
+                    WHERE {conditions}
+                    UNION ALL
+                    SELECT session_id, client_message_id, id, timestamp FROM chat_messages_archive
+                    WHERE {conditions}
+                """, params + params)
+                for row in cursor.fetchall():
+                    existing[(row[0], row[1])] = (row[2], row[3])
+            
+            # One summary update per session for the newly stored messages
+            summaries = {}
+            for item in to_insert:
+                key = (item["session_id"], item["client_id"])
+                if key in inserted:
+                    count, _, _ = summaries.get(item["session_id"], (0, None, None))
+                    summaries[item["session_id"]] = (count + 1, inserted[key][1], item["content"])
+            for session_id, (count, last_at, last_content) in summaries.items():
+                cursor.execute("""
+                    UPDATE chat_sessions
+                    SET updated_at = GETDATE(),
+                        message_count = message_count + ?,
+                        last_message_at = ?,
+                        last_message_preview = ?
+                    WHERE id = ?
+                """, (count, last_at, make_message_preview(last_content), session_id))
+            
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            
+            results = []
+            reported = set()
+            for item in items:
+                key = (item["session_id"], item["client_id"])
+                if key in rejected:
+                    status, stored = "rejected", None
+                elif key in inserted and key not in reported:
+                    status, stored = "created", inserted[key]
+                else:
+                    # Stored by an earlier request, or repeated within this batch
+                    status, stored = "duplicate", inserted.get(key) or existing.get(key)
+                reported.add(key)
+                message = None
+                if stored:
+                    message = {
+                        "id": stored[0],
+                        "session_id": item["session_id"],
+                        "sender_type": "user",
+                        "content": item["content"],
+                        "message_type": item.get("message_type") or "text",
+                        "timestamp": format_timestamp(stored[1])
+                    }
+                results.append({"client_id": item["client_id"], "status": status, "message": message})
+            return results
+            
+    except Exception as e:
+        print(f"Error syncing chat messages: {e}")
+        raise
+
+def get_chat_messages(session_id, user_id, limit=50, offset=0, order_desc=False, before_id=None, after_id=None):
     """Get messages for a chat session"""
+    return get_chat_messages_page(session_id, user_id, limit, offset, order_desc, before_id, after_id)["messages"]
+
+def get_chat_messages_page(session_id, user_id, limit=50, offset=0, order_desc=False, before_id=None, after_id=None):
+    """Get a page of messages for a chat session, always in chronological order.
+    
+    ``before_id`` returns the ``limit`` messages immediately preceding that
+    message and ``after_id`` the ones following it. Both seek
+    IX_chat_messages_session_timestamp on (session_id, timestamp, id), so
+    paging cost does not grow with the position in a long conversation.
+    ``total`` comes from the maintained chat_sessions.message_count counter.
+    
+    Sessions whose older messages were archived are read from the hot and
+    archive tables together, so callers never see the difference.
+    
+    With write-behind enabled, messages still waiting to be flushed are the
+    newest in their session and are merged in from the queue (``id`` is None
+    and ``pending`` is True for those).
+    """
+    write_behind = get_chat_write_behind()
+    if write_behind is None:
+        page = _read_chat_messages_page(session_id, user_id, limit, offset, order_desc, before_id, after_id)
+        return page or {"messages": [], "total": 0, "has_more": False}
+
+    # Retry if a flush committed during the read, so a message is never
+    # returned twice (or missed) while it moves from the queue to the table
+    for _ in range(3):
+        version = write_behind.stable_version()
+        pending = write_behind.pending_for_session(session_id)
+        db_offset, db_limit = offset, limit
+        newest_pending = []
+        if pending and order_desc and before_id is None and after_id is None:
+            # Unflushed messages fill the front of a newest-first page
+            newest_pending = pending[::-1][offset:offset + limit]
+            db_offset = max(0, offset - len(pending))
+            db_limit = limit - len(newest_pending)
+        page = _read_chat_messages_page(session_id, user_id, db_limit, db_offset, order_desc, before_id, after_id)
+        if write_behind.version == version:
+            break
+
+    if page is None:
+        return {"messages": [], "total": 0, "has_more": False}
+    if not pending:
+        return page
+
+    db_total = page["total"]
+    page["total"] = db_total + len(pending)
+    if before_id is not None:
+        # Everything pending is newer than any persisted cursor
+        return page
+    if order_desc and after_id is None:
+        page["messages"] += newest_pending[::-1]
+        page["has_more"] = page["has_more"] or len(pending) > offset + limit
+        return page
+    if not page["has_more"]:
+        start = 0 if after_id is not None else max(0, offset - db_total)
+        room = limit - len(page["messages"])
+        page["messages"] += pending[start:start + room]
+        page["has_more"] = len(pending) > start + room
+    return page
+
+def _read_chat_messages_page(session_id, user_id, limit, offset, order_desc, before_id, after_id):
+    """Read a page of persisted messages; None if the session is not the user's"""
     try:
         with DatabaseConnection() as conn:
             cursor = conn.cursor()
             
             # First verify the session belongs to the user
-            cursor.execute("SELECT id FROM chat_sessions WHERE id = ? AND user_id = ? AND is_active = 1", (session_id, user_id))
-            if not cursor.fetchone():
+            cursor.execute("""
+                SELECT message_count, archived_at FROM chat_sessions
+                WHERE id = ? AND user_id = ? AND is_active = 1
+            """, (session_id, user_id))
+            session_row = cursor.fetchone()
+            if not session_row:
                 cursor.close()
-                return []
+                return None
             
-            # Get messages
-            order_clause = "ORDER BY timestamp DESC" if order_desc else "ORDER BY timestamp ASC"
-            cursor.execute(f"""
-                SELECT id, sender_type, content, message_type, timestamp
-                FROM chat_messages 
-                WHERE session_id = ?
-                {order_clause}
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-            """, (session_id, offset, limit))
+            columns = "m.id, m.sender_type, m.content, m.message_type, m.timestamp"
+            source, source_params = "chat_messages", ()
+            if session_row[1] is not None:
+                source = """(
+                    SELECT id, session_id, sender_type, content, message_type, timestamp
+                    FROM chat_messages WHERE session_id = ?
+                    UNION ALL
+                    SELECT id, session_id, sender_type, CAST(DECOMPRESS(content_compressed) AS NVARCHAR(MAX)),
+                           message_type, timestamp
+                    FROM chat_messages_archive WHERE session_id = ?
+                )"""
+                source_params = (session_id, session_id)
+            if before_id is not None or after_id is not None:
+                newer = after_id is not None
+                cursor.execute(f"""
+                    SELECT TOP (?) {columns}
+                    FROM {source} m
+                    INNER JOIN {source} c ON c.id = ? AND c.session_id = m.session_id
+                    WHERE m.session_id = ?
+                      AND (m.timestamp {'>' if newer else '<'} c.timestamp
+                           OR (m.timestamp = c.timestamp AND m.id {'>' if newer else '<'} c.id))
+                    ORDER BY m.timestamp {'ASC' if newer else 'DESC'}, m.id {'ASC' if newer else 'DESC'}
+                """, (limit + 1, *source_params, *source_params, after_id if newer else before_id, session_id))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                # Older pages are read newest-first; re-order to chronological
+                if not newer:
+                    rows = list(reversed(rows))
+            else:
+                direction = "DESC" if order_desc else "ASC"
+                cursor.execute(f"""
+                    SELECT {columns}
+                    FROM {source} m
+                    WHERE m.session_id = ?
+                    ORDER BY m.timestamp {direction}, m.id {direction}
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                """, (*source_params, session_id, offset, limit + 1))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+
+                # If requesting newest-first, re-order to chronological before returning
+                if order_desc:
+                    rows = list(reversed(rows))
             
             messages = []
-            rows = cursor.fetchall()
-
-            # If requesting newest-first, re-order to chronological before returning
-            if order_desc:
-                rows = list(reversed(rows))
-
             for row in rows:
                 messages.append({
                     "id": row[0],
@@ -203,7 +583,7 @@ def get_chat_messages(session_id, user_id, limit=50, offset=0, order_desc=False)
                 })
             
             cursor.close()
-            return messages
+            return {"messages": messages, "total": session_row[0] or 0, "has_more": has_more}
             
     except Exception as e:
         print(f"Error getting chat messages: {e}")
@@ -238,18 +618,28 @@ def delete_chat_session(session_id, user_id):
         with DatabaseConnection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute("""
-                UPDATE chat_sessions 
-                SET is_active = 0, updated_at = GETDATE()
-                WHERE id = ? AND user_id = ?
-            """, (session_id, user_id))
-            
-            if not conn.autocommit:
+            try:
+                conn.autocommit = False
+                _ensure_session_counter(cursor, user_id)
+                cursor.execute("""
+                    UPDATE chat_sessions 
+                    SET is_active = 0, updated_at = GETDATE()
+                    OUTPUT DELETED.is_active
+                    WHERE id = ? AND user_id = ?
+                """, (session_id, user_id))
+                row = cursor.fetchone()
+                # Deleting an already deleted session succeeds without counting twice
+                if row and row[0]:
+                    _bump_session_counter(cursor, user_id, -1)
                 conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
             
-            result = cursor.rowcount > 0
             cursor.close()
-            return result
+            return row is not None
             
     except Exception as e:
         print(f"Error deleting chat session: {e}")
@@ -296,6 +686,151 @@ def update_session_metadata(session_id, metadata_updates):
         print(f"Error updating session metadata: {e}")
         raise
 
+# Whether chat_messages has a full-text index (checked once per process)
+_chat_fulltext_enabled = None
+
+def _has_chat_fulltext_index(cursor):
+    global _chat_fulltext_enabled
+    if _chat_fulltext_enabled is None:
+        cursor.execute("SELECT COUNT(*) FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('chat_messages')")
+        _chat_fulltext_enabled = bool(cursor.fetchone()[0])
+    return _chat_fulltext_enabled
+
+def search_chat_messages(user_id, query, limit=20, offset=0):
+    """Search the messages in a user's active sessions.
+    
+    Uses the chat_messages full-text index (CONTAINSTABLE, ranked by
+    relevance) with every query term treated as a prefix, so inflected forms
+    match in either language. Servers without Full-Text Search fall back to a
+    LIKE scan limited to the user's own sessions, newest first.
+    
+    Archived messages are stored compressed, so no index covers them: they
+    are decompressed and LIKE-matched within the user's archived sessions
+    and rank below every full-text hit.
+    
+    Returns ``{"results": [...], "total": int, "has_more": bool}``; each
+    result has the message and session ids, session title and a snippet.
+    """
+    terms = tokenize_search_query(query)
+    if not terms:
+        return {"results": [], "total": 0, "has_more": False}
+    
+    # Escape LIKE wildcards; \w tokens can only contain "_"
+    patterns = ["%" + term.replace("_", "[_]") + "%" for term in terms]
+    archived_hits = f"""
+        SELECT a.id, a.session_id, a.sender_type, a.content, a.timestamp, 0 AS rank
+        FROM chat_sessions s
+        CROSS APPLY (SELECT id, session_id, sender_type, timestamp,
+                            CAST(DECOMPRESS(content_compressed) AS NVARCHAR(MAX)) AS content
+                     FROM chat_messages_archive WHERE session_id = s.id) a
+        WHERE s.user_id = ? AND s.is_active = 1 AND s.archived_at IS NOT NULL
+          AND {" AND ".join(["a.content LIKE ?"] * len(patterns))}
+    """
+    
+    try:
+        with DatabaseConnection() as conn:
+            cursor = conn.cursor()
+            
+            if _has_chat_fulltext_index(cursor):
+                condition = " AND ".join(f'"{term}*"' for term in terms)
+                cursor.execute(f"""
+                    SELECT h.id, h.session_id, s.title, h.sender_type, h.content, h.timestamp,
+                           h.rank, COUNT(*) OVER () AS total
+                    FROM (
+                        SELECT m.id, m.session_id, m.sender_type, m.content, m.timestamp, ft.[RANK] AS rank
+                        FROM CONTAINSTABLE(chat_messages, content, ?) ft
+                        INNER JOIN chat_messages m ON m.id = ft.[KEY]
+                        UNION ALL
+                        {archived_hits}
+                    ) h
+                    INNER JOIN chat_sessions s ON s.id = h.session_id
+                    WHERE s.user_id = ? AND s.is_active = 1
+                    ORDER BY h.rank DESC, h.id DESC
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                """, (condition, user_id, *patterns, user_id, offset, limit))
+            else:
+                like_clauses = " AND ".join(["m.content LIKE ?"] * len(patterns))
+                cursor.execute(f"""
+                    SELECT h.id, h.session_id, s.title, h.sender_type, h.content, h.timestamp,
+                           0, COUNT(*) OVER () AS total
+                    FROM (
+                        SELECT m.id, m.session_id, m.sender_type, m.content, m.timestamp, 0 AS rank
+                        FROM chat_sessions s
+                        INNER JOIN chat_messages m ON m.session_id = s.id
+                        WHERE s.user_id = ? AND s.is_active = 1 AND {like_clauses}
+                        UNION ALL
+                        {archived_hits}
+                    ) h
+                    INNER JOIN chat_sessions s ON s.id = h.session_id
+                    ORDER BY h.timestamp DESC, h.id DESC
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                """, (user_id, *patterns, user_id, *patterns, offset, limit))
+            
+            rows = cursor.fetchall()
+            cursor.close()
+            
+            results = [{
+                "message_id": row[0],
+                "session_id": row[1],
+                "session_title": row[2],
+                "sender_type": row[3],
+                "snippet": make_search_snippet(row[4], terms),
+                "timestamp": format_timestamp(row[5]),
+                "rank": row[6]
+            } for row in rows]
+            total = rows[0][7] if rows else 0
+            return {"results": results, "total": total, "has_more": offset + len(results) < total}
+            
+    except Exception as e:
+        print(f"Error searching chat messages: {e}")
+        raise
+
+def create_chat_search_index():
+    """Create the full-text index behind search_chat_messages where Full-Text Search is installed.
+    
+    The neutral word breaker (LANGUAGE 0) with no stoplist indexes English
+    and Malay text alike. Full-text DDL cannot run inside a transaction, so
+    this runs separately from create_chat_tables.
+    """
+    global _chat_fulltext_enabled
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = True
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT CAST(FULLTEXTSERVICEPROPERTY('IsFullTextInstalled') AS INT)")
+            row = cursor.fetchone()
+            if not row or row[0] != 1:
+                print("Full-Text Search is not installed; chat search will use LIKE scans")
+                cursor.close()
+                return False
+            
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sys.fulltext_catalogs WHERE name = '{CHAT_SEARCH_CATALOG}')
+                CREATE FULLTEXT CATALOG {CHAT_SEARCH_CATALOG}
+            """)
+            
+            # The key index must be the (auto-named) primary key of chat_messages
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('chat_messages'))
+                BEGIN
+                    DECLARE @pk SYSNAME = (SELECT name FROM sys.indexes
+                                           WHERE object_id = OBJECT_ID('chat_messages') AND is_primary_key = 1)
+                    EXEC('CREATE FULLTEXT INDEX ON chat_messages (content LANGUAGE 0)
+                          KEY INDEX ' + @pk + ' ON {CHAT_SEARCH_CATALOG}
+                          WITH CHANGE_TRACKING AUTO, STOPLIST = OFF')
+                END
+            """)
+            cursor.close()
+            _chat_fulltext_enabled = True
+            print("Chat full-text search index created/verified")
+            return True
+            
+    except Exception as e:
+        # Search still works through the LIKE fallback
+        print(f"Error creating chat search index: {e}")
+        return False
+
 def create_chat_tables():
     """Create chat sessions and messages tables"""
     try:
@@ -318,6 +853,9 @@ def create_chat_tables():
                     created_at DATETIME DEFAULT GETDATE(),
                     updated_at DATETIME DEFAULT GETDATE(),
                     is_active BIT DEFAULT 1,
+                    message_count INT NOT NULL DEFAULT 0,
+                    last_message_at DATETIME NULL,
+                    last_message_preview NVARCHAR(200) NULL,
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
             """)
@@ -342,6 +880,46 @@ def create_chat_tables():
                     ALTER TABLE chat_sessions ADD metadata NVARCHAR(MAX)
                 END
             """)
+            
+            # Add message_count column if it doesn't exist (migration) and backfill
+            # it once; save_chat_message keeps it current from then on
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_sessions') 
+                              AND name = 'message_count')
+                BEGIN
+                    ALTER TABLE chat_sessions ADD message_count INT NOT NULL DEFAULT 0
+                    EXEC('UPDATE s SET message_count = (SELECT COUNT(*) FROM chat_messages m WHERE m.session_id = s.id)
+                          FROM chat_sessions s')
+                END
+            """)
+            
+            # Add last-message summary columns if they don't exist (migration)
+            # and backfill them from each session's newest message
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_sessions') 
+                              AND name = 'last_message_preview')
+                BEGIN
+                    ALTER TABLE chat_sessions ADD last_message_at DATETIME NULL, last_message_preview NVARCHAR(200) NULL
+                    EXEC('UPDATE s SET last_message_at = m.timestamp,
+                                       last_message_preview = LEFT(CAST(m.content AS NVARCHAR(MAX)), 200)
+                          FROM chat_sessions s
+                          CROSS APPLY (SELECT TOP 1 timestamp, content FROM chat_messages
+                                       WHERE session_id = s.id
+                                       ORDER BY timestamp DESC, id DESC) m')
+                END
+            """)
+            # Add archived_at column if it doesn't exist (migration); set once
+            # older messages have been moved to chat_messages_archive
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_sessions') 
+                              AND name = 'archived_at')
+                BEGIN
+                    ALTER TABLE chat_sessions ADD archived_at DATETIME NULL
+                END
+            """)
             print("chat_sessions table columns updated")
             
             # Create chat_messages table
@@ -351,23 +929,121 @@ def create_chat_tables():
                     id INT IDENTITY(1,1) PRIMARY KEY,
                     session_id INT NOT NULL,
                     sender_type VARCHAR(10) NOT NULL, -- 'user' or 'bot'
-                    content TEXT NOT NULL,
+                    content NVARCHAR(MAX) NOT NULL,
                     timestamp DATETIME DEFAULT GETDATE(),
                     message_type VARCHAR(50) DEFAULT 'text', -- 'text', 'voice', 'image'
+                    metadata NVARCHAR(MAX),
                     FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
                 )
             """)
             print("chat_messages table created/verified")
             
+            # Add metadata column if it doesn't exist (migration) - holds per-message
+            # diagnostics such as the stage timings of the turn that produced a bot reply
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_messages') 
+                              AND name = 'metadata')
+                BEGIN
+                    ALTER TABLE chat_messages ADD metadata NVARCHAR(MAX)
+                END
+            """)
+            
+            # Archive tier for idle sessions: content is COMPRESS()'d and rows are
+            # clustered by session so a transparent read is a single range seek
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'chat_messages_archive')
+                BEGIN
+                    CREATE TABLE chat_messages_archive (
+                        id INT NOT NULL PRIMARY KEY NONCLUSTERED,
+                        session_id INT NOT NULL,
+                        sender_type VARCHAR(10) NOT NULL,
+                        content_compressed VARBINARY(MAX) NOT NULL,
+                        timestamp DATETIME NULL,
+                        message_type VARCHAR(50) NULL,
+                        metadata NVARCHAR(MAX) NULL,
+                        archived_at DATETIME NOT NULL DEFAULT GETDATE(),
+                        FOREIGN KEY (session_id) REFERENCES chat_sessions(id) ON DELETE CASCADE
+                    )
+                    CREATE CLUSTERED INDEX IX_chat_messages_archive_session_timestamp
+                    ON chat_messages_archive(session_id, timestamp, id)
+                END
+            """)
+            print("chat_messages_archive table created/verified")
+            
+            # Per-user active session count behind the session list total;
+            # rows are seeded on first use (see _ensure_session_counter)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'chat_session_counters')
+                BEGIN
+                    CREATE TABLE chat_session_counters (
+                        user_id INT NOT NULL PRIMARY KEY,
+                        active_sessions INT NOT NULL DEFAULT 0,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                END
+            """)
+            
+            # Add client_message_id column if it doesn't exist (migration); set by
+            # offline sync so replayed messages can be recognised
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_messages') 
+                              AND name = 'client_message_id')
+                BEGIN
+                    ALTER TABLE chat_messages ADD client_message_id NVARCHAR(64) NULL
+                END
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.columns 
+                              WHERE object_id = OBJECT_ID('chat_messages_archive') 
+                              AND name = 'client_message_id')
+                BEGIN
+                    ALTER TABLE chat_messages_archive ADD client_message_id NVARCHAR(64) NULL
+                END
+            """)
+            
             # Create indexes for better performance
+            # Composite indexes back keyset pagination: session lists seek on
+            # (user_id, is_active) already sorted by updated_at, message pages
+            # seek on session_id already sorted by (timestamp, id)
+            # The session index also covers the list columns; rebuild it in place
+            # if it predates the summary columns
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_sessions_user_active_updated')
+                    CREATE INDEX IX_chat_sessions_user_active_updated ON chat_sessions(user_id, is_active, updated_at)
+                    INCLUDE (title, ai_provider, created_at, message_count, last_message_at, last_message_preview)
+                ELSE IF NOT EXISTS (SELECT * FROM sys.index_columns ic
+                                    JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+                                    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+                                    WHERE i.name = 'IX_chat_sessions_user_active_updated'
+                                    AND c.name = 'last_message_preview')
+                    CREATE INDEX IX_chat_sessions_user_active_updated ON chat_sessions(user_id, is_active, updated_at)
+                    INCLUDE (title, ai_provider, created_at, message_count, last_message_at, last_message_preview)
+                    WITH (DROP_EXISTING = ON)
+            """)
+            
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_messages_session_timestamp')
+                CREATE INDEX IX_chat_messages_session_timestamp ON chat_messages(session_id, timestamp, id)
+            """)
+            
+            # The single-column indexes are left-prefixes of the composites above
+            cursor.execute("""
+                IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_sessions_user_id')
+                DROP INDEX IX_chat_sessions_user_id ON chat_sessions
+            """)
+            
             cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_sessions_user_id')
-                CREATE INDEX IX_chat_sessions_user_id ON chat_sessions(user_id)
+                IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_messages_session_id')
+                DROP INDEX IX_chat_messages_session_id ON chat_messages
             """)
             
             cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_chat_messages_session_id')
-                CREATE INDEX IX_chat_messages_session_id ON chat_messages(session_id)
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'UX_chat_messages_session_client_id')
+                CREATE UNIQUE INDEX UX_chat_messages_session_client_id
+                ON chat_messages(session_id, client_message_id)
+                WHERE client_message_id IS NOT NULL
             """)
             
             cursor.execute("""
@@ -383,15 +1059,24 @@ def create_chat_tables():
     except Exception as e:
         print(f"Error creating chat tables: {e}")
         raise e
+    
+    create_chat_search_index()
 
 __all__ = [
     'create_chat_session',
     'get_user_chat_sessions', 
+    'get_user_chat_sessions_page',
+    'make_session_cursor',
+    'parse_session_cursor',
     'get_chat_session',
     'save_chat_message',
     'get_chat_messages',
+    'get_chat_messages_page',
     'update_chat_session_title',
     'delete_chat_session',
     'create_chat_tables',
-    'update_session_metadata'
+    'update_session_metadata',
+    'search_chat_messages',
+    'create_chat_search_index',
+    'sync_chat_messages'
 ]
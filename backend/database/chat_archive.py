@@ -0,0 +1,230 @@
+"""
+Chat message storage maintenance.
+
+- migrate_chat_message_content converts chat_messages.content from the
+  deprecated TEXT type to NVARCHAR(MAX) online: the data is copied into a
+  new column in small batches and only the final column swap takes a short
+  exclusive lock. It is a one-off schema change, so it only runs when asked
+  for: via scripts/migrate_chat_message_content.py, or on the maintenance
+  thread when CHAT_CONTENT_MIGRATION_ENABLED is set. An application lock
+  keeps concurrent workers from running it twice.
+- archive_idle_chat_messages moves messages of sessions idle for
+  CHAT_ARCHIVE_IDLE_DAYS into chat_messages_archive with COMPRESS()'d
+  content, in small batches that never escalate to a table lock.
+  get_chat_messages, search_chat_messages and the sync_chat_messages
+  replay check read archived sessions transparently.
+
+The background thread started with the application runs whichever of
+the two is enabled, and is not started when neither is.
+"""
+import logging
+import threading
+import time
+
+from config.settings import (
+    CHAT_ARCHIVE_ENABLED,
+    CHAT_ARCHIVE_IDLE_DAYS,
+    CHAT_ARCHIVE_INTERVAL,
+    CHAT_ARCHIVE_BATCH_SIZE,
+    CHAT_CONTENT_MIGRATION_ENABLED,
+    CHAT_MAINTENANCE_BATCH_PAUSE,
+)
+from .connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+_MIGRATION_LOCK = 'chat_message_content_migration'
+
+_stop_event = threading.Event()
+_maintenance_thread = None
+
+def migrate_chat_message_content(batch_size=CHAT_ARCHIVE_BATCH_SIZE, pause=CHAT_MAINTENANCE_BATCH_PAUSE):
+    """Convert chat_messages.content from TEXT to NVARCHAR(MAX); returns True if it ran"""
+    with DatabaseConnection() as conn:
+        cursor = conn.cursor()
+        # Session-owned so it spans the autocommitted copy batches; another
+        # worker already migrating makes this one skip instead of wait
+        cursor.execute(f"""
+            DECLARE @result INT;
+            EXEC @result = sp_getapplock @Resource = '{_MIGRATION_LOCK}', @LockMode = 'Exclusive',
+                                         @LockOwner = 'Session', @LockTimeout = 0;
+            SELECT @result
+        """)
+        row = cursor.fetchone()
+        if not row or row[0] < 0:
+            cursor.close()
+            return False
+
+        try:
+            return _migrate_chat_message_content(conn, cursor, batch_size, pause)
+        finally:
+            cursor.execute(f"EXEC sp_releaseapplock @Resource = '{_MIGRATION_LOCK}', @LockOwner = 'Session'")
+            cursor.close()
+
+def _migrate_chat_message_content(conn, cursor, batch_size, pause):
+    from . import chat as chat_module
+
+    cursor.execute("""
+        SELECT TYPE_NAME(system_type_id) FROM sys.columns
+        WHERE object_id = OBJECT_ID('chat_messages') AND name = 'content'
+    """)
+    row = cursor.fetchone()
+    if not row or row[0] != 'text':
+        return False
+
+    print("Migrating chat_messages.content from TEXT to NVARCHAR(MAX)...")
+    # NOT NULL from the start, so the swap needs no ALTER COLUMN scan;
+    # '' marks rows not copied yet
+    cursor.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.columns
+                      WHERE object_id = OBJECT_ID('chat_messages')
+                      AND name = 'content_nv')
+        BEGIN
+            ALTER TABLE chat_messages ADD content_nv NVARCHAR(MAX) NOT NULL
+                CONSTRAINT DF_chat_messages_content_nv DEFAULT ''
+        END
+    """)
+
+    # Copy existing rows in short autocommitted id ranges; messages are
+    # never edited, so only rows inserted after this point need catching up
+    cursor.execute("SELECT ISNULL(MAX(id), 0) FROM chat_messages")
+    copied_through = cursor.fetchone()[0]
+    last_id = 0
+    while last_id < copied_through and not _stop_event.is_set():
+        cursor.execute("""
+            UPDATE chat_messages SET content_nv = CAST(content AS NVARCHAR(MAX))
+            WHERE id > ? AND id <= ? AND content_nv = ''
+        """, (last_id, last_id + batch_size))
+        last_id += batch_size
+        time.sleep(pause)
+    if last_id < copied_through:
+        # Interrupted by shutdown; the copy resumes on the next run
+        return False
+
+    # Full-text DDL cannot run in a transaction; search uses the LIKE
+    # fallback until the index is rebuilt below
+    chat_module._chat_fulltext_enabled = False
+    cursor.execute("""
+        IF EXISTS (SELECT * FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('chat_messages'))
+        DROP FULLTEXT INDEX ON chat_messages
+    """)
+
+    try:
+        conn.autocommit = False
+        # Catch up rows written during the copy, then swap the columns
+        cursor.execute("""
+            UPDATE chat_messages WITH (TABLOCKX) SET content_nv = CAST(content AS NVARCHAR(MAX))
+            WHERE id > ?
+        """, (copied_through,))
+        cursor.execute("ALTER TABLE chat_messages DROP CONSTRAINT DF_chat_messages_content_nv")
+        cursor.execute("ALTER TABLE chat_messages DROP COLUMN content")
+        cursor.execute("EXEC sp_rename 'chat_messages.content_nv', 'content', 'COLUMN'")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+    # Reclaim the dropped TEXT column's space in batches
+    cursor.execute(f"DBCC CLEANTABLE (0, 'chat_messages', {int(batch_size)})")
+
+    chat_module._chat_fulltext_enabled = None
+    chat_module.create_chat_search_index()
+    print("chat_messages.content migrated to NVARCHAR(MAX)")
+    return True
+
+def archive_idle_chat_messages(idle_days=CHAT_ARCHIVE_IDLE_DAYS, batch_size=CHAT_ARCHIVE_BATCH_SIZE,
+                               pause=CHAT_MAINTENANCE_BATCH_PAUSE):
+    """Move messages of sessions idle for idle_days into chat_messages_archive.
+
+    Each batch copies and deletes up to batch_size messages in its own short
+    transaction. message_count and the session summary are unchanged, and
+    archived_at marks sessions whose reads must include the archive.
+    Returns the number of messages archived.
+    """
+    archived = 0
+    with DatabaseConnection() as conn:
+        cursor = conn.cursor()
+        while not _stop_event.is_set():
+            try:
+                conn.autocommit = False
+                cursor.execute("""
+                    SELECT TOP (?) m.id, m.session_id
+                    FROM chat_sessions s
+                    INNER JOIN chat_messages m ON m.session_id = s.id
+                    WHERE s.updated_at < DATEADD(DAY, -?, GETDATE())
+                    ORDER BY m.session_id, m.id
+                """, (batch_size, idle_days))
+                rows = cursor.fetchall()
+                if not rows:
+                    conn.commit()
+                    break
+
+                message_ids = [row[0] for row in rows]
+                session_ids = sorted({row[1] for row in rows})
+                id_list = ", ".join(["?"] * len(message_ids))
+                cursor.execute(f"""
+                    INSERT INTO chat_messages_archive
+                        (id, session_id, sender_type, content_compressed, timestamp, message_type, metadata,
+                         client_message_id)
+                    SELECT id, session_id, sender_type, COMPRESS(CAST(content AS NVARCHAR(MAX))),
+                           timestamp, message_type, metadata, client_message_id
+                    FROM chat_messages
+                    WHERE id IN ({id_list})
+                """, message_ids)
+                cursor.execute(f"DELETE FROM chat_messages WHERE id IN ({id_list})", message_ids)
+                cursor.execute(f"""
+                    UPDATE chat_sessions SET archived_at = GETDATE()
+                    WHERE id IN ({", ".join(["?"] * len(session_ids))})
+                """, session_ids)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+
+            archived += len(message_ids)
+            time.sleep(pause)
+        cursor.close()
+
+    if archived:
+        print(f"Archived {archived} chat messages from sessions idle over {idle_days} days")
+    return archived
+
+def _run_chat_maintenance():
+    if CHAT_CONTENT_MIGRATION_ENABLED:
+        try:
+            migrate_chat_message_content()
+        except Exception as e:
+            logger.error(f"Chat content migration failed: {e}")
+
+    while CHAT_ARCHIVE_ENABLED and not _stop_event.is_set():
+        try:
+            archive_idle_chat_messages()
+        except Exception as e:
+            logger.error(f"Chat archive run failed: {e}")
+        _stop_event.wait(CHAT_ARCHIVE_INTERVAL)
+
+def start_chat_maintenance():
+    """Start the background content migration and archive mover (once per process; off when neither is enabled)"""
+    global _maintenance_thread
+    if not (CHAT_ARCHIVE_ENABLED or CHAT_CONTENT_MIGRATION_ENABLED):
+        return
+    if _maintenance_thread is not None and _maintenance_thread.is_alive():
+        return
+    _stop_event.clear()
+    _maintenance_thread = threading.Thread(target=_run_chat_maintenance, name="chat-maintenance", daemon=True)
+    _maintenance_thread.start()
+
+def stop_chat_maintenance():
+    """Ask the background maintenance thread to stop after its current batch"""
+    _stop_event.set()
+
+__all__ = [
+    'migrate_chat_message_content',
+    'archive_idle_chat_messages',
+    'start_chat_maintenance',
+    'stop_chat_maintenance',
+]
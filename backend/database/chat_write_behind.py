@@ -0,0 +1,352 @@
+"""
+Optional write-behind persistence for chat messages.
+
+When CHAT_WRITE_BEHIND_ENABLED is set, save_chat_message enqueues messages
+instead of running one transaction per message. A background thread flushes
+the queue every CHAT_WRITE_BEHIND_FLUSH_INTERVAL seconds (or as soon as
+CHAT_WRITE_BEHIND_BATCH_SIZE messages are waiting) with ordered multi-row
+inserts and a single summary UPDATE per session, all in one transaction.
+
+Messages that are not yet flushed are served from an in-memory overlay by
+get_chat_messages, so the originating session reads its own writes. The
+queue is drained on application shutdown and at interpreter exit.
+
+Messages for sessions deleted before their flush are not written; they
+count as dropped rather than flushed and leave message_count unchanged.
+
+A failed flush leaves its batch queued for the next one. After
+CHAT_WRITE_BEHIND_MAX_ATTEMPTS failures in a row the batch is written one
+message at a time, and a message that fails on its own while the
+database is reachable is dropped with a logged error, so one bad row
+cannot hold up the queue forever.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from config.settings import (
+    CHAT_WRITE_BEHIND_ENABLED,
+    CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+    CHAT_WRITE_BEHIND_BATCH_SIZE,
+    CHAT_WRITE_BEHIND_MAX_ATTEMPTS,
+)
+from .connection import DatabaseConnection
+
+logger = logging.getLogger(__name__)
+
+# 7 parameters per row keeps each INSERT under SQL Server's 2100-parameter limit
+_ROWS_PER_INSERT = 250
+
+
+class ChatWriteBehindQueue:
+    """Batch chat message inserts from many sessions into periodic flushes"""
+
+    def __init__(self, flush_interval=0.2, batch_size=500, max_attempts=3):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self._failed_attempts = 0
+        self._pending = []  # entries in enqueue order; flushed as a prefix
+        self._seq = 0
+        # Odd while a flush is committing; readers use it to detect a flush
+        # that overlapped their database read
+        self._version = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self.stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "dropped": 0,
+            "last_flush_ms": 0.0,
+            "last_batch_size": 0,
+        }
+
+        self._thread = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def version(self):
+        return self._version
+
+    def enqueue(self, session_id, sender_type, content, message_type="text", metadata=None):
+        """Queue a message and return it in save_chat_message's format (id is not yet known)"""
+        with self._cond:
+            if self._stopped:
+                raise Exception("Chat write-behind queue is closed")
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "client_ref": uuid.uuid4().hex,
+                "session_id": session_id,
+                "sender_type": sender_type,
+                "content": content,
+                "message_type": message_type,
+                "metadata": metadata,
+                "timestamp": datetime.now(),
+            }
+            self._pending.append(entry)
+            self.stats["enqueued"] += 1
+            backlog = len(self._pending)
+
+        if backlog >= self.batch_size:
+            self._wake.set()
+
+        message = self._as_message(entry)
+        message["session_id"] = session_id
+        return message
+
+    def pending_for_session(self, session_id):
+        """Unflushed messages for a session, oldest first"""
+        with self._cond:
+            entries = [e for e in self._pending if e["session_id"] == session_id]
+        return [self._as_message(e) for e in entries]
+
+    def stable_version(self, timeout=1.0):
+        """Wait until no flush is committing and return the version to re-check after a read"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._version % 2 == 1 and time.time() < deadline:
+                self._cond.wait(0.05)
+            return self._version
+
+    def flush(self):
+        """Write every queued message; returns the number of rows written"""
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.batch_size]
+                if not batch:
+                    return flushed
+
+                try:
+                    written = self._commit(batch)
+                except Exception as e:
+                    # Entries stay queued (and visible through the overlay) for the next attempt
+                    self._failed_attempts += 1
+                    logger.error(f"Chat write-behind flush of {len(batch)} messages failed "
+                                 f"(attempt {self._failed_attempts}): {e}")
+                    if self._failed_attempts < self.max_attempts:
+                        return flushed
+                    written, finished = self._flush_one_by_one(batch)
+                    flushed += written
+                    if not finished:
+                        return flushed
+                    self._failed_attempts = 0
+                    continue
+
+                self._failed_attempts = 0
+                flushed += written
+
+    def _commit(self, batch):
+        """Write batch, the head of the queue, and dequeue it; it stays queued if the write fails.
+
+        Returns the number of rows written.
+        """
+        start = time.perf_counter()
+        with self._cond:
+            self._version += 1
+        try:
+            written = self._write_batch(batch)
+        except Exception:
+            with self._cond:
+                self.stats["failed_flushes"] += 1
+                self._version += 1
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            del self._pending[:len(batch)]
+            self._version += 1
+            self._cond.notify_all()
+            self.stats["flushed"] += written
+            self.stats["dropped"] += len(batch) - written
+            self.stats["flushes"] += 1
+            self.stats["last_batch_size"] = len(batch)
+            self.stats["last_flush_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if written < len(batch):
+            logger.warning(f"Chat write-behind dropped {len(batch) - written} messages for deleted sessions")
+        return written
+
+    def _flush_one_by_one(self, batch):
+        """Write batch a message at a time, dropping messages that fail on their own.
+
+        Returns (messages written, whether the whole batch was handled).
+        Stops early, leaving the rest queued, when the database itself is
+        unreachable rather than the message being bad.
+        """
+        written = 0
+        for entry in batch:
+            try:
+                written += self._commit([entry])
+                continue
+            except Exception as e:
+                error = e
+            if not self._database_reachable():
+                logger.error("Chat write-behind: database unreachable, keeping messages queued")
+                return written, False
+
+            with self._cond:
+                del self._pending[:1]
+                self.stats["dropped"] += 1
+            logger.error(f"Chat write-behind dropped {entry['sender_type']} message {entry['client_ref']} "
+                         f"for session {entry['session_id']} after {self.max_attempts} failed flushes: {error}")
+        return written, True
+
+    @staticmethod
+    def _database_reachable():
+        try:
+            with DatabaseConnection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """Stop the background thread and durably flush what is left"""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._cond:
+            remaining = len(self._pending)
+        if remaining:
+            logger.error(f"Chat write-behind closed with {remaining} unflushed messages")
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Chat write-behind loop error: {e}")
+
+    def _write_batch(self, batch):
+        """Insert batch and update each session's summary; returns the number of rows inserted"""
+        from .chat import make_message_preview
+        import json
+
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+
+            # Ordered multi-row inserts; messages for sessions deleted in the
+            # meantime are dropped, matching save_chat_message's session check.
+            # The join keeps or drops all of a session's rows in a chunk, so the
+            # sessions OUTPUT reports tell which entries were written
+            inserted = []
+            for i in range(0, len(batch), _ROWS_PER_INSERT):
+                chunk = batch[i:i + _ROWS_PER_INSERT]
+                values = ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * len(chunk))
+                params = []
+                for e in chunk:
+                    params.extend([
+                        e["seq"], e["session_id"], e["sender_type"], e["content"], e["message_type"],
+                        json.dumps(e["metadata"]) if e["metadata"] else None, e["timestamp"],
+                    ])
+                cursor.execute(f"""
+                    INSERT INTO chat_messages (session_id, sender_type, content, message_type, metadata, timestamp)
+                    OUTPUT INSERTED.session_id
+                    SELECT v.session_id, v.sender_type, v.content, v.message_type, v.metadata, v.ts
+                    FROM (VALUES {values}) AS v(seq, session_id, sender_type, content, message_type, metadata, ts)
+                    INNER JOIN chat_sessions s ON s.id = v.session_id AND s.is_active = 1
+                    ORDER BY v.seq
+                """, params)
+                written_sessions = {row[0] for row in cursor.fetchall()}
+                inserted.extend(e for e in chunk if e["session_id"] in written_sessions)
+
+            # One summary update per session instead of one per message
+            summaries = {}
+            for e in inserted:
+                count, _ = summaries.get(e["session_id"], (0, None))
+                summaries[e["session_id"]] = (count + 1, e)
+            if summaries:
+                cursor.fast_executemany = True
+                cursor.executemany("""
+                    UPDATE chat_sessions
+                    SET updated_at = GETDATE(),
+                        message_count = message_count + ?,
+                        last_message_at = ?,
+                        last_message_preview = ?
+                    WHERE id = ? AND is_active = 1
+                """, [
+                    (count, last["timestamp"], make_message_preview(last["content"]), session_id)
+                    for session_id, (count, last) in summaries.items()
+                ])
+
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return len(inserted)
+
+    @staticmethod
+    def _as_message(entry):
+        return {
+            "id": None,
+            "sender_type": entry["sender_type"],
+            "content": entry["content"],
+            "message_type": entry["message_type"],
+            "timestamp": entry["timestamp"].isoformat(),
+            "pending": True,
+            "client_ref": entry["client_ref"],
+        }
+
+
+# Global write-behind instance
+_write_behind = None
+_write_behind_lock = threading.Lock()
+
+def get_chat_write_behind():
+    """Get the process-wide write-behind queue, or None when it is disabled"""
+    global _write_behind
+    if not CHAT_WRITE_BEHIND_ENABLED:
+        return None
+    if _write_behind is None:
+        with _write_behind_lock:
+            if _write_behind is None:
+                _write_behind = ChatWriteBehindQueue(
+                    flush_interval=CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+                    batch_size=CHAT_WRITE_BEHIND_BATCH_SIZE,
+                    max_attempts=CHAT_WRITE_BEHIND_MAX_ATTEMPTS
+                )
+                logger.info(f"Chat write-behind enabled: flush every {CHAT_WRITE_BEHIND_FLUSH_INTERVAL}s, "
+                            f"batch {CHAT_WRITE_BEHIND_BATCH_SIZE}")
+    return _write_behind
+
+def shutdown_chat_write_behind():
+    """Flush and stop the write-behind queue (safe to call more than once)"""
+    if _write_behind is not None:
+        _write_behind.close()
+
+def get_chat_write_behind_stats():
+    """Queue statistics for monitoring, or None when write-behind is disabled"""
+    return _write_behind.get_stats() if _write_behind is not None else None
+
+atexit.register(shutdown_chat_write_behind)
+
+__all__ = [
+    'ChatWriteBehindQueue',
+    'get_chat_write_behind',
+    'shutdown_chat_write_behind',
+    'get_chat_write_behind_stats',
+]
@@ -337,6 +337,16 @@ class ManagedDatabaseConnection:
         # Proxy all attributes to the underlying connection
         return getattr(self.conn, name)
     
+    def __setattr__(self, name, value):
+        # Settings such as autocommit must reach the underlying connection,
+        # otherwise "conn.autocommit = False" silently leaves it autocommitting.
+        # return_connection rolls back anything uncommitted and turns
+        # autocommit back on, so the next borrower starts clean.
+        if name in ("conn", "pool", "_returned"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.conn, name, value)
+    
     def close(self):
         """Override close to return to pool instead of actually closing"""
         if not self._returned:
@@ -1,3 +1,5 @@
+import logging
+
 from .connection import DatabaseConnection
 from .users import update_users_table
 from .chat import create_chat_tables
@@ -5,6 +7,8 @@ from .faq import create_faq_table, insert_default_faqs
 from .nadma import create_nadma_tables
 from .reports import update_disaster_reports_table
 
+logger = logging.getLogger(__name__)
+
 def update_database_schema():
     """Update database schema including all tables"""
     # Update users table with new columns
@@ -36,33 +40,55 @@ def update_database_schema():
     create_nadma_tables()
 
 def create_notifications_table():
-    """Create notifications table if it doesn't exist"""
+    """Create notification tables if they don't exist"""
     try:
         with DatabaseConnection() as conn:
             # Temporarily disable autocommit for schema changes
             conn.autocommit = False
             cursor = conn.cursor()
             
+            # Content is stored once per message; notifications holds one
+            # narrow receipt row per recipient that points at it
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_messages')
+                CREATE TABLE notification_messages (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    title NVARCHAR(255) NOT NULL,
+                    message NVARCHAR(MAX) NOT NULL,
+                    type NVARCHAR(50) NOT NULL DEFAULT 'info',
+                    disaster_type NVARCHAR(100) NULL,
+                    location NVARCHAR(255) NULL,
+                    created_at DATETIME DEFAULT GETDATE()
+                )
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_messages_created_at')
+                CREATE INDEX IX_notification_messages_created_at ON notification_messages(created_at DESC)
+            """)
+            
             cursor.execute("""
                 IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notifications')
                 CREATE TABLE notifications (
                     id INT IDENTITY(1,1) PRIMARY KEY,
                     user_id INT NOT NULL,
-                    title NVARCHAR(255) NOT NULL,
-                    message NVARCHAR(MAX) NOT NULL,
-                    type NVARCHAR(50) DEFAULT 'info',
+                    message_id INT NOT NULL,
                     is_read BIT DEFAULT 0,
                     created_at DATETIME DEFAULT GETDATE(),
-                    updated_at DATETIME DEFAULT GETDATE(),
-                    expires_at DATETIME NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
+                    FOREIGN KEY (user_id) REFERENCES users(id),
+                    CONSTRAINT FK_notifications_message_id FOREIGN KEY (message_id) REFERENCES notification_messages(id)
                 )
             """)
             
-            # Create index for better performance
+            # Per-user totals kept in step with notifications (services/notification_counters.py)
             cursor.execute("""
-                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notifications_user_id')
-                CREATE INDEX IX_notifications_user_id ON notifications(user_id)
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_counters')
+                CREATE TABLE notification_counters (
+                    user_id INT PRIMARY KEY,
+                    total INT NOT NULL DEFAULT 0,
+                    unread INT NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT GETDATE(),
+                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                )
             """)
             
             conn.commit()
@@ -72,6 +98,285 @@ def create_notifications_table():
             
     except Exception as e:
         print(f"Error creating notifications table: {e}")
+    
+    migrate_notification_messages()
+
+# Per-recipient copies of the content that move to notification_messages
+LEGACY_NOTIFICATION_COLUMNS = ("title", "message", "type", "disaster_type", "location")
+
+def _drop_column(cursor, table, column):
+    """Drop a column together with its default constraint and any indexes on it"""
+    cursor.execute(f"""
+        DECLARE @sql NVARCHAR(MAX) = N''
+        SELECT @sql = @sql + N'DROP INDEX ' + QUOTENAME(i.name) + N' ON {table};'
+        FROM sys.indexes i
+        INNER JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+        INNER JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+        WHERE i.object_id = OBJECT_ID('{table}') AND c.name = '{column}' AND i.is_primary_key = 0
+        GROUP BY i.name
+        SELECT @sql = @sql + N'ALTER TABLE {table} DROP CONSTRAINT ' + QUOTENAME(d.name) + N';'
+        FROM sys.default_constraints d
+        INNER JOIN sys.columns c ON c.object_id = d.parent_object_id AND c.column_id = d.parent_column_id
+        WHERE d.parent_object_id = OBJECT_ID('{table}') AND c.name = '{column}'
+        IF @sql <> N'' EXEC sp_executesql @sql
+    """)
+    cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+def migrate_notification_messages():
+    """Run each notification schema migration (idempotent); returns True if all of them succeeded.
+
+    Every feature migrates in its own transaction and reports its own
+    failure, so one failing step does not silently skip the others.
+    """
+    results = [
+        migrate_notification_content(),
+        migrate_notification_feed_indexes(),
+        migrate_notification_sync(),
+        migrate_notification_message_stats(),
+        migrate_notification_digests(),
+    ]
+    return all(results)
+
+def migrate_notification_content():
+    """Move per-recipient notification content into notification_messages"""
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                IF COL_LENGTH('notifications', 'message_id') IS NULL
+                ALTER TABLE notifications ADD message_id INT NULL
+                    CONSTRAINT FK_notifications_message_id REFERENCES notification_messages(id)
+            """)
+            conn.commit()
+            
+            present = [
+                column for column in LEGACY_NOTIFICATION_COLUMNS
+                if cursor.execute("SELECT COL_LENGTH('notifications', ?)", (column,)).fetchone()[0] is not None
+            ]
+            if "title" in present and "message" in present:
+                # Tables created from database/schema.py never had disaster_type/location
+                source = {column: f"n.{column}" if column in present else "NULL" for column in LEGACY_NOTIFICATION_COLUMNS}
+                source["type"] = f"ISNULL({source['type']}, 'info')"
+                content = f"n.title, n.message, {source['type']}, {source['disaster_type']}, {source['location']}"
+                
+                # One message per distinct content, the grouping the admin view used to compute
+                cursor.execute(f"""
+                    INSERT INTO notification_messages (title, message, type, disaster_type, location, created_at)
+                    SELECT {content}, MIN(n.created_at)
+                    FROM notifications n
+                    WHERE n.message_id IS NULL
+                    GROUP BY {content}
+                """)
+                linked = cursor.rowcount
+                cursor.execute(f"""
+                    UPDATE n SET message_id = m.id
+                    FROM notifications n
+                    INNER JOIN notification_messages m
+                        ON m.title = n.title AND m.message = n.message AND m.type = {source['type']}
+                        AND ISNULL(m.disaster_type, '') = ISNULL({source['disaster_type']}, '')
+                        AND ISNULL(m.location, '') = ISNULL({source['location']}, '')
+                    WHERE n.message_id IS NULL
+                """)
+                
+                cursor.execute("SELECT COUNT(*) FROM notifications WHERE message_id IS NULL")
+                if cursor.fetchone()[0] != 0:
+                    conn.rollback()
+                    logger.error("Notification message migration left rows unlinked; keeping the old columns")
+                    return False
+                for column in present:
+                    _drop_column(cursor, "notifications", column)
+                conn.commit()
+                print(f"Moved notification content into {linked} notification_messages rows")
+            
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notifications_message_id')
+                CREATE INDEX IX_notifications_message_id ON notifications(message_id) INCLUDE (user_id, is_read, created_at)
+            """)
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return True
+            
+    except Exception as e:
+        logger.error(f"Error migrating notification content: {e}")
+        return False
+
+def migrate_notification_feed_indexes():
+    """Covering feed indexes for keyset paging, replacing the single-column ones"""
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            # Each user's notifications newest first, with and without the
+            # unread filter, covering everything the feed reads from the row
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notifications_user_feed')
+                CREATE INDEX IX_notifications_user_feed
+                    ON notifications(user_id, created_at DESC, id DESC) INCLUDE (is_read, message_id)
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notifications_user_unread')
+                CREATE INDEX IX_notifications_user_unread
+                    ON notifications(user_id, is_read, created_at DESC, id DESC) INCLUDE (message_id)
+            """)
+            
+            # Single-column indexes the feed indexes make redundant
+            for index in ("IX_notifications_user_id", "IX_notifications_is_read", "IX_notifications_created_at"):
+                cursor.execute(f"""
+                    IF EXISTS (SELECT * FROM sys.indexes WHERE name = '{index}' AND object_id = OBJECT_ID('notifications'))
+                    DROP INDEX {index} ON notifications
+                """)
+            
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return True
+            
+    except Exception as e:
+        logger.error(f"Error migrating notification feed indexes: {e}")
+        return False
+
+def migrate_notification_sync():
+    """Rowversion on every receipt and the tombstones deletes write, for delta sync"""
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            # services/notification_sync.py; deletes write tombstones with OUTPUT ... INTO
+            cursor.execute("""
+                IF COL_LENGTH('notifications', 'row_version') IS NULL
+                ALTER TABLE notifications ADD row_version ROWVERSION
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notifications_user_version')
+                CREATE INDEX IX_notifications_user_version ON notifications(user_id, row_version)
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_tombstones')
+                CREATE TABLE notification_tombstones (
+                    id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                    notification_id INT NOT NULL,
+                    user_id INT NOT NULL,
+                    deleted_at DATETIME NOT NULL DEFAULT GETDATE(),
+                    row_version ROWVERSION
+                )
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_tombstones_user_version')
+                CREATE INDEX IX_notification_tombstones_user_version ON notification_tombstones(user_id, row_version)
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_tombstones_deleted_at')
+                CREATE INDEX IX_notification_tombstones_deleted_at ON notification_tombstones(deleted_at)
+            """)
+            
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return True
+            
+    except Exception as e:
+        logger.error(f"Error migrating notification sync tables: {e}")
+        return False
+
+def migrate_notification_message_stats():
+    """Receipt and unread counts per message for the admin stats (services/notification_stats.py)"""
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_message_stats')
+                CREATE TABLE notification_message_stats (
+                    message_id INT PRIMARY KEY,
+                    recipients INT NOT NULL DEFAULT 0,
+                    unread INT NOT NULL DEFAULT 0,
+                    updated_at DATETIME DEFAULT GETDATE(),
+                    CONSTRAINT FK_notification_message_stats_message_id
+                        FOREIGN KEY (message_id) REFERENCES notification_messages(id) ON DELETE CASCADE
+                )
+            """)
+            # Messages created before the table are counted once
+            cursor.execute("""
+                INSERT INTO notification_message_stats (message_id, recipients, unread)
+                SELECT m.id, COUNT(n.id), ISNULL(SUM(CASE WHEN n.is_read = 0 THEN 1 ELSE 0 END), 0)
+                FROM notification_messages m
+                LEFT JOIN notifications n ON n.message_id = m.id
+                WHERE NOT EXISTS (SELECT 1 FROM notification_message_stats s WHERE s.message_id = m.id)
+                GROUP BY m.id
+            """)
+            
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return True
+            
+    except Exception as e:
+        logger.error(f"Error migrating notification message stats: {e}")
+        return False
+
+def migrate_notification_digests():
+    """Coalescing windows for report alerts (services/notification_digest.py)"""
+    try:
+        with DatabaseConnection() as conn:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_digests')
+                CREATE TABLE notification_digests (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    disaster_type NVARCHAR(100) NOT NULL,
+                    location NVARCHAR(255) NOT NULL,
+                    message_id INT NOT NULL,
+                    opened_at DATETIME NOT NULL DEFAULT GETDATE(),
+                    flushed_at DATETIME NULL,
+                    CONSTRAINT FK_notification_digests_message_id
+                        FOREIGN KEY (message_id) REFERENCES notification_messages(id) ON DELETE CASCADE
+                )
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_digests_key')
+                CREATE INDEX IX_notification_digests_key
+                    ON notification_digests(disaster_type, location, opened_at DESC) INCLUDE (message_id, flushed_at)
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_digest_items')
+                CREATE TABLE notification_digest_items (
+                    id INT IDENTITY(1,1) PRIMARY KEY,
+                    digest_id INT NOT NULL,
+                    content_hash CHAR(64) NOT NULL,
+                    title NVARCHAR(255) NOT NULL,
+                    message NVARCHAR(MAX) NOT NULL,
+                    emailed BIT NOT NULL DEFAULT 0,
+                    created_at DATETIME DEFAULT GETDATE(),
+                    CONSTRAINT FK_notification_digest_items_digest_id
+                        FOREIGN KEY (digest_id) REFERENCES notification_digests(id) ON DELETE CASCADE
+                )
+            """)
+            cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_digest_items_digest')
+                CREATE INDEX IX_notification_digest_items_digest ON notification_digest_items(digest_id, content_hash)
+            """)
+            # When a merged digest last marked a receipt unread (created_at stays the feed order)
+            cursor.execute("""
+                IF COL_LENGTH('notifications', 'resurfaced_at') IS NULL
+                ALTER TABLE notifications ADD resurfaced_at DATETIME NULL
+            """)
+            
+            conn.commit()
+            conn.autocommit = True
+            cursor.close()
+            return True
+            
+    except Exception as e:
+        logger.error(f"Error migrating notification digests: {e}")
+        return False
 
 def migrate_reports_tables():
     """Migrate the reports table structure - rename reports to disaster_reports and create system_reports"""
@@ -227,6 +532,12 @@ def create_user_verification_codes_table():
 __all__ = [
     'update_database_schema',
     'create_notifications_table', 
+    'migrate_notification_messages',
+    'migrate_notification_content',
+    'migrate_notification_feed_indexes',
+    'migrate_notification_sync',
+    'migrate_notification_message_stats',
+    'migrate_notification_digests',
     'migrate_reports_tables',
     'create_password_reset_tokens_table',
     'create_admin_verification_codes_table',
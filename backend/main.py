@@ -1,7 +1,8 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from config.settings import API_KEY_CREDITS
+from config.settings import API_KEY_CREDITS, WHISPER_WARMUP
+import threading
 import logging
 
 # Configure logging to reduce noise from frequent endpoints
@@ -20,8 +21,18 @@ class EndpointFilter(logging.Filter):
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
 # Import database and services
-from database import update_database_schema, create_faq_table, insert_default_faqs
+from database import (
+    update_database_schema, create_faq_table, insert_default_faqs,
+    shutdown_chat_write_behind, start_chat_maintenance, stop_chat_maintenance
+)
 from services.subscription_service import create_subscriptions_table
+from utils.whisper_pool import warm_whisper_pool, shutdown_whisper_pool
+from utils.transcription_jobs import shutdown_transcription_jobs
+from services.notification_counters import (
+    start_notification_counter_reconciliation, stop_notification_counter_reconciliation
+)
+from services.notification_retention import start_notification_purge, stop_notification_purge
+from services.notification_digest import start_notification_digest_flush, stop_notification_digest_flush
 
 # Import route modules
 from routes import auth, ai, reports, profile, notifications, subscriptions, chat, admin, dev, health, map
@@ -65,6 +76,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Background chat storage maintenance (content migration, idle-session archiving)
+@app.on_event("startup")
+def start_chat_storage_maintenance():
+    start_chat_maintenance()
+
+# Load Whisper models into the transcription workers before the first request
+@app.on_event("startup")
+def warm_transcription_workers():
+    if WHISPER_WARMUP:
+        threading.Thread(target=warm_whisper_pool, name="whisper-warmup", daemon=True).start()
+
+# Periodically repair per-user notification counters that drifted
+@app.on_event("startup")
+def start_notification_counters():
+    start_notification_counter_reconciliation()
+
+# Apply the notification retention policy and prune old sync tombstones
+@app.on_event("startup")
+def start_notification_retention():
+    start_notification_purge()
+
+# Send the digest email for each closed report-alert window
+@app.on_event("startup")
+def start_notification_digests():
+    start_notification_digest_flush()
+
+# Flush chat messages still queued for write-behind persistence
+@app.on_event("shutdown")
+def flush_chat_write_behind():
+    stop_chat_maintenance()
+    stop_notification_counter_reconciliation()
+    stop_notification_purge()
+    stop_notification_digest_flush()
+    shutdown_chat_write_behind()
+    shutdown_transcription_jobs()
+    shutdown_whisper_pool()
+
 # Root endpoint
 @app.get("/")
 def root():
@@ -7,6 +7,7 @@ from contextlib import contextmanager
 import pyodbc
 import os
 from dotenv import load_dotenv
+from database.chat import make_message_preview
 
 load_dotenv()
 
@@ -142,15 +143,13 @@ class ChatRepository(BaseRepository):
             }
     
     def get_user_sessions(self, user_id: int, limit: int = 20, offset: int = 0) -> List[Dict]:
-        """Get user's chat sessions with pagination"""
+        """Get user's chat sessions with pagination (reads the denormalized summary columns)"""
         query = """
-            SELECT s.id, s.title, s.created_at, s.updated_at,
-            COUNT(m.id) as message_count
-            FROM chat_sessions s
-            LEFT JOIN chat_messages m ON s.id = m.session_id
-            WHERE s.user_id = ?
-            GROUP BY s.id, s.title, s.created_at, s.updated_at
-            ORDER BY s.updated_at DESC
+            SELECT id, title, created_at, updated_at,
+            message_count, last_message_at, last_message_preview
+            FROM chat_sessions
+            WHERE user_id = ? AND is_active = 1
+            ORDER BY updated_at DESC
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
         return self.execute_query(query, (user_id, offset, limit))
@@ -166,13 +165,17 @@ class ChatRepository(BaseRepository):
             cursor = conn.cursor()
             cursor.execute(command, (session_id, sender, content, message_type))
             result = cursor.fetchone()
-            conn.commit()
             
-            # Update session's updated_at timestamp
-            self.execute_command(
-                "UPDATE chat_sessions SET updated_at = GETUTCDATE() WHERE id = ?",
-                (session_id,)
-            )
+            # Update session's updated_at timestamp and summary in the same transaction
+            cursor.execute("""
+                UPDATE chat_sessions
+                SET updated_at = GETUTCDATE(),
+                    message_count = message_count + 1,
+                    last_message_at = ?,
+                    last_message_preview = ?
+                WHERE id = ?
+            """, (result[1], make_message_preview(content), session_id))
+            conn.commit()
             
             return {
                 "id": result[0],
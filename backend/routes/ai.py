@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException, Header, UploadFile, File
 from pydantic import BaseModel
 from utils.chat import verify_api_key, transcribe_audio_file
+from utils.transcription_jobs import get_transcription_jobs
+import asyncio
+import time
 
 router = APIRouter()
 
@@ -30,3 +33,34 @@ def transcribe_audio(
     - Local Whisper model (free, runs locally)
     """
     return transcribe_audio_file(file, language=language, method=method)
+
+@router.post("/transcribe/jobs", status_code=202)
+def submit_transcription_job(
+    file: UploadFile = File(...),
+    language: str = "auto",
+    method: str = "auto"
+):
+    """
+    Queue audio for transcription and return a job id immediately.
+    
+    Poll GET /transcribe/jobs/{job_id} for the result. Audio that was already
+    transcribed (same content, language and method) completes immediately.
+    """
+    job = get_transcription_jobs().submit(file, language=language, method=method)
+    return job.to_dict()
+
+@router.get("/transcribe/jobs/{job_id}")
+async def get_transcription_job(job_id: str, wait: float = 0):
+    """
+    Get the status of a transcription job.
+    
+    wait: seconds (up to 30) to hold the request until the job finishes
+    """
+    job = get_transcription_jobs().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Transcription job not found")
+    
+    deadline = time.monotonic() + min(max(wait, 0), 30)
+    while not job.done and time.monotonic() < deadline:
+        await asyncio.sleep(0.25)
+    return job.to_dict()
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Header
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Header, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import jwt
 import os
 from services.chat_service import ChatService
 from utils.chat import verify_api_key
+from utils.performance import format_server_timing
 from config.settings import AI_PROVIDERS, DEFAULT_AI_PROVIDER, OPENAI_ASSISTANT_ENABLED
 
 router = APIRouter()
@@ -30,6 +31,15 @@ class ChatGenerateRequest(BaseModel):
 class UpdateSessionTitleRequest(BaseModel):
     title: str
 
+class ChatSyncMessage(BaseModel):
+    client_id: str = Field(..., min_length=1, max_length=64)  # generated by the client, stable across retries
+    session_id: int
+    content: str
+    message_type: str = "text"
+
+class ChatSyncRequest(BaseModel):
+    messages: List[ChatSyncMessage]
+
 def get_user_id_from_token(authorization: str):
     """Helper function to extract user_id from JWT token"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -76,13 +86,30 @@ def get_ai_providers():
 
 @router.get("/chat/sessions")
 def get_chat_sessions(
+    authorization: str = Header(None),
+    limit: int = 20,
+    offset: int = 0,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+):
+    """Get user's chat sessions
+    
+    Pass ``next_before`` from a page as ``before`` for older sessions, or
+    ``next_after`` as ``after`` for sessions updated since, instead of ``offset``.
+    """
+    user_id = get_user_id_from_token(authorization)
+    return ChatService.get_user_sessions(user_id, limit, offset, before, after)
+
+@router.get("/chat/search")
+def search_chat_messages(
+    q: str,
     authorization: str = Header(None),
     limit: int = 20,
     offset: int = 0
 ):
-    """Get user's chat sessions"""
+    """Search the user's chat history, best matches first"""
     user_id = get_user_id_from_token(authorization)
-    return ChatService.get_user_sessions(user_id, limit, offset)
+    return ChatService.search_messages(user_id, q, min(max(limit, 1), 100), max(offset, 0))
 
 @router.get("/chat/sessions/{session_id}")
 def get_chat_session(
@@ -98,11 +125,17 @@ def get_chat_session_messages(
     session_id: int,
     authorization: str = Header(None),
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None
 ):
-    """Get messages for a specific chat session"""
+    """Get messages for a specific chat session
+    
+    Pass ``before_id`` (oldest loaded message id) to load earlier history or
+    ``after_id`` (newest loaded message id) to catch up, instead of ``offset``.
+    """
     user_id = get_user_id_from_token(authorization)
-    return ChatService.get_session_messages(session_id, user_id, limit, offset)
+    return ChatService.get_session_messages(session_id, user_id, limit, offset, before_id, after_id)
 
 @router.post("/chat/sessions/{session_id}/messages")
 def save_chat_message(
@@ -114,9 +147,23 @@ def save_chat_message(
     user_id = get_user_id_from_token(authorization)
     return ChatService.save_user_message(session_id, user_id, request.content, request.message_type)
 
+@router.post("/chat/sync")
+def sync_chat_messages(
+    request: ChatSyncRequest,
+    authorization: str = Header(None)
+):
+    """Store messages an offline client queued, across sessions, in one request
+    
+    Returns a status per message ("created", "duplicate" or "rejected") in
+    request order; retrying the same batch is safe.
+    """
+    user_id = get_user_id_from_token(authorization)
+    return ChatService.sync_messages(user_id, [m.model_dump() for m in request.messages])
+
 @router.post("/chat/generate")
 def generate_chat_response(
     request: ChatGenerateRequest,
+    response: Response,
     x_api_key: str = Header(None),
     authorization: str = Header(None)
 ):
@@ -125,7 +172,7 @@ def generate_chat_response(
     x_api_key = verify_api_key(x_api_key, API_KEY_CREDITS)
     user_id = get_user_id_from_token(authorization)
     
-    return ChatService.process_chat_message(
+    result = ChatService.process_chat_message(
         request.session_id, 
         user_id, 
         request.prompt, 
@@ -134,6 +181,17 @@ def generate_chat_response(
         request.message_type
     )
 
+    # Expose the per-stage breakdown to browser devtools / APM via Server-Timing
+    timings = result.get("timings") if isinstance(result, dict) else None
+    if timings:
+        processing_time = result.get("processing_time")
+        response.headers["Server-Timing"] = format_server_timing(
+            timings,
+            processing_time * 1000 if processing_time is not None else None
+        )
+    
+    return result
+
 @router.put("/chat/sessions/{session_id}")
 def update_chat_session_title(
     session_id: int,
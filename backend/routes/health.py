@@ -1,6 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from middleware.database_middleware import get_db_stats
 from database.connection import get_connection_pool, get_pool_stats, DatabaseConnection
+from database.chat_write_behind import get_chat_write_behind_stats
+from utils.whisper_pool import get_whisper_pool_stats
+from utils.transcription_cache import get_transcription_cache
+from utils.transcription_jobs import get_transcription_job_stats
 
 router = APIRouter()
 
@@ -41,12 +45,24 @@ async def database_stats():
         return {
             "connection_pool": pool_stats,
             "request_statistics": middleware_stats,
+            "chat_write_behind": get_chat_write_behind_stats(),
             "recommendations": get_performance_recommendations(pool_stats, middleware_stats)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get database stats: {e}")
 
+@router.get("/health/transcription")
+async def transcription_stats():
+    """Transcription metrics: Whisper worker pool, background jobs and result cache"""
+    stats = get_whisper_pool_stats()
+    return {
+        "status": "active" if stats else "idle",
+        "whisper_pool": stats,
+        "jobs": get_transcription_job_stats(),
+        "result_cache": get_transcription_cache().get_stats()
+    }
+
 def get_performance_recommendations(pool_stats, request_stats):
     """Generate performance recommendations based on current stats"""
     recommendations = []
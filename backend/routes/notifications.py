@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
 import jwt
 import os
 from services.notification_service import (
     create_notification, get_user_notifications, get_unread_count,
     mark_notification_as_read, mark_all_notifications_as_read,
-    delete_notification, clear_all_notifications, create_system_notification
+    delete_notification, clear_all_notifications, create_system_notification,
+    get_notification_changes_since, bulk_update_notifications
 )
 from services.subscription_service import create_targeted_disaster_notification
+from services.notification_hub import get_notification_hub
 from utils.chat import verify_api_key
 
 router = APIRouter()
@@ -37,6 +41,14 @@ class TargetedNotificationRequest(BaseModel):
     message: str
     type: str = "warning"
 
+class BulkNotificationRequest(BaseModel):
+    action: str  # read, delete
+    ids: Optional[List[int]] = None  # omit to apply to every notification matching the filter
+    unread_only: bool = False
+    type: Optional[str] = None
+    disaster_type: Optional[str] = None
+    before: Optional[int] = None  # only notifications with a lower id
+
 def get_user_id_from_token(authorization: str):
     """Helper function to extract user_id from JWT token"""
     if not authorization or not authorization.startswith("Bearer "):
@@ -54,17 +66,66 @@ def get_user_id_from_token(authorization: str):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Real-time push channel
+@router.websocket("/notifications/ws")
+async def notifications_websocket(websocket: WebSocket, token: str = None):
+    """
+    Push notification events to the authenticated user.
+    
+    Authenticate with ?token=<JWT>. On connect the current unread count is
+    sent, then every notification_created / notification_read /
+    notification_deleted / notifications_cleared / unread_count_updated
+    event for the user as it happens.
+    """
+    try:
+        user_id = get_user_id_from_token(f"Bearer {token}" if token else None)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    
+    await websocket.accept()
+    hub = get_notification_hub()
+    queue = hub.subscribe(user_id)
+    
+    async def forward_events():
+        while True:
+            await websocket.send_json(await queue.get())
+    
+    sender = asyncio.create_task(forward_events())
+    try:
+        count = await run_in_threadpool(get_unread_count, user_id)
+        await websocket.send_json({"type": "unread_count_updated", "count": count})
+        # Client messages are ignored; receiving just detects the disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        hub.unsubscribe(user_id, queue)
+
 # User notification endpoints
 @router.get("/notifications")
 def get_notifications(
     authorization: str = Header(None),
     limit: int = 50,
     offset: int = 0,
-    unread_only: bool = False
+    unread_only: bool = False,
+    before: Optional[str] = None
+):
+    """Get notifications for the authenticated user (pass next_before as before for the next page)"""
+    user_id = get_user_id_from_token(authorization)
+    return get_user_notifications(user_id, limit, offset, unread_only, before)
+
+@router.get("/notifications/changes")
+def get_notifications_changes(
+    authorization: str = Header(None),
+    since: Optional[str] = None,
+    limit: int = 200
 ):
-    """Get notifications for the authenticated user"""
+    """Notifications created, read or deleted since a sync cursor (omit since, or reset=true, means reload)"""
     user_id = get_user_id_from_token(authorization)
-    return get_user_notifications(user_id, limit, offset, unread_only)
+    return get_notification_changes_since(user_id, since, limit)
 
 @router.get("/notifications/unread-count")
 def get_notifications_unread_count(authorization: str = Header(None)):
@@ -98,6 +159,16 @@ def mark_all_notifications_read(authorization: str = Header(None)):
     user_id = get_user_id_from_token(authorization)
     return mark_all_notifications_as_read(user_id)
 
+@router.post("/notifications/bulk")
+def bulk_update_user_notifications(
+    request: BulkNotificationRequest,
+    authorization: str = Header(None)
+):
+    """Mark read or delete many notifications by id list and/or filter"""
+    user_id = get_user_id_from_token(authorization)
+    return bulk_update_notifications(user_id, request.action, request.ids, request.unread_only,
+                                     request.type, request.disaster_type, request.before)
+
 @router.delete("/notifications/{notification_id}")
 def delete_user_notification(
     notification_id: int,
@@ -137,13 +208,14 @@ def get_notification_users_admin(
     message: str = None,
     notification_type: str = None,
     disaster_type: Optional[str] = None,
-    location: Optional[str] = None
+    location: Optional[str] = None,
+    message_id: Optional[int] = None
 ):
     """Get all users who received a specific notification (admin only)"""
     from services.notification_service import get_notification_users
     # Verify admin authentication
     get_user_id_from_token(authorization)
-    return get_notification_users(title, message, notification_type, disaster_type, location)
+    return get_notification_users(title, message, notification_type, disaster_type, location, message_id)
 
 @router.get("/admin/notifications/stats")
 def get_notification_stats_admin(authorization: str = Header(None)):
@@ -103,7 +103,8 @@ def submit_report(report: ReportRequest, authorization: str = Header(None)):
                 location=report.location,
                 title=f"Disaster Report: {report.disaster_type}",
                 message=f"A {report.disaster_type} has been reported in {report.location}. {report.title}",
-                notification_type="warning"
+                notification_type="warning",
+                coalesce=True
             )
         except Exception as e:
             print(f"Failed to send targeted notifications: {e}")
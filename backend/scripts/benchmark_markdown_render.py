@@ -0,0 +1,90 @@
+"""
+Microbenchmark: single-pass markdown renderer vs. the legacy regex passes.
+
+Compares rendering a complete response once, and rendering it while it is
+streamed token by token (the legacy functions have to re-render the whole
+buffer for every token; the incremental renderer only processes new text).
+
+Usage: python scripts/benchmark_markdown_render.py [repeats]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.chat import md_table_to_html
+from utils.markdown_stream import StreamingMarkdownRenderer, render_markdown
+
+SAMPLE = """**Amaran banjir** untuk kawasan berikut. Sila *ikut arahan* pihak berkuasa.
+
+| Negeri | Daerah | Tahap | Pusat pemindahan |
+|---|---|---|---|
+| Kelantan | Kuala Krai | **Bahaya** | 12 |
+| Pahang | Temerloh | *Amaran* | 5 |
+| Terengganu | Dungun | Waspada | 3 |
+
+Flood warnings are **active** for the districts above. Keep *emergency kits* ready
+and monitor official updates. Call 999 in an emergency.
+""" * 4
+
+_ITALIC = re.compile(r'(?<!\*)\*(\w[^*]+\w)\*(?!\*)')
+_BOLD = re.compile(r'\*\*(.+?)\*\*')
+
+
+def legacy_render(text):
+    """The post-processing generate_response used before utils.markdown_stream"""
+    text = re.sub(r'(?<!\*)\*(\w[^*]+\w)\*(?!\*)', r'_\1_', text)
+    text = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', text)
+    return md_table_to_html(text)
+
+
+def legacy_compiled_render(text):
+    """Legacy passes with precompiled patterns, for a fair baseline"""
+    return md_table_to_html(_BOLD.sub(r'<b>\1</b>', _ITALIC.sub(r'_\1_', text)))
+
+
+def tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def legacy_streamed(chunks):
+    buffer = ""
+    html = ""
+    for chunk in chunks:
+        buffer += chunk
+        html = legacy_render(buffer)
+    return html
+
+
+def incremental_streamed(chunks):
+    renderer = StreamingMarkdownRenderer()
+    html = "".join(renderer.feed(chunk) for chunk in chunks)
+    return html + renderer.finish()
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chunks = tokens(SAMPLE)
+    assert render_markdown(SAMPLE) == legacy_render(SAMPLE)
+    assert incremental_streamed(chunks) == render_markdown(SAMPLE)
+
+    cases = [
+        ("full text: legacy regex passes", lambda: legacy_render(SAMPLE), repeats),
+        ("full text: legacy, precompiled", lambda: legacy_compiled_render(SAMPLE), repeats),
+        ("full text: single-pass renderer", lambda: render_markdown(SAMPLE), repeats),
+        (f"streamed ({len(chunks)} chunks): legacy re-render", lambda: legacy_streamed(chunks), max(1, repeats // 20)),
+        (f"streamed ({len(chunks)} chunks): incremental", lambda: incremental_streamed(chunks), max(1, repeats // 20)),
+    ]
+
+    print(f"Sample: {len(SAMPLE)} characters")
+    print("-" * 72)
+    for name, func, number in cases:
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print(f"{name:<48} {best * 1e6:>12.1f} us/op")
+
+
+if __name__ == "__main__":
+    main()
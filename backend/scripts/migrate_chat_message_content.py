@@ -0,0 +1,32 @@
+"""
+Migration script to convert chat_messages.content from TEXT to NVARCHAR(MAX)
+Copies the data in small batches, then swaps the columns under a short exclusive lock
+"""
+
+import sys
+import os
+
+# Add parent directory to path to import database modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from database.chat_archive import migrate_chat_message_content
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Chat Message Content Migration")
+    print("=" * 60)
+    print()
+
+    try:
+        migrated = migrate_chat_message_content()
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+    if migrated:
+        print("\n✅ Migration completed successfully!")
+    else:
+        print("\n✅ No migration needed - content is already NVARCHAR(MAX) or another worker is migrating it.")
+    sys.exit(0)
@@ -0,0 +1,135 @@
+"""
+Token-budgeted conversation context for chat sessions.
+
+Recent turns are kept verbatim while they fit CHAT_CONTEXT_TOKEN_BUDGET;
+older turns are folded into a rolling summary stored in the session
+metadata (``context_summary`` / ``context_summary_through``), so long
+sessions send a bounded prompt instead of their whole history. History
+older than the fetched window that was never summarized (sessions that
+predate the summary, or long offline syncs) is folded in the first time
+the window moves past it.
+"""
+from config.settings import (
+    CHAT_CONTEXT_TOKEN_BUDGET, CHAT_CONTEXT_SUMMARY_TOKENS
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+# tiktoken gives exact counts for OpenAI models; fall back to ~4 chars/token
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Per-message framing overhead (role markers) in chat-format prompts
+MESSAGE_TOKEN_OVERHEAD = 4
+# Characters of each older turn kept in the rolling summary
+SUMMARY_LINE_LENGTH = 160
+
+def count_tokens(text):
+    """Count prompt tokens for text"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def _role(message):
+    return "user" if message["sender_type"] == "user" else "assistant"
+
+def _summary_line(message):
+    speaker = "User" if message["sender_type"] == "user" else "Assistant"
+    text = " ".join((message.get("content") or "").split())
+    if len(text) > SUMMARY_LINE_LENGTH:
+        text = text[:SUMMARY_LINE_LENGTH - 3].rstrip() + "..."
+    return f"{speaker}: {text}"
+
+class ChatContextManager:
+    """Select recent turns under a token budget and maintain the rolling summary"""
+
+    def __init__(self, token_budget=None, summary_tokens=None):
+        self.token_budget = token_budget or CHAT_CONTEXT_TOKEN_BUDGET
+        self.summary_tokens = min(summary_tokens or CHAT_CONTEXT_SUMMARY_TOKENS, self.token_budget)
+
+    def build(self, messages, session_metadata=None, load_older=None):
+        """Build the context for the next turn.
+
+        Args:
+            messages: Recent messages in chronological order (as returned by
+                get_chat_messages), excluding the prompt being answered
+            session_metadata: The session's metadata dict
+            load_older: Optional callable(before_id) returning the messages
+                before ``messages`` in chronological order; called when the
+                summary does not reach the oldest of them
+
+        Returns:
+            Dict with ``messages`` (role/content dicts to send verbatim),
+            ``summary`` (text or None), ``tokens`` (estimated prompt tokens)
+            and ``metadata_updates`` (summary fields to persist, or None)
+        """
+        session_metadata = session_metadata or {}
+        summary = session_metadata.get("context_summary") or ""
+        summarized_through = session_metadata.get("context_summary_through") or 0
+
+        # Seed the summary from history the window skipped; only the newest
+        # lines survive the summary budget, so one page of it is enough
+        first_id = messages[0].get("id") if messages else None
+        if load_older and first_id and first_id > summarized_through + 1:
+            older = [m for m in load_older(first_id) if m.get("id") and m["id"] > summarized_through]
+            messages = older + list(messages)
+
+        # Keep the newest turns that fit next to a full-size summary
+        available = self.token_budget - (self.summary_tokens if summary or messages else 0)
+        recent = []
+        used = 0
+        for message in reversed(messages):
+            cost = count_tokens(message.get("content")) + MESSAGE_TOKEN_OVERHEAD
+            if recent and used + cost > available:
+                break
+            recent.append(message)
+            used += cost
+        recent.reverse()
+        evicted = messages[:len(messages) - len(recent)]
+
+        # Fold turns that just left the window into the summary; pending
+        # (unsaved) messages have no id yet and are folded on a later turn
+        to_fold = [m for m in evicted if m.get("id") and m["id"] > summarized_through]
+        metadata_updates = None
+        if to_fold:
+            lines = (summary.split("\n") if summary else []) + [_summary_line(m) for m in to_fold]
+            # Oldest lines are dropped first once the summary outgrows its budget
+            while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_tokens:
+                lines.pop(0)
+            summary = "\n".join(lines)
+            summarized_through = to_fold[-1]["id"]
+            metadata_updates = {
+                "context_summary": summary,
+                "context_summary_through": summarized_through,
+            }
+
+        return {
+            "messages": [{"role": _role(m), "content": m["content"]} for m in recent if m.get("content")],
+            "summary": summary or None,
+            "tokens": used + count_tokens(summary),
+            "metadata_updates": metadata_updates,
+        }
+
+    @staticmethod
+    def format_summary_instructions(summary):
+        """Instruction text that hands the rolling summary to the model"""
+        return f"Summary of the earlier conversation in this chat:\n{summary}"
+
+    @staticmethod
+    def format_context_instructions(context):
+        """Instruction text that hands a whole context from build (summary and recent turns) to the model"""
+        parts = []
+        if context.get("summary"):
+            parts.append(ChatContextManager.format_summary_instructions(context["summary"]))
+        if context.get("messages"):
+            turns = "\n".join(
+                f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" for m in context["messages"]
+            )
+            parts.append(f"Most recent messages in this chat, oldest first:\n{turns}")
+        return "\n\n".join(parts) or None
@@ -2,15 +2,42 @@ from fastapi import HTTPException
 from database import (
     create_chat_session, get_user_chat_sessions, get_chat_session,
     save_chat_message, get_chat_messages, update_chat_session_title,
-    delete_chat_session
+    delete_chat_session, get_user_chat_sessions_page, get_chat_messages_page, parse_session_cursor,
+    search_chat_messages, sync_chat_messages
 )
 from services.openai_assistant_service import get_openai_assistant_service
-from config.settings import AI_PROVIDERS, DEFAULT_AI_PROVIDER, OPENAI_ASSISTANT_ENABLED
+from config.settings import (
+    AI_PROVIDERS, DEFAULT_AI_PROVIDER, OPENAI_ASSISTANT_ENABLED,
+    CHAT_IO_WORKERS, CHAT_ASYNC_BOT_PERSIST, CHAT_CONTEXT_MAX_MESSAGES, CHAT_SYNC_MAX_MESSAGES
+)
+from services.chat_context import ChatContextManager
+from utils.performance import StageTimer
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
+# Shared pool for chat DB round trips that can overlap with the model call
+_chat_io_executor = ThreadPoolExecutor(max_workers=CHAT_IO_WORKERS, thread_name_prefix="chat-io")
+
+# Token-budgeted prompt context with rolling summaries
+_context_manager = ChatContextManager()
+
+def _submit_timed(timer, stage_name, func, *args, **kwargs):
+    """Run func on the chat I/O pool, recording its duration under stage_name"""
+    def run():
+        with timer.stage(stage_name):
+            return func(*args, **kwargs)
+    return _chat_io_executor.submit(run)
+
+def _log_background_failure(future):
+    """Done-callback for fire-and-forget writes"""
+    exc = future.exception()
+    if exc is not None:
+        logger.error(f"Background chat write failed: {exc}")
+
 class ChatService:
     """Service class for handling chat operations"""
     
@@ -35,12 +62,17 @@ class ChatService:
             raise HTTPException(status_code=500, detail="Failed to create chat session")
     
     @staticmethod
-    def get_user_sessions(user_id, limit=20, offset=0):
-        """Get user's chat sessions"""
+    def get_user_sessions(user_id, limit=20, offset=0, before=None, after=None):
+        """Get user's chat sessions (keyset-paged when a before/after cursor is given)"""
+        try:
+            before_position = parse_session_cursor(before) if before is not None else None
+            after_position = parse_session_cursor(after) if after is not None else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid session cursor")
         try:
-            sessions = get_user_chat_sessions(user_id, limit, offset)
-            logger.info(f"Retrieved {len(sessions)} chat sessions for user {user_id}")
-            return {"sessions": sessions, "total": len(sessions)}
+            page = get_user_chat_sessions_page(user_id, limit, offset, before_position, after_position)
+            logger.info(f"Retrieved {len(page['sessions'])} chat sessions for user {user_id}")
+            return page
         except Exception as e:
             logger.error(f"Failed to get chat sessions for user {user_id}: {e}")
             raise HTTPException(status_code=500, detail="Failed to retrieve chat sessions")
@@ -60,23 +92,39 @@ class ChatService:
             raise HTTPException(status_code=500, detail="Failed to retrieve chat session")
     
     @staticmethod
-    def get_session_messages(session_id, user_id, limit=50, offset=0):
-        """Get messages for a chat session"""
+    def get_session_messages(session_id, user_id, limit=50, offset=0, before_id=None, after_id=None):
+        """Get messages for a chat session (keyset-paged when before_id/after_id is given)"""
         try:
-            messages = get_chat_messages(session_id, user_id, limit, offset)
-            return {"messages": messages, "total": len(messages)}
+            return get_chat_messages_page(session_id, user_id, limit, offset,
+                                          before_id=before_id, after_id=after_id)
         except Exception as e:
             logger.error(f"Failed to get messages for session {session_id}: {e}")
             raise HTTPException(status_code=500, detail="Failed to retrieve messages")
     
     @staticmethod
-    def save_user_message(session_id, user_id, content, message_type="text"):
-        """Save a user message to the session"""
+    def search_messages(user_id, query, limit=20, offset=0):
+        """Search the user's chat history; results are ranked hits with snippets"""
+        if not query or not query.strip():
+            raise HTTPException(status_code=400, detail="Search query is required")
+        try:
+            return search_chat_messages(user_id, query, limit, offset)
+        except Exception as e:
+            logger.error(f"Failed to search messages for user {user_id}: {e}")
+            raise HTTPException(status_code=500, detail="Failed to search messages")
+    
+    @staticmethod
+    def save_user_message(session_id, user_id, content, message_type="text", verify_session=True):
+        """Save a user message to the session
+        
+        Pass ``verify_session=False`` when the caller has already checked that
+        the session belongs to the user.
+        """
         try:
             # Verify session belongs to user
-            session = get_chat_session(session_id, user_id)
-            if not session:
-                raise HTTPException(status_code=404, detail="Chat session not found")
+            if verify_session:
+                session = get_chat_session(session_id, user_id)
+                if not session:
+                    raise HTTPException(status_code=404, detail="Chat session not found")
             
             # Save the message
             message = save_chat_message(session_id, "user", content, message_type)
@@ -89,10 +137,29 @@ class ChatService:
             raise HTTPException(status_code=500, detail="Failed to save message")
     
     @staticmethod
-    def save_bot_message(session_id, content, message_type="text"):
+    def sync_messages(user_id, items):
+        """Store messages queued by an offline client in one request
+        
+        Each item carries a client-generated ``client_id``; replaying an item
+        returns its original message with status "duplicate" instead of
+        storing it twice.
+        """
+        if len(items) > CHAT_SYNC_MAX_MESSAGES:
+            raise HTTPException(status_code=413, detail=f"At most {CHAT_SYNC_MAX_MESSAGES} messages per sync request")
+        try:
+            results = sync_chat_messages(user_id, items)
+            created = sum(1 for r in results if r["status"] == "created")
+            logger.info(f"Synced {len(items)} messages for user {user_id} ({created} new)")
+            return {"results": results}
+        except Exception as e:
+            logger.error(f"Failed to sync messages for user {user_id}: {e}")
+            raise HTTPException(status_code=500, detail="Failed to sync messages")
+    
+    @staticmethod
+    def save_bot_message(session_id, content, message_type="text", metadata=None):
         """Save a bot response to the session"""
         try:
-            message = save_chat_message(session_id, "bot", content, message_type)
+            message = save_chat_message(session_id, "bot", content, message_type, metadata)
             logger.info(f"Saved bot message to session {session_id}")
             return message
         except Exception as e:
@@ -101,12 +168,31 @@ class ChatService:
     
     @staticmethod
     def process_chat_message(session_id, user_id, prompt, x_api_key=None, api_key_credits=None, message_type="text"):
-        """Process a chat message and generate AI response"""
+        """Process a chat message and generate AI response
+        
+        Independent I/O is overlapped: the user-message insert runs alongside
+        the model call, and history is loaded while the thread is being
+        looked up or created. The bot reply is only written once the user
+        message is stored, so message order is preserved; with
+        CHAT_ASYNC_BOT_PERSIST the reply is returned without waiting for that
+        write.
+        
+        Every turn sends only the rolling summary of older turns plus the
+        recent messages that fit CHAT_CONTEXT_TOKEN_BUDGET; the updated
+        summary is saved to the session metadata with the thread id.
+        
+        The returned ``timings`` dict holds per-stage durations in milliseconds
+        (session lookup, persistence, thread handling, run queue/execution and
+        tool-call round trips) so slow hops can be identified. Overlapping
+        stages can sum to more than ``processing_time``.
+        """
         start_time = time.time()
+        timer = StageTimer()
         
         try:
             # Verify session belongs to user
-            session = get_chat_session(session_id, user_id)
+            with timer.stage("session_lookup"):
+                session = get_chat_session(session_id, user_id)
             if not session:
                 raise HTTPException(status_code=404, detail="Chat session not found")
             
@@ -114,85 +200,121 @@ class ChatService:
             ai_provider = session.get('ai_provider', DEFAULT_AI_PROVIDER)
             logger.info(f"Processing message with provider: {ai_provider}")
             
-            # Save user message with correct message_type
-            user_message = ChatService.save_user_message(session_id, user_id, prompt, message_type)
+            # Save user message with correct message_type; ownership was checked above
+            user_future = _submit_timed(
+                timer, "user_persist",
+                ChatService.save_user_message, session_id, user_id, prompt, message_type, verify_session=False
+            )
             
-            # Generate AI response based on provider
-            if ai_provider == "openai":
-                if not OPENAI_ASSISTANT_ENABLED:
-                    raise HTTPException(status_code=503, detail="OpenAI Assistant is not configured. Please contact the administrator.")
-
-                try:
-                    openai_service = get_openai_assistant_service()
-                except ValueError as exc:
-                    logger.error(f"OpenAI configuration error: {exc}")
-                    raise HTTPException(status_code=503, detail=str(exc))
+            try:
+                # Generate AI response based on provider
+                if ai_provider == "openai":
+                    if not OPENAI_ASSISTANT_ENABLED:
+                        raise HTTPException(status_code=503, detail="OpenAI Assistant is not configured. Please contact the administrator.")
 
-                openai_thread_id = session.get('openai_thread_id')
-
-                # If no thread exists yet, seed the new thread with recent chat history
-                history_messages = None
-                if not openai_thread_id:
                     try:
-                        previous_messages = get_chat_messages(
-                            session_id,
-                            user_id,
-                            limit=20,
-                            offset=0,
-                            order_desc=True
-                        )
+                        openai_service = get_openai_assistant_service()
+                    except ValueError as exc:
+                        logger.error(f"OpenAI configuration error: {exc}")
+                        raise HTTPException(status_code=503, detail=str(exc))
 
-                        if previous_messages:
-                            history_messages = [
-                                {
-                                    "role": "user" if msg["sender_type"] == "user" else "assistant",
-                                    "content": msg["content"]
-                                }
-                                for msg in previous_messages
-                            ]
-                    except Exception as exc:
-                        # History seeding should not block the request
-                        logger.warning(f"Unable to seed chat history for session {session_id}: {exc}")
+                    openai_thread_id = session.get('openai_thread_id')
 
-                try:
-                    ai_response_data = openai_service.generate_response(
-                        prompt=prompt,
-                        thread_id=openai_thread_id,
-                        history=history_messages
+                    # Recent history is budgeted into the prompt context sent with the run
+                    history_future = _submit_timed(
+                        timer, "history_fetch",
+                        get_chat_messages, session_id, user_id,
+                        limit=CHAT_CONTEXT_MAX_MESSAGES, offset=0, order_desc=True
                     )
-                except Exception as exc:
-                    logger.error(f"OpenAI Assistant response error: {exc}")
-                    raise HTTPException(status_code=502, detail="Failed to generate response using OpenAI Assistant.")
+                    context = {}
+                    def history_loader():
+                        context.update(ChatService._resolve_history(session, user_id, history_future, user_future) or {})
+                        return context or None
 
-                if not openai_thread_id and ai_response_data.get('thread_id'):
-                    from database.chat import update_session_metadata
                     try:
-                        update_session_metadata(session_id, {'openai_thread_id': ai_response_data['thread_id']})
-                    except Exception as e:
-                        logger.warning(f"Could not update session metadata: {e}")
+                        ai_response_data = openai_service.generate_response(
+                            prompt=prompt,
+                            thread_id=openai_thread_id,
+                            history=history_loader
+                        )
+                    except Exception as exc:
+                        logger.error(f"OpenAI Assistant response error: {exc}")
+                        raise HTTPException(status_code=502, detail="Failed to generate response using OpenAI Assistant.")
+
+                    timer.merge(ai_response_data.get('timings'))
 
-                ai_response = {
-                    'response': ai_response_data['response'],
-                    'map_commands': ai_response_data.get('map_commands', []),
-                    'provider': 'openai',
-                    'duration': ai_response_data['duration']
+                    ai_response = {
+                        'response': ai_response_data['response'],
+                        'map_commands': ai_response_data.get('map_commands', []),
+                        'provider': 'openai',
+                        'duration': ai_response_data['duration']
+                    }
+                    
+                else:
+                    # Fallback to OpenAI if no provider specified
+                    raise HTTPException(status_code=400, detail="OpenAI is the only supported provider. Please ensure OPENAI_API_KEY and OPENAI_ASSISTANT_ID are configured.")
+            except Exception:
+                # Never leave the user-message write running behind a failed turn
+                wait([user_future])
+                raise
+            
+            # The reply must not be stored ahead of the prompt; a failed prompt
+            # insert fails the turn before anything else is written
+            user_message = user_future.result()
+            
+            writes = []
+            metadata_updates = dict(context.get('metadata_updates') or {})
+            if ai_response_data.get('thread_id') and ai_response_data['thread_id'] != openai_thread_id:
+                metadata_updates['openai_thread_id'] = ai_response_data['thread_id']
+            if metadata_updates:
+                from database.chat import update_session_metadata
+                thread_future = _submit_timed(
+                    timer, "thread_persist",
+                    update_session_metadata, session_id, metadata_updates
+                )
+                writes.append(thread_future)
+            
+            # Save bot response along with the timings gathered so far; the
+            # bot_persist stage itself is only reported in the response/logs
+            bot_future = _submit_timed(
+                timer, "bot_persist",
+                ChatService.save_bot_message, session_id, ai_response['response'],
+                metadata={"timings": timer.as_dict()}
+            )
+            
+            if CHAT_ASYNC_BOT_PERSIST:
+                for future in writes + [bot_future]:
+                    future.add_done_callback(_log_background_failure)
+                bot_message = {
+                    "id": None,
+                    "session_id": session_id,
+                    "sender_type": "bot",
+                    "content": ai_response['response'],
+                    "message_type": "text",
+                    "timestamp": datetime.now().isoformat(),
+                    "pending": True
                 }
-                
             else:
-                # Fallback to OpenAI if no provider specified
-                raise HTTPException(status_code=400, detail="OpenAI is the only supported provider. Please ensure OPENAI_API_KEY and OPENAI_ASSISTANT_ID are configured.")
-            
-            # Save bot response
-            bot_message = ChatService.save_bot_message(session_id, ai_response['response'])
+                wait(writes + [bot_future])
+                for future in writes:
+                    if future.exception() is not None:
+                        logger.warning(f"Could not update session metadata: {future.exception()}")
+                bot_message = bot_future.result()
             
             total_duration = time.time() - start_time
-            logger.info(f"Total message processing time: {total_duration:.2f}s")
+            timings = timer.as_dict()
+            logger.info(
+                f"Total message processing time: {total_duration:.2f}s "
+                + " ".join(f"{name}={duration}ms" for name, duration in timings.items()),
+                extra={"session_id": session_id, "stage_timings": timings, "processing_time": total_duration}
+            )
             
             return {
                 "user_message": user_message,
                 "bot_message": bot_message,
                 "ai_response": ai_response,
-                "processing_time": total_duration
+                "processing_time": total_duration,
+                "timings": timings
             }
             
         except HTTPException:
@@ -201,6 +323,45 @@ class ChatService:
             logger.error(f"Failed to process chat message for session {session_id}: {e}")
             raise HTTPException(status_code=500, detail=f"Failed to process chat message: {str(e)}")
     
+    @staticmethod
+    def _resolve_history(session, user_id, history_future, user_future):
+        """Turn the concurrently fetched history into the budgeted prompt context.
+        
+        The fetch races with the insert of the current prompt, so that message
+        is dropped here; send_message adds it to the thread itself. When the
+        fetch was cut at CHAT_CONTEXT_MAX_MESSAGES, older history is loaded
+        for the summary if it was never summarized.
+        """
+        session_id = session['id']
+        try:
+            previous_messages = history_future.result()
+        except Exception as exc:
+            # History seeding should not block the request
+            logger.warning(f"Unable to seed chat history for session {session_id}: {exc}")
+            return None
+
+        current_id = current_ref = None
+        try:
+            current = user_future.result()
+            # Write-behind messages have no id yet but carry a client_ref
+            current_id, current_ref = current.get("id"), current.get("client_ref")
+        except Exception:
+            pass
+
+        def load_older(before_id):
+            return get_chat_messages(session_id, user_id, limit=CHAT_CONTEXT_MAX_MESSAGES, before_id=before_id)
+
+        fetched_all = len(previous_messages or []) < CHAT_CONTEXT_MAX_MESSAGES
+        previous_messages = [
+            msg for msg in previous_messages or []
+            if not (current_id is not None and msg.get("id") == current_id)
+            and not (current_ref is not None and msg.get("client_ref") == current_ref)
+        ]
+        metadata = session.get('metadata') or {}
+        if not previous_messages and not metadata.get('context_summary'):
+            return None
+        return _context_manager.build(previous_messages, metadata, None if fetched_all else load_older)
+    
     @staticmethod
     def update_session_title(session_id, user_id, title):
         """Update chat session title"""
@@ -231,8 +392,12 @@ class ChatService:
     
     @staticmethod
     def get_session_context(session_id, user_id, last_messages=5):
-        """Get recent messages from session for context"""
+        """Get the rolling summary plus recent messages (within the token budget) for context"""
         try:
+            session = get_chat_session(session_id, user_id)
+            if not session:
+                return ""
+            
             # Pull the most recent messages for better continuity
             messages = get_chat_messages(
                 session_id,
@@ -241,11 +406,14 @@ class ChatService:
                 offset=0,
                 order_desc=True
             )
+            window = _context_manager.build(messages, session.get('metadata'))
             
             # Format messages for context
             context = []
-            for msg in messages[-last_messages:]:  # Get last N messages
-                role = "Human" if msg['sender_type'] == 'user' else "Assistant"
+            if window['summary']:
+                context.append(ChatContextManager.format_summary_instructions(window['summary']))
+            for msg in window['messages']:
+                role = "Human" if msg['role'] == 'user' else "Assistant"
                 context.append(f"{role}: {msg['content']}")
             
             return "\n".join(context)
@@ -0,0 +1,135 @@
+"""
+Bulk read/delete of one user's notifications in bounded chunks.
+
+A single UPDATE or DELETE over a large mailbox locks thousands of rows,
+escalates to a table lock and holds up fan-out inserts for every user
+until it finishes. Here the target rows (an id list, a filter, or both)
+are processed NOTIFICATION_BULK_CHUNK_SIZE at a time with UPDATE/DELETE
+TOP. Each chunk is its own short transaction that applies the chunk's
+counter deltas, so the counters stay exact even while fan-out adds new
+notifications between chunks, and fan-out waits for one chunk at most.
+"""
+from database import get_db_conn
+from config.settings import NOTIFICATION_BULK_CHUNK_SIZE
+from services.notification_counters import ensure_counters, bump_counters
+from services.notification_sync import TOMBSTONE_OUTPUT
+from services.notification_stats import adjust_message_stats, stats_deltas
+
+BULK_ACTIONS = ("read", "delete")
+
+# SQL Server accepts at most 2100 parameters per statement
+MAX_IDS_PER_CHUNK = 2000
+
+
+def _filter_clause(unread_only=False, notification_type=None, disaster_type=None, before=None):
+    """Extra WHERE conditions (each starting with AND) and their parameters"""
+    sql, params = "", []
+    if unread_only:
+        sql += " AND is_read = 0"
+    if before is not None:
+        sql += " AND id < ?"
+        params.append(before)
+    message_conditions = []
+    if notification_type:
+        message_conditions.append("m.type = ?")
+        params.append(notification_type)
+    if disaster_type:
+        message_conditions.append("m.disaster_type = ?")
+        params.append(disaster_type)
+    if message_conditions:
+        sql += f"""
+            AND EXISTS (
+                SELECT 1 FROM notification_messages m
+                WHERE m.id = notifications.message_id AND {" AND ".join(message_conditions)}
+            )"""
+    return sql, params
+
+
+def _apply_chunk(cursor, user_id, action, where, params, chunk_size):
+    """Update or delete up to chunk_size matching rows; returns (ids, unread count after)"""
+    ensure_counters(cursor, user_id)
+    if action == "read":
+        cursor.execute(f"""
+            UPDATE TOP (?) notifications
+            SET is_read = 1
+            OUTPUT INSERTED.id, INSERTED.message_id
+            WHERE user_id = ? AND is_read = 0 {where}
+        """, [chunk_size, user_id] + params)
+        rows = cursor.fetchall()
+        ids = [row[0] for row in rows]
+        unread_delta, total_delta = -len(ids), 0
+        message_deltas = stats_deltas([(row[1], False) for row in rows], deleted=False)
+    else:
+        cursor.execute(f"""
+            DELETE TOP (?) FROM notifications
+            {TOMBSTONE_OUTPUT}
+            OUTPUT DELETED.id, DELETED.is_read, DELETED.message_id
+            WHERE user_id = ? {where}
+        """, [chunk_size, user_id] + params)
+        rows = cursor.fetchall()
+        ids = [row[0] for row in rows]
+        unread_delta, total_delta = -sum(1 for row in rows if not row[1]), -len(ids)
+        message_deltas = stats_deltas([(row[2], row[1]) for row in rows], deleted=True)
+    _, unread = bump_counters(cursor, user_id, total_delta, unread_delta)
+    adjust_message_stats(cursor, message_deltas)
+    return ids, unread
+
+
+def bulk_mutate_notifications(user_id, action, notification_ids=None, unread_only=False, notification_type=None,
+                              disaster_type=None, before=None, chunk_size=NOTIFICATION_BULK_CHUNK_SIZE,
+                              on_chunk=None):
+    """
+    Mark read or delete a user's notifications matching the id list and filter.
+
+    notification_ids=None means every notification that matches the
+    filter. on_chunk(ids, unread) is called after each committed chunk.
+    Returns (rows changed, unread count afterwards).
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown bulk action: {action}")
+    chunk_size = max(1, min(chunk_size, MAX_IDS_PER_CHUNK))
+    where, params = _filter_clause(unread_only, notification_type, disaster_type, before)
+
+    if notification_ids is None:
+        id_chunks = None
+    else:
+        unique_ids = sorted({int(notification_id) for notification_id in notification_ids})
+        id_chunks = [unique_ids[i:i + chunk_size] for i in range(0, len(unique_ids), chunk_size)]
+
+    conn = None
+    changed = 0
+    unread = None
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        conn.autocommit = False
+
+        def run(chunk_where, chunk_params):
+            nonlocal changed, unread
+            ids, unread = _apply_chunk(cursor, user_id, action, chunk_where, chunk_params, chunk_size)
+            conn.commit()
+            changed += len(ids)
+            if ids and on_chunk is not None:
+                on_chunk(ids, unread)
+            return len(ids)
+
+        if id_chunks is None:
+            # Repeat until a chunk comes back short: nothing matching is left
+            while run(where, params) == chunk_size:
+                pass
+        else:
+            for ids in id_chunks:
+                run(where + f" AND id IN ({', '.join(['?'] * len(ids))})", params + ids)
+        return changed, unread
+    finally:
+        if conn is not None:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()
+                    conn.autocommit = True
+            except Exception:
+                pass
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,114 @@
+"""
+Per-user notification counters (total and unread).
+
+notification_counters holds one row per user, so the badge and feed
+totals are a primary-key lookup instead of two COUNT(*) scans. Every
+mutation in notification_service adjusts the row inside its own
+transaction:
+
+    ensure_counters(cursor, user_id)   # before the mutation; takes the row lock
+    ... INSERT / UPDATE / DELETE notifications ...
+    bump_counters(cursor, user_id, total_delta, unread_delta)
+
+A missing row is seeded from the real counts, so users who had
+notifications before this table existed need no backfill. A background
+job periodically reconciles the counters (and the per-message counts in
+notification_stats) with the notifications table to repair any drift
+(for example rows removed by a cascade).
+"""
+import threading
+
+from database import get_db_conn
+from config.settings import NOTIFICATION_COUNTER_RECONCILE_INTERVAL
+from services.notification_stats import reconcile_notification_message_stats
+
+
+def ensure_counters(cursor, user_id):
+    """Create the user's counter row from the current counts if missing, and lock it"""
+    cursor.execute("""
+        IF NOT EXISTS (SELECT 1 FROM notification_counters WITH (UPDLOCK, HOLDLOCK) WHERE user_id = ?)
+            INSERT INTO notification_counters (user_id, total, unread)
+            SELECT ?, COUNT(*), ISNULL(SUM(CASE WHEN is_read = 0 THEN 1 ELSE 0 END), 0)
+            FROM notifications WHERE user_id = ?
+    """, (user_id, user_id, user_id))
+
+
+def bump_counters(cursor, user_id, total_delta=0, unread_delta=0):
+    """Apply deltas to the user's counters; returns (total, unread) after the change"""
+    cursor.execute("""
+        UPDATE notification_counters
+        SET total = CASE WHEN total + ? < 0 THEN 0 ELSE total + ? END,
+            unread = CASE WHEN unread + ? < 0 THEN 0 ELSE unread + ? END,
+            updated_at = GETDATE()
+        OUTPUT INSERTED.total, INSERTED.unread
+        WHERE user_id = ?
+    """, (total_delta, total_delta, unread_delta, unread_delta, user_id))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+
+def read_counters(cursor, user_id):
+    """Return (total, unread) for a user, seeding the row on first use"""
+    cursor.execute("SELECT total, unread FROM notification_counters WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    if row:
+        return row[0], row[1]
+    ensure_counters(cursor, user_id)
+    cursor.execute("SELECT total, unread FROM notification_counters WHERE user_id = ?", (user_id,))
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def reconcile_notification_counters():
+    """Recompute counters that drifted from the notifications table; returns rows fixed"""
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE c
+            SET total = ISNULL(n.total, 0), unread = ISNULL(n.unread, 0), updated_at = GETDATE()
+            FROM notification_counters c
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS total, SUM(CASE WHEN is_read = 0 THEN 1 ELSE 0 END) AS unread
+                FROM notifications
+                GROUP BY user_id
+            ) n ON n.user_id = c.user_id
+            WHERE c.total <> ISNULL(n.total, 0) OR c.unread <> ISNULL(n.unread, 0)
+        """)
+        fixed = cursor.rowcount
+        conn.commit()
+        if fixed:
+            print(f"Reconciled notification counters for {fixed} users")
+        return fixed
+    except Exception as e:
+        print(f"Error reconciling notification counters: {e}")
+        return 0
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+
+
+# Background reconciliation
+_reconcile_thread = None
+_stop_event = threading.Event()
+
+def _run_reconciliation(interval):
+    while not _stop_event.wait(interval):
+        reconcile_notification_counters()
+        reconcile_notification_message_stats()
+
+def start_notification_counter_reconciliation(interval=NOTIFICATION_COUNTER_RECONCILE_INTERVAL):
+    """Start the periodic counter reconciliation (once per process; interval <= 0 disables it)"""
+    global _reconcile_thread
+    if interval <= 0 or (_reconcile_thread is not None and _reconcile_thread.is_alive()):
+        return
+    _stop_event.clear()
+    _reconcile_thread = threading.Thread(
+        target=_run_reconciliation, args=(interval,), name="notification-counters", daemon=True
+    )
+    _reconcile_thread.start()
+
+def stop_notification_counter_reconciliation():
+    _stop_event.set()
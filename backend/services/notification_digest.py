@@ -0,0 +1,297 @@
+"""
+Coalescing of bursts of disaster alerts for the same disaster type and location.
+
+Every submitted report triggers a targeted alert to the subscribers of
+its (disaster_type, location), so a flood reported twenty times means
+twenty notifications and twenty emails to the same people. With
+coalescing, the first alert for a key opens a window of
+NOTIFICATION_DIGEST_WINDOW seconds and goes out as before
+(notification and email). Within the window:
+
+- an alert with the same title and message as one already in the
+  window is dropped;
+- any other alert is merged: the window's one notification message is
+  rewritten as a digest of all reports so far and every receipt of it is
+  marked unread again (counters, stats and the sync rowversion move
+  with it), so nothing new is fanned out and no email is sent.
+
+When the window closes, the background flush sends subscribers a single
+digest email with the reports merged since the first email. The
+audience of a targeted alert depends only on (disaster_type, location),
+so a window per key is a window per (user, disaster_type, location).
+"""
+import hashlib
+import logging
+import threading
+
+from database import get_db_conn
+from config.settings import NOTIFICATION_DIGEST_WINDOW, NOTIFICATION_DIGEST_FLUSH_INTERVAL
+from services.notification_fanout import insert_message
+from services.notification_stats import adjust_message_stats
+from services.notification_sync import current_version
+
+logger = logging.getLogger(__name__)
+
+# Receipts re-surfaced per transaction; ids go in an IN list, so stay under 2100 parameters
+RESURFACE_BATCH_SIZE = 1000
+# Reports quoted in a digest; older ones are summarized as a count
+DIGEST_MAX_ITEMS = 10
+# Flushed windows are kept this long before they are pruned
+DIGEST_KEEP_DAYS = 1
+
+_stop_event = threading.Event()
+_flush_thread = None
+
+
+def _content_hash(title, message):
+    return hashlib.sha256(f"{title}\n{message}".encode("utf-8")).hexdigest()
+
+
+def digest_content(disaster_type, location, items):
+    """Title and message for a window's notification from its [(title, message)] items, oldest first"""
+    title = f"{len(items)} reports: {disaster_type} in {location}"[:255]
+    lines = [f"- {message}" for _, message in reversed(items[-DIGEST_MAX_ITEMS:])]
+    if len(items) > DIGEST_MAX_ITEMS:
+        lines.append(f"...and {len(items) - DIGEST_MAX_ITEMS} earlier reports")
+    return title, "\n".join(lines)
+
+
+def claim_digest(disaster_type, location, title, message, notification_type="warning", window=NOTIFICATION_DIGEST_WINDOW):
+    """
+    Record an alert in the open window for its key, opening one if needed.
+
+    Returns {"status": "new" | "merged" | "duplicate", "message_id",
+    "title", "message"}: for "new" the caller fans out to message_id and
+    emails as usual; for "merged" title/message are the rewritten digest.
+    """
+    content_hash = _content_hash(title, message)
+    conn = get_db_conn()
+    try:
+        conn.autocommit = False
+        cursor = conn.cursor()
+
+        # Range lock on the key, so concurrent alerts for it queue up instead of each opening a window
+        cursor.execute("""
+            SELECT TOP 1 id, message_id
+            FROM notification_digests WITH (UPDLOCK, HOLDLOCK)
+            WHERE disaster_type = ? AND location = ? AND flushed_at IS NULL
+                AND opened_at >= DATEADD(second, -?, GETDATE())
+            ORDER BY opened_at DESC
+        """, (disaster_type, location, window))
+        row = cursor.fetchone()
+
+        if row is None:
+            message_id = insert_message(cursor, title, message, notification_type, disaster_type, location)
+            cursor.execute("""
+                INSERT INTO notification_digests (disaster_type, location, message_id)
+                OUTPUT INSERTED.id
+                VALUES (?, ?, ?)
+            """, (disaster_type, location, message_id))
+            digest_id = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT INTO notification_digest_items (digest_id, content_hash, title, message, emailed)
+                VALUES (?, ?, ?, ?, 1)
+            """, (digest_id, content_hash, title, message))
+            conn.commit()
+            return {"status": "new", "message_id": message_id, "title": title, "message": message}
+
+        digest_id, message_id = row[0], row[1]
+        cursor.execute("""
+            SELECT 1 FROM notification_digest_items WHERE digest_id = ? AND content_hash = ?
+        """, (digest_id, content_hash))
+        if cursor.fetchone():
+            conn.commit()
+            return {"status": "duplicate", "message_id": message_id, "title": title, "message": message}
+
+        cursor.execute("""
+            INSERT INTO notification_digest_items (digest_id, content_hash, title, message)
+            VALUES (?, ?, ?, ?)
+        """, (digest_id, content_hash, title, message))
+        cursor.execute("SELECT title, message FROM notification_digest_items WHERE digest_id = ? ORDER BY id", (digest_id,))
+        items = [(item[0], item[1]) for item in cursor.fetchall()]
+        digest_title, digest_message = digest_content(disaster_type, location, items)
+        cursor.execute("""
+            UPDATE notification_messages SET title = ?, message = ? WHERE id = ?
+        """, (digest_title, digest_message, message_id))
+        conn.commit()
+        return {"status": "merged", "message_id": message_id, "title": digest_title, "message": digest_message}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            conn.autocommit = True
+            conn.close()
+        except Exception:
+            pass
+
+
+def resurface_digest(message_id, batch_size=RESURFACE_BATCH_SIZE, on_batch=None):
+    """
+    Mark every receipt of a merged message unread again, in batches.
+
+    Touching each receipt sets resurfaced_at and bumps its rowversion, so
+    delta sync clients fetch the new content. created_at is left alone:
+    it is the feed's keyset order, and moving a receipt within it would
+    make clients paging with a cursor skip it or see it twice.
+    on_batch(rows, unread_counts) gets the batch's (id, user_id) rows
+    and {user_id: unread} for users whose count went up. Returns the
+    number of receipts updated.
+    """
+    conn = get_db_conn()
+    updated = 0
+    try:
+        cursor = conn.cursor()
+        # Receipts updated below get newer versions, which is how the loop knows they are done
+        watermark = current_version(cursor)
+        while True:
+            conn.autocommit = False
+            cursor.execute("""
+                SELECT TOP (?) id, user_id FROM notifications
+                WHERE message_id = ? AND row_version <= CAST(CAST(? AS BIGINT) AS BINARY(8))
+            """, (batch_size, message_id, watermark))
+            candidates = cursor.fetchall()
+            if not candidates:
+                conn.commit()
+                break
+
+            # Counter rows first, the same lock order as every other notification write.
+            # Users without one yet are seeded from the real counts on their next read.
+            user_ids = sorted({candidate[1] for candidate in candidates})
+            cursor.execute(f"""
+                SELECT user_id FROM notification_counters WITH (UPDLOCK, HOLDLOCK)
+                WHERE user_id IN ({", ".join(["?"] * len(user_ids))})
+            """, user_ids)
+            cursor.fetchall()
+            ids = [candidate[0] for candidate in candidates]
+            cursor.execute(f"""
+                UPDATE notifications
+                SET is_read = 0, resurfaced_at = GETDATE()
+                OUTPUT INSERTED.id, INSERTED.user_id, DELETED.is_read
+                WHERE id IN ({", ".join(["?"] * len(ids))})
+                    AND row_version <= CAST(CAST(? AS BIGINT) AS BINARY(8))
+            """, ids + [watermark])
+            rows = cursor.fetchall()
+
+            were_read = sorted({row[1] for row in rows if row[2]})
+            unread_counts = {}
+            if were_read:
+                cursor.execute(f"""
+                    UPDATE notification_counters
+                    SET unread = unread + 1, updated_at = GETDATE()
+                    OUTPUT INSERTED.user_id, INSERTED.unread
+                    WHERE user_id IN ({", ".join(["?"] * len(were_read))})
+                """, were_read)
+                unread_counts = {row[0]: row[1] for row in cursor.fetchall()}
+                adjust_message_stats(cursor, {message_id: (0, sum(1 for row in rows if row[2]))})
+            conn.commit()
+
+            updated += len(rows)
+            if on_batch is not None:
+                on_batch([(row[0], row[1]) for row in rows], unread_counts)
+            if len(candidates) < batch_size:
+                break
+        return updated
+    except Exception:
+        if not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        try:
+            conn.autocommit = True
+            conn.close()
+        except Exception:
+            pass
+
+
+def _reopen_digest(cursor, digest_id):
+    """Hand a claimed window back to the next flush, unless it is old enough to be pruned"""
+    cursor.execute("""
+        UPDATE notification_digests SET flushed_at = NULL
+        WHERE id = ? AND opened_at >= DATEADD(day, -?, GETDATE())
+    """, (digest_id, DIGEST_KEEP_DAYS))
+
+
+def flush_notification_digests(window=NOTIFICATION_DIGEST_WINDOW):
+    """Send one digest email for each closed window that merged reports; returns windows emailed"""
+    from services.email_notification_service import send_targeted_notification_emails
+
+    conn = None
+    emailed = 0
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        # Claiming the windows first means two workers never email the same one
+        cursor.execute("""
+            UPDATE notification_digests
+            SET flushed_at = GETDATE()
+            OUTPUT INSERTED.id, INSERTED.disaster_type, INSERTED.location
+            WHERE flushed_at IS NULL AND opened_at < DATEADD(second, -?, GETDATE())
+        """, (window,))
+        closed = cursor.fetchall()
+
+        for digest_id, disaster_type, location in closed:
+            try:
+                cursor.execute("""
+                    SELECT id, title, message FROM notification_digest_items
+                    WHERE digest_id = ? AND emailed = 0
+                    ORDER BY id
+                """, (digest_id,))
+                rows = cursor.fetchall()
+                if not rows:
+                    continue
+                title, message = digest_content(disaster_type, location, [(row[1], row[2]) for row in rows])
+                result = send_targeted_notification_emails(
+                    disaster_type, location, f"Update: {title}", message, "warning"
+                )
+                if result.get("total_users") and not result.get("emails_sent"):
+                    raise Exception(result.get("error") or f"all {result['total_users']} emails failed")
+
+                # Marked only once sent, so a failed send is retried on the next flush
+                item_ids = [row[0] for row in rows]
+                cursor.execute(f"""
+                    UPDATE notification_digest_items SET emailed = 1
+                    WHERE id IN ({", ".join(["?"] * len(item_ids))})
+                """, item_ids)
+                emailed += 1
+                print(f"Sent {disaster_type}/{location} digest of {len(rows)} reports "
+                      f"to {result.get('emails_sent', 0)} subscribers")
+            except Exception as e:
+                logger.error(f"Digest email for {disaster_type}/{location} failed, retrying next flush: {e}")
+                try:
+                    _reopen_digest(cursor, digest_id)
+                except Exception as reopen_error:
+                    logger.error(f"Could not reopen digest {digest_id}: {reopen_error}")
+
+        cursor.execute("""
+            DELETE FROM notification_digests WHERE flushed_at < DATEADD(day, -?, GETDATE())
+        """, (DIGEST_KEEP_DAYS,))
+        return emailed
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _run_flush():
+    while not _stop_event.wait(NOTIFICATION_DIGEST_FLUSH_INTERVAL):
+        try:
+            flush_notification_digests()
+        except Exception as e:
+            logger.error(f"Notification digest flush failed: {e}")
+
+
+def start_notification_digest_flush():
+    """Start the background digest email flush (once per process; off when coalescing is disabled)"""
+    global _flush_thread
+    if NOTIFICATION_DIGEST_WINDOW <= 0 or (_flush_thread is not None and _flush_thread.is_alive()):
+        return
+    _stop_event.clear()
+    _flush_thread = threading.Thread(target=_run_flush, name="notification-digest", daemon=True)
+    _flush_thread.start()
+
+
+def stop_notification_digest_flush():
+    _stop_event.set()
@@ -0,0 +1,168 @@
+"""
+Set-based fan-out of one notification to many users.
+
+The content is written once to notification_messages; every recipient
+gets a narrow notifications row (user_id, message_id, is_read,
+created_at) pointing at it. The audience is loaded once into a session
+temp table: straight from users for "everyone", or with
+fast_executemany for an explicit id list (deduplicated, unknown ids
+dropped). It is then walked in user_id ranges of
+NOTIFICATION_FANOUT_BATCH_SIZE. Each range is its own short transaction
+that seeds any missing counter rows, bumps the counters, and inserts all
+of the range's receipts with one INSERT ... SELECT. That is three
+statements per batch instead of one round trip per user, and a failure
+loses at most the current batch.
+
+The default batch of 1000 users stays well under SQL Server's lock
+escalation threshold: a statement holding about 5000 locks on one table
+or index is escalated to a table lock. The receipt INSERT takes a key
+lock per row on notifications and on each of its indexes, so batches
+near 5000 would lock the whole table and block every reader until the
+batch commits.
+"""
+from database import get_db_conn
+from config.settings import NOTIFICATION_FANOUT_BATCH_SIZE
+from services.notification_stats import insert_message_stats, adjust_message_stats
+
+AUDIENCE_TABLE = "#notification_audience"
+
+
+def insert_message(cursor, title, message, notification_type="info", disaster_type=None, location=None):
+    """Store notification content once; returns the notification_messages id"""
+    cursor.execute("""
+        INSERT INTO notification_messages (title, message, type, disaster_type, location, created_at)
+        OUTPUT INSERTED.id
+        VALUES (?, ?, ?, ?, ?, GETDATE())
+    """, (title, message, notification_type, disaster_type, location))
+    message_id = cursor.fetchone()[0]
+    insert_message_stats(cursor, message_id)
+    return message_id
+
+
+def _load_audience(cursor, user_ids, message_id=None):
+    cursor.execute(f"IF OBJECT_ID('tempdb..{AUDIENCE_TABLE}') IS NOT NULL DROP TABLE {AUDIENCE_TABLE}")
+    cursor.execute(f"CREATE TABLE {AUDIENCE_TABLE} (user_id INT PRIMARY KEY)")
+    if user_ids is None:
+        cursor.execute(f"INSERT INTO {AUDIENCE_TABLE} (user_id) SELECT id FROM users")
+    else:
+        unique_ids = sorted({int(user_id) for user_id in user_ids})
+        if unique_ids:
+            cursor.fast_executemany = True
+            cursor.executemany(f"INSERT INTO {AUDIENCE_TABLE} (user_id) VALUES (?)",
+                               [(user_id,) for user_id in unique_ids])
+            cursor.execute(f"""
+                DELETE a FROM {AUDIENCE_TABLE} a
+                WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = a.user_id)
+            """)
+    if message_id is not None:
+        # An already stored message: only users without a receipt for it yet
+        cursor.execute(f"""
+            DELETE a FROM {AUDIENCE_TABLE} a
+            WHERE EXISTS (SELECT 1 FROM notifications n WHERE n.message_id = ? AND n.user_id = a.user_id)
+        """, (message_id,))
+    cursor.execute(f"SELECT COUNT(*) FROM {AUDIENCE_TABLE}")
+    return cursor.fetchone()[0]
+
+
+def _next_batch_end(cursor, after, batch_size):
+    cursor.execute(f"""
+        SELECT MAX(user_id) FROM (
+            SELECT TOP (?) user_id FROM {AUDIENCE_TABLE} WHERE user_id > ? ORDER BY user_id
+        ) batch
+    """, (batch_size, after))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _fan_out_batch(cursor, low, high, message_id):
+    """Insert the receipts for audience users in (low, high]; returns [(id, user_id)]"""
+    # Seed counters from the current counts before the insert (see notification_counters)
+    cursor.execute(f"""
+        INSERT INTO notification_counters (user_id, total, unread)
+        SELECT a.user_id, COUNT(n.id), ISNULL(SUM(CASE WHEN n.is_read = 0 THEN 1 ELSE 0 END), 0)
+        FROM {AUDIENCE_TABLE} a
+        LEFT JOIN notifications n ON n.user_id = a.user_id
+        WHERE a.user_id > ? AND a.user_id <= ?
+            AND NOT EXISTS (
+                SELECT 1 FROM notification_counters c WITH (UPDLOCK, HOLDLOCK) WHERE c.user_id = a.user_id
+            )
+        GROUP BY a.user_id
+    """, (low, high))
+    cursor.execute(f"""
+        UPDATE c
+        SET total = c.total + 1, unread = c.unread + 1, updated_at = GETDATE()
+        FROM notification_counters c
+        INNER JOIN {AUDIENCE_TABLE} a ON a.user_id = c.user_id
+        WHERE a.user_id > ? AND a.user_id <= ?
+    """, (low, high))
+    cursor.execute(f"""
+        INSERT INTO notifications (user_id, message_id, created_at)
+        OUTPUT INSERTED.id, INSERTED.user_id
+        SELECT a.user_id, ?, GETDATE()
+        FROM {AUDIENCE_TABLE} a
+        WHERE a.user_id > ? AND a.user_id <= ?
+    """, (message_id, low, high))
+    created = [(row[0], row[1]) for row in cursor.fetchall()]
+    adjust_message_stats(cursor, {message_id: (len(created), len(created))})
+    return created
+
+
+def fan_out_notification(title, message, notification_type="info", disaster_type=None, location=None,
+                         user_ids=None, batch_size=NOTIFICATION_FANOUT_BATCH_SIZE, on_batch=None, progress=None,
+                         message_id=None):
+    """
+    Create the same notification for user_ids (None means every user).
+
+    message_id points the receipts at an already stored message (see
+    notification_digest) instead of storing the content again; users
+    who already have a receipt for it are skipped.
+
+    on_batch(created) is called after each committed batch with its
+    [(notification_id, user_id)] rows, and progress(done, total) after
+    each batch. Returns the number of notifications created.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        total = _load_audience(cursor, user_ids, message_id)
+        if total == 0:
+            return 0
+
+        conn.autocommit = False
+        if message_id is None:
+            message_id = insert_message(cursor, title, message, notification_type, disaster_type, location)
+        done = 0
+        low = 0
+        while True:
+            high = _next_batch_end(cursor, low, batch_size)
+            if high is None:
+                break
+            created = _fan_out_batch(cursor, low, high, message_id)
+            conn.commit()
+
+            done += len(created)
+            low = high
+            if on_batch is not None:
+                on_batch(created)
+            if progress is not None:
+                progress(done, total)
+            if total > batch_size:
+                print(f"Notification fan-out '{title}': {done}/{total} users")
+        return done
+    finally:
+        if cursor is not None:
+            try:
+                if not conn.autocommit:
+                    # Drop an unfinished batch; switching autocommit back on would commit it
+                    conn.rollback()
+                    conn.autocommit = True
+                cursor.execute(f"IF OBJECT_ID('tempdb..{AUDIENCE_TABLE}') IS NOT NULL DROP TABLE {AUDIENCE_TABLE}")
+            except Exception:
+                pass
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
@@ -0,0 +1,146 @@
+"""
+In-process pub/sub hub behind the /notifications/ws WebSocket.
+
+Each connected socket registers an asyncio queue under its user id. The
+notification service publishes events from request threads, and they are
+handed to the socket's event loop with call_soon_threadsafe. When
+NOTIFICATIONS_REDIS_URL is set (and redis is installed), every event is
+also published to a Redis channel so sockets held by other workers get it;
+each worker ignores its own messages when they come back.
+
+Event payloads match what the frontend's useNotifications hook handles:
+notification_created, notification_updated, notification_read, notification_deleted,
+notifications_read and notifications_deleted (one bulk chunk each),
+notifications_cleared and unread_count_updated.
+"""
+import asyncio
+import threading
+import logging
+import json
+import uuid
+
+from config.settings import NOTIFICATIONS_REDIS_URL, NOTIFICATIONS_WS_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = "notifications:events"
+
+
+class NotificationHub:
+    """Per-user fan-out of notification events to open WebSockets"""
+
+    def __init__(self, queue_size=NOTIFICATIONS_WS_QUEUE_SIZE, redis_url=NOTIFICATIONS_REDIS_URL):
+        self.queue_size = queue_size
+        self._subscribers = {}   # user_id -> {queue: loop}
+        # Guards the subscriber map and stats; publishers, the Redis listener
+        # and every socket's event loop touch both
+        self._lock = threading.Lock()
+        self._origin = uuid.uuid4().hex
+        self._redis = None
+        self._listener = None
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+        if redis_url:
+            self._start_redis(redis_url)
+
+    # ---- subscriptions (called on the socket's event loop) -------------
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is not None:
+                queues.pop(queue, None)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    # ---- publishing (safe from any thread) ----------------------------
+
+    def publish(self, user_id, event):
+        """Deliver an event to the user's sockets here and, if configured, on other workers"""
+        with self._lock:
+            self.stats["published"] += 1
+        self._deliver(user_id, event)
+        if self._redis is not None:
+            try:
+                self._redis.publish(REDIS_CHANNEL, json.dumps(
+                    {"origin": self._origin, "user_id": user_id, "event": event}, default=str
+                ))
+            except Exception as e:
+                logger.warning(f"Redis publish failed: {e}")
+
+    def publish_many(self, user_ids, event):
+        for user_id in user_ids:
+            self.publish(user_id, event)
+
+    def _deliver(self, user_id, event):
+        with self._lock:
+            targets = list(self._subscribers.get(user_id, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # Loop already closed; the socket's cleanup will unsubscribe it
+                pass
+
+    def _put(self, queue, event):
+        try:
+            queue.put_nowait(event)
+            outcome = "delivered"
+        except asyncio.QueueFull:
+            # Slow client: drop rather than grow without bound
+            outcome = "dropped"
+        with self._lock:
+            self.stats[outcome] += 1
+
+    # ---- cross-worker fan-out -----------------------------------------
+
+    def _start_redis(self, redis_url):
+        try:
+            import redis
+            self._redis = redis.Redis.from_url(redis_url)
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(REDIS_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Notification Redis fan-out disabled: {e}")
+            self._redis = None
+            return
+        self._listener = threading.Thread(target=self._listen, args=(pubsub,), name="notification-hub-redis", daemon=True)
+        self._listener.start()
+
+    def _listen(self, pubsub):
+        for message in pubsub.listen():
+            try:
+                data = json.loads(message["data"])
+                if data.get("origin") != self._origin:
+                    self._deliver(data["user_id"], data["event"])
+            except Exception as e:
+                logger.warning(f"Bad notification event from Redis: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["connections"] = sum(len(queues) for queues in self._subscribers.values())
+        stats["redis"] = self._redis is not None
+        return stats
+
+
+# Global hub instance
+_notification_hub = None
+_notification_hub_lock = threading.Lock()
+
+def get_notification_hub():
+    global _notification_hub
+    if _notification_hub is None:
+        with _notification_hub_lock:
+            if _notification_hub is None:
+                _notification_hub = NotificationHub()
+    return _notification_hub
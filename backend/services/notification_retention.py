@@ -0,0 +1,227 @@
+"""
+Notification retention and the background purge job.
+
+With NOTIFICATION_RETENTION_ENABLED, notifications are deleted once their
+message is older than the limit for its type
+(NOTIFICATION_RETENTION_BY_TYPE, else NOTIFICATION_RETENTION_DAYS).
+Every run also removes messages nobody holds any more and tombstones
+older than the delta-sync window, so those tables stay bounded even with
+retention off.
+
+All deletes go in batches of NOTIFICATION_PURGE_BATCH_SIZE rows, each in
+its own short transaction with a pause in between, so the purge never
+escalates to a table lock or holds up feeds and fan-out. Deleted
+notifications get tombstones (sync clients drop them) and their owners'
+counters are adjusted in the same transaction. Run metrics are reported
+by get_notification_retention_stats for the admin stats endpoint.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from database import get_db_conn
+from config.settings import (
+    NOTIFICATION_RETENTION_ENABLED, NOTIFICATION_RETENTION_DAYS, NOTIFICATION_RETENTION_BY_TYPE,
+    NOTIFICATION_PURGE_BATCH_SIZE, NOTIFICATION_PURGE_BATCH_PAUSE, NOTIFICATION_PURGE_INTERVAL,
+    NOTIFICATION_TOMBSTONE_DAYS
+)
+from services.notification_sync import TOMBSTONE_OUTPUT
+from services.notification_stats import adjust_message_stats, stats_deltas
+
+logger = logging.getLogger(__name__)
+
+# Messages without receipts are kept this long so a fan-out still in progress is never raced
+ORPHAN_MESSAGE_GRACE_DAYS = 1
+
+_stop_event = threading.Event()
+_purge_thread = None
+_stats_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "last_run_at": None,
+    "last_run_seconds": None,
+    "last_run": {"notifications": 0, "messages": 0, "tombstones": 0},
+    "notifications_purged": 0,
+    "messages_purged": 0,
+    "tombstones_purged": 0,
+    "batches": 0,
+    "errors": 0,
+    "last_error": None,
+}
+
+
+def retention_rules(default_days=NOTIFICATION_RETENTION_DAYS, by_type=NOTIFICATION_RETENTION_BY_TYPE):
+    """[(type or None for "every other type", days)] for the rules that expire anything"""
+    rules = [(notification_type, days) for notification_type, days in sorted(by_type.items()) if days > 0]
+    if default_days > 0:
+        rules.append((None, default_days))
+    return rules
+
+
+def _rule_clause(notification_type, by_type):
+    if notification_type is not None:
+        return "m.type = ?", [notification_type]
+    if by_type:
+        return f"m.type NOT IN ({', '.join(['?'] * len(by_type))})", sorted(by_type)
+    return "1 = 1", []
+
+
+def _purge_notification_batch(conn, cursor, type_clause, type_params, days, batch_size):
+    """Delete one batch of expired receipts; returns rows deleted"""
+    try:
+        conn.autocommit = False
+        cursor.execute(f"""
+            SELECT TOP (?) n.id
+            FROM notification_messages m
+            INNER JOIN notifications n ON n.message_id = m.id
+            WHERE {type_clause} AND m.created_at < DATEADD(day, -?, GETDATE())
+        """, [batch_size] + type_params + [days])
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            conn.commit()
+            return 0
+
+        cursor.execute(f"""
+            DELETE FROM notifications
+            {TOMBSTONE_OUTPUT}
+            OUTPUT DELETED.user_id, DELETED.is_read, DELETED.message_id
+            WHERE id IN ({", ".join(["?"] * len(ids))})
+        """, ids)
+        deleted = cursor.fetchall()
+        deltas = {}
+        for user_id, is_read, _ in deleted:
+            total, unread = deltas.get(user_id, (0, 0))
+            deltas[user_id] = (total + 1, unread + (0 if is_read else 1))
+
+        # Rows for users without a counter yet are seeded from the real counts later
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            UPDATE notification_counters
+            SET total = CASE WHEN total < ? THEN 0 ELSE total - ? END,
+                unread = CASE WHEN unread < ? THEN 0 ELSE unread - ? END,
+                updated_at = GETDATE()
+            WHERE user_id = ?
+        """, [(total, total, unread, unread, user_id) for user_id, (total, unread) in deltas.items()])
+        adjust_message_stats(cursor, stats_deltas([(row[2], row[1]) for row in deleted], deleted=True))
+        conn.commit()
+        return len(ids)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def _purge_in_batches(cursor, statement, params, batch_size, pause):
+    """Repeat a DELETE TOP (?) statement until it removes nothing; returns rows deleted"""
+    deleted = 0
+    while not _stop_event.is_set():
+        cursor.execute(statement, [batch_size] + list(params))
+        count = cursor.rowcount
+        if count <= 0:
+            break
+        deleted += count
+        _count(batches=1)
+        time.sleep(pause)
+    return deleted
+
+
+def purge_expired_notifications(batch_size=NOTIFICATION_PURGE_BATCH_SIZE, pause=NOTIFICATION_PURGE_BATCH_PAUSE,
+                                enabled=NOTIFICATION_RETENTION_ENABLED, default_days=NOTIFICATION_RETENTION_DAYS,
+                                by_type=NOTIFICATION_RETENTION_BY_TYPE, tombstone_days=NOTIFICATION_TOMBSTONE_DAYS):
+    """One purge run; returns {"notifications", "messages", "tombstones"} rows deleted"""
+    started = time.time()
+    purged = {"notifications": 0, "messages": 0, "tombstones": 0}
+    conn = None
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+
+        if enabled:
+            for notification_type, days in retention_rules(default_days, by_type):
+                type_clause, type_params = _rule_clause(notification_type, by_type)
+                while not _stop_event.is_set():
+                    count = _purge_notification_batch(conn, cursor, type_clause, type_params, days, batch_size)
+                    if not count:
+                        break
+                    purged["notifications"] += count
+                    _count(batches=1)
+                    time.sleep(pause)
+
+        purged["messages"] = _purge_in_batches(cursor, """
+            DELETE TOP (?) m FROM notification_messages m
+            WHERE m.created_at < DATEADD(day, -?, GETDATE())
+                AND NOT EXISTS (SELECT 1 FROM notifications n WHERE n.message_id = m.id)
+        """, [ORPHAN_MESSAGE_GRACE_DAYS], batch_size, pause)
+
+        purged["tombstones"] = _purge_in_batches(cursor, """
+            DELETE TOP (?) FROM notification_tombstones WHERE deleted_at < DATEADD(day, -?, GETDATE())
+        """, [tombstone_days], batch_size, pause)
+
+        if any(purged.values()):
+            print(f"Notification purge removed {purged['notifications']} notifications, "
+                  f"{purged['messages']} messages, {purged['tombstones']} tombstones")
+        return purged
+    except Exception as e:
+        _count(errors=1)
+        _set(last_error=str(e))
+        raise
+    finally:
+        _count(runs=1, notifications_purged=purged["notifications"],
+               messages_purged=purged["messages"], tombstones_purged=purged["tombstones"])
+        _set(last_run_at=datetime.now().isoformat(), last_run_seconds=round(time.time() - started, 3), last_run=purged)
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def _set(**values):
+    with _stats_lock:
+        _stats.update(values)
+
+
+def get_notification_retention_stats():
+    """Purge metrics and the active policy, for the admin stats endpoint"""
+    with _stats_lock:
+        stats = dict(_stats, last_run=dict(_stats["last_run"]))
+    stats["policy"] = {
+        "enabled": NOTIFICATION_RETENTION_ENABLED,
+        "default_days": NOTIFICATION_RETENTION_DAYS or None,
+        "days_by_type": dict(NOTIFICATION_RETENTION_BY_TYPE),
+        "batch_size": NOTIFICATION_PURGE_BATCH_SIZE,
+        "interval_seconds": NOTIFICATION_PURGE_INTERVAL,
+    }
+    return stats
+
+
+def _run_purge():
+    while not _stop_event.is_set():
+        try:
+            purge_expired_notifications()
+        except Exception as e:
+            logger.error(f"Notification purge run failed: {e}")
+        _stop_event.wait(NOTIFICATION_PURGE_INTERVAL)
+
+
+def start_notification_purge():
+    """Start the background purge (once per process; NOTIFICATION_PURGE_INTERVAL <= 0 disables it)"""
+    global _purge_thread
+    if NOTIFICATION_PURGE_INTERVAL <= 0 or (_purge_thread is not None and _purge_thread.is_alive()):
+        return
+    _stop_event.clear()
+    _purge_thread = threading.Thread(target=_run_purge, name="notification-purge", daemon=True)
+    _purge_thread.start()
+
+
+def stop_notification_purge():
+    """Ask the purge thread to stop after its current batch"""
+    _stop_event.set()
@@ -4,6 +4,54 @@ from datetime import datetime
 from typing import List, Optional
 import json
 from services.email_notification_service import send_system_notification_emails, send_targeted_notification_emails
+from services.notification_hub import get_notification_hub
+from config.settings import NOTIFICATION_CHANGES_LIMIT
+from services.notification_counters import ensure_counters, bump_counters, read_counters
+from services.notification_fanout import fan_out_notification, insert_message
+from services.notification_bulk import BULK_ACTIONS, bulk_mutate_notifications
+from services.notification_stats import adjust_message_stats, stats_deltas, get_cached_notification_stats
+from services.notification_sync import TOMBSTONE_OUTPUT, current_sync_cursor, get_notification_changes
+from services.notification_retention import get_notification_retention_stats
+
+# Receipt rows joined to the content they share with the other recipients
+NOTIFICATION_SELECT = """
+    SELECT n.id, n.user_id, m.title, m.message, m.type, m.disaster_type, m.location, n.is_read, n.created_at
+    FROM notifications n
+    INNER JOIN notification_messages m ON m.id = n.message_id
+"""
+
+# The user feed also says when a merged digest last brought a receipt back
+# as unread; the feed stays ordered by the immutable (created_at, id)
+FEED_SELECT = """
+    SELECT n.id, n.user_id, m.title, m.message, m.type, m.disaster_type, m.location, n.is_read, n.created_at,
+           n.resurfaced_at
+    FROM notifications n
+    INNER JOIN notification_messages m ON m.id = n.message_id
+"""
+
+def publish_notification_event(user_ids, event):
+    """Push an event to the users' open /notifications/ws sockets (never fails the caller)"""
+    try:
+        get_notification_hub().publish_many(user_ids, event)
+    except Exception as e:
+        print(f"Error publishing notification event: {e}")
+
+def _created_event(notification_id, user_id, title, message, notification_type, disaster_type=None, location=None):
+    # Same shape as the items returned by get_user_notifications
+    return {
+        "type": "notification_created",
+        "notification": {
+            "id": notification_id,
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "type": notification_type,
+            "disaster_type": disaster_type,
+            "location": location,
+            "read": False,
+            "timestamp": datetime.now().isoformat()
+        }
+    }
 
 def get_notifications(user_id: int, limit: int = 10, offset: int = 0, unread_only: bool = False):
     """Get notifications for a user"""
@@ -11,17 +59,16 @@ def get_notifications(user_id: int, limit: int = 10, offset: int = 0, unread_onl
         conn = get_db_conn()
         cursor = conn.cursor()
         
-        where_clause = "WHERE user_id = ?"
+        where_clause = "WHERE n.user_id = ?"
         params = [user_id]
         
         if unread_only:
-            where_clause += " AND is_read = 0"
+            where_clause += " AND n.is_read = 0"
         
         query = f"""
-            SELECT id, user_id, title, message, type, disaster_type, location, is_read, created_at
-            FROM notifications 
+            {NOTIFICATION_SELECT}
             {where_clause}
-            ORDER BY created_at DESC
+            ORDER BY n.created_at DESC
             OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
         """
         
@@ -65,40 +112,50 @@ def create_notifications_table():
         
         if cursor.fetchone():
             print("Notifications table already exists")
-            # Check if we need to add new columns
+            # Check if we need to move content into notification_messages
             update_notifications_table_schema()
             return
-              # Create notifications table with enhanced schema
+        
+        # Content is stored once per message, one narrow receipt row per recipient
         cursor.execute("""
-            CREATE TABLE notifications (
+            IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'notification_messages')
+            CREATE TABLE notification_messages (
                 id INT IDENTITY(1,1) PRIMARY KEY,
-                user_id INT NOT NULL,
                 title NVARCHAR(255) NOT NULL,
-                message NVARCHAR(1000) NOT NULL,
-                type NVARCHAR(50) DEFAULT 'info', -- info, warning, danger, success
+                message NVARCHAR(MAX) NOT NULL,
+                type NVARCHAR(50) NOT NULL DEFAULT 'info', -- info, warning, danger, success
                 disaster_type NVARCHAR(100) NULL, -- Type of disaster (flood, earthquake, etc.)
                 location NVARCHAR(255) NULL, -- Location of the disaster/event
+                created_at DATETIME DEFAULT GETDATE()
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE notifications (
+                id INT IDENTITY(1,1) PRIMARY KEY,
+                user_id INT NOT NULL,
+                message_id INT NOT NULL,
                 is_read BIT DEFAULT 0,
                 created_at DATETIME DEFAULT GETDATE(),
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                CONSTRAINT FK_notifications_message_id FOREIGN KEY (message_id) REFERENCES notification_messages(id)
             )
         """)
         
         # Create index for better query performance
         cursor.execute("""
-            CREATE INDEX IX_notifications_user_id ON notifications(user_id)
+            CREATE INDEX IX_notifications_user_feed
+                ON notifications(user_id, created_at DESC, id DESC) INCLUDE (is_read, message_id)
         """)
         cursor.execute("""
-            CREATE INDEX IX_notifications_is_read ON notifications(is_read)
+            CREATE INDEX IX_notifications_user_unread
+                ON notifications(user_id, is_read, created_at DESC, id DESC) INCLUDE (message_id)
         """)
         cursor.execute("""
-            CREATE INDEX IX_notifications_created_at ON notifications(created_at)
+            CREATE INDEX IX_notifications_message_id ON notifications(message_id) INCLUDE (user_id, is_read, created_at)
         """)
         cursor.execute("""
-            CREATE INDEX IX_notifications_disaster_type ON notifications(disaster_type)
-        """)
-        cursor.execute("""
-            CREATE INDEX IX_notifications_location ON notifications(location)
+            IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_notification_messages_created_at')
+            CREATE INDEX IX_notification_messages_created_at ON notification_messages(created_at DESC)
         """)
         
         conn.commit()
@@ -113,96 +170,35 @@ def create_notifications_table():
             pass
 
 def update_notifications_table_schema():
-    """Update existing notifications table to add disaster_type and location columns"""
-    try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        
-        # Check if updated_at column exists and drop it
-        cursor.execute("""
-            SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = 'notifications' AND COLUMN_NAME = 'updated_at'
-        """)
-        if cursor.fetchone()[0] > 0:
-            print("Dropping updated_at column from notifications table...")
-            
-            # First drop the default constraint if it exists
-            cursor.execute("""
-                DECLARE @constraint_name nvarchar(200)
-                SELECT @constraint_name = NAME FROM SYS.DEFAULT_CONSTRAINTS
-                WHERE PARENT_OBJECT_ID = OBJECT_ID('notifications')
-                AND PARENT_COLUMN_ID = (SELECT column_id FROM sys.columns WHERE NAME = N'updated_at' AND object_id = OBJECT_ID(N'notifications'))
-                IF @constraint_name IS NOT NULL
-                EXEC('ALTER TABLE notifications DROP CONSTRAINT ' + @constraint_name)
-            """)
-
-            cursor.execute("ALTER TABLE notifications DROP COLUMN updated_at")
-            print("updated_at column dropped.")
-
-        # Check if disaster_type column exists
-        cursor.execute("""
-            SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = 'notifications' AND COLUMN_NAME = 'disaster_type'
-        """)
-        
-        if cursor.fetchone()[0] == 0:
-            print("Adding disaster_type column to notifications table...")
-            cursor.execute("""
-                ALTER TABLE notifications 
-                ADD disaster_type NVARCHAR(100) NULL
-            """)
-            
-            # Create index for disaster_type
-            cursor.execute("""
-                CREATE INDEX IX_notifications_disaster_type ON notifications(disaster_type)
-            """)
-        
-        # Check if location column exists
-        cursor.execute("""
-            SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS 
-            WHERE TABLE_NAME = 'notifications' AND COLUMN_NAME = 'location'
-        """)
-        
-        if cursor.fetchone()[0] == 0:
-            print("Adding location column to notifications table...")
-            cursor.execute("""
-                ALTER TABLE notifications 
-                ADD location NVARCHAR(255) NULL
-            """)
-            
-            # Create index for location
-            cursor.execute("""
-                CREATE INDEX IX_notifications_location ON notifications(location)
-            """)
-        
-        conn.commit()
-        print("Notifications table schema updated successfully")
-        
-    except Exception as e:
-        print(f"Error updating notifications table schema: {e}")
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
+    """Move per-recipient content of an existing notifications table into notification_messages"""
+    from database.schema import migrate_notification_messages
+    migrate_notification_messages()
 
 def create_notification(user_id: int, title: str, message: str, notification_type: str = "info", 
                       disaster_type: str = None, location: str = None):
     """Create a new notification for a user"""
     try:
         conn = get_db_conn()
+        conn.autocommit = False
         cursor = conn.cursor()
         
+        ensure_counters(cursor, user_id)
+        message_id = insert_message(cursor, title, message, notification_type, disaster_type, location)
         cursor.execute("""
-            INSERT INTO notifications (user_id, title, message, type, disaster_type, location, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, GETDATE())
-        """, (user_id, title, message, notification_type, disaster_type, location))
-        
-        # Get the inserted notification ID
-        cursor.execute("SELECT @@IDENTITY")
+            INSERT INTO notifications (user_id, message_id, created_at)
+            OUTPUT INSERTED.id
+            VALUES (?, ?, GETDATE())
+        """, (user_id, message_id))
         notification_id = cursor.fetchone()[0]
+        _, unread = bump_counters(cursor, user_id, total_delta=1, unread_delta=1)
+        adjust_message_stats(cursor, {message_id: (1, 1)})
         
         conn.commit()
+        publish_notification_event([user_id], _created_event(
+            int(notification_id), user_id, title, message, notification_type, disaster_type, location
+        ))
+        if unread is not None:
+            publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread})
         return {"message": "Notification created successfully", "id": notification_id}
         
     except Exception as e:
@@ -213,31 +209,65 @@ def create_notification(user_id: int, title: str, message: str, notification_typ
         except:
             pass
 
-def get_user_notifications(user_id: int, limit: int = 50, offset: int = 0, unread_only: bool = False):
-    """Get notifications for a specific user"""
+def make_feed_cursor(created_at, notification_id):
+    """Opaque keyset cursor for the row a feed page ended on: its (created_at, id)"""
+    return f"{created_at.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}_{int(notification_id)}"
+
+def parse_feed_cursor(cursor):
+    """Return (created_at string, id) from a feed cursor; 400 if it is malformed"""
+    try:
+        created_at, notification_id = cursor.split("_")
+        datetime.strptime(created_at, "%Y-%m-%dT%H:%M:%S.%f")
+        return created_at, int(notification_id)
+    except (AttributeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid feed cursor")
+
+def get_user_notifications(user_id: int, limit: int = 50, offset: int = 0, unread_only: bool = False,
+                           before: Optional[str] = None):
+    """Get notifications for a specific user (offset paging, or keyset paging with before=<next_before>)"""
+    before_position = parse_feed_cursor(before) if before is not None else None
     try:
         conn = get_db_conn()
         cursor = conn.cursor()
           # Build query based on filters
-        where_clause = "WHERE user_id = ?"
+        where_clause = "WHERE n.user_id = ?"
         params = [user_id]
         if unread_only:
-            where_clause += " AND is_read = 0"
+            where_clause += " AND n.is_read = 0"
         
-        query = f"""
-            SELECT id, user_id, title, message, type, disaster_type, location, is_read, created_at
-            FROM notifications
-            {where_clause}
-            ORDER BY created_at DESC
-            OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
-        """
+        # Taken before the read so /notifications/changes replays anything that races it
+        sync_cursor = current_sync_cursor(cursor)
+        
+        if before_position is not None:
+            # Seek past the cursor's (created_at, id) in the feed index instead of
+            # skipping offset rows, so deep pages cost the same as the first. The
+            # position is in the cursor itself, so it holds after that row is deleted.
+            before_at, before_id = before_position
+            query = f"""
+                {FEED_SELECT}
+                {where_clause}
+                    AND (n.created_at < CAST(? AS DATETIME)
+                         OR (n.created_at = CAST(? AS DATETIME) AND n.id < ?))
+                ORDER BY n.created_at DESC, n.id DESC
+                OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY
+            """
+            params = params + [before_at, before_at, before_id, limit]
+        else:
+            query = f"""
+                {FEED_SELECT}
+                {where_clause}
+                ORDER BY n.created_at DESC, n.id DESC
+                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+            """
+            params.extend([offset, limit])
         
-        params.extend([offset, limit])
         cursor.execute(query, params)
         rows = cursor.fetchall()
         
         notifications = []
+        next_before = None
         for row in rows:
+            next_before = make_feed_cursor(row[8], row[0]) if row[8] else None
             notifications.append({
                 "id": row[0],
                 "user_id": row[1],
@@ -247,20 +277,20 @@ def get_user_notifications(user_id: int, limit: int = 50, offset: int = 0, unrea
                 "disaster_type": row[5],
                 "location": row[6],
                 "read": bool(row[7]),
-                "timestamp": row[8].isoformat() if row[8] else None
+                "timestamp": row[8].isoformat() if row[8] else None,
+                "resurfaced_at": row[9].isoformat() if row[9] else None
             })
         
-        # Get total count for pagination
-        count_query = f"""
-            SELECT COUNT(*) FROM notifications {where_clause}
-        """
-        cursor.execute(count_query, params[:-2])  # Remove offset and limit params
-        total_count = cursor.fetchone()[0]
+        # Totals for pagination come from the counter row, not a COUNT(*) scan
+        total, unread = read_counters(cursor, user_id)
         
         return {
             "notifications": notifications,
-            "total": total_count,
-            "unread_count": get_unread_count(user_id)
+            "total": unread if unread_only else total,
+            "unread_count": unread,
+            # Cursor for the next page; None once the feed is exhausted
+            "next_before": next_before if len(notifications) == limit else None,
+            "sync_cursor": sync_cursor
         }
         
     except Exception as e:
@@ -276,13 +306,8 @@ def get_unread_count(user_id: int):
     try:
         conn = get_db_conn()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM notifications 
-            WHERE user_id = ? AND is_read = 0
-        """, (user_id,))
-        
-        count = cursor.fetchone()[0]
-        return count
+        _, unread = read_counters(cursor, user_id)
+        return unread
         
     except Exception as e:
         return 0
@@ -292,21 +317,52 @@ def get_unread_count(user_id: int):
         except:
             pass
 
+def get_notification_changes_since(user_id: int, since: Optional[str] = None, limit: int = NOTIFICATION_CHANGES_LIMIT):
+    """Notifications created, read or deleted since a sync cursor, with the new cursor"""
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        return get_notification_changes(cursor, user_id, since, max(1, min(limit, NOTIFICATION_CHANGES_LIMIT)))
+        
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+
 def mark_notification_as_read(notification_id: int, user_id: int):
     """Mark a specific notification as read"""
     try:
         conn = get_db_conn()
+        conn.autocommit = False
         cursor = conn.cursor()
+        
+        ensure_counters(cursor, user_id)
         cursor.execute("""
             UPDATE notifications 
             SET is_read = 1
+            OUTPUT DELETED.is_read, INSERTED.message_id
             WHERE id = ? AND user_id = ?
         """, (notification_id, user_id))
+        row = cursor.fetchone()
         
-        if cursor.rowcount == 0:
+        if row is None:
             raise HTTPException(status_code=404, detail="Notification not found")
         
+        # Only a notification that was unread changes the count
+        unread = None
+        if not row[0]:
+            _, unread = bump_counters(cursor, user_id, unread_delta=-1)
+            adjust_message_stats(cursor, {row[1]: (0, -1)})
+        
         conn.commit()
+        publish_notification_event([user_id], {"type": "notification_read", "notification_id": notification_id})
+        if unread is not None:
+            publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread})
         return {"message": "Notification marked as read"}
         
     except Exception as e:
@@ -322,42 +378,42 @@ def mark_notification_as_read(notification_id: int, user_id: int):
 def mark_all_notifications_as_read(user_id: int):
     """Mark all notifications as read for a user"""
     try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE notifications 
-            SET is_read = 1
-            WHERE user_id = ? AND is_read = 0
-        """, (user_id,))
-        
-        updated_count = cursor.rowcount
-        conn.commit()
+        # Notifications that arrive while the chunks run stay unread
+        updated_count, unread = bulk_mutate_notifications(user_id, "read")
+        publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread or 0})
         
         return {"message": f"{updated_count} notifications marked as read"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
 
 def delete_notification(notification_id: int, user_id: int):
     """Delete a specific notification"""
     try:
         conn = get_db_conn()
+        conn.autocommit = False
         cursor = conn.cursor()
         
-        cursor.execute("""
+        ensure_counters(cursor, user_id)
+        cursor.execute(f"""
             DELETE FROM notifications 
+            {TOMBSTONE_OUTPUT}
+            OUTPUT DELETED.is_read, DELETED.message_id
             WHERE id = ? AND user_id = ?
         """, (notification_id, user_id))
+        row = cursor.fetchone()
         
-        if cursor.rowcount == 0:
+        if row is None:
             raise HTTPException(status_code=404, detail="Notification not found")
         
+        was_unread = not row[0]
+        _, unread = bump_counters(cursor, user_id, total_delta=-1, unread_delta=-1 if was_unread else 0)
+        adjust_message_stats(cursor, stats_deltas([(row[1], row[0])], deleted=True))
+        
         conn.commit()
+        publish_notification_event([user_id], {"type": "notification_deleted", "notification_id": notification_id})
+        if was_unread and unread is not None:
+            publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread})
         return {"message": "Notification deleted"}
         
     except Exception as e:
@@ -373,51 +429,49 @@ def delete_notification(notification_id: int, user_id: int):
 def clear_all_notifications(user_id: int):
     """Delete all notifications for a user"""
     try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            DELETE FROM notifications 
-            WHERE user_id = ?
-        """, (user_id,))
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
+        deleted_count, _ = bulk_mutate_notifications(user_id, "delete")
+        publish_notification_event([user_id], {"type": "notifications_cleared"})
         
         return {"message": f"{deleted_count} notifications deleted"}
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
+
+def bulk_update_notifications(user_id: int, action: str, notification_ids: Optional[List[int]] = None,
+                              unread_only: bool = False, notification_type: Optional[str] = None,
+                              disaster_type: Optional[str] = None, before: Optional[int] = None):
+    """Mark read or delete the user's notifications in an id list and/or matching a filter"""
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"action must be one of: {', '.join(BULK_ACTIONS)}")
+    
+    event_type = "notifications_read" if action == "read" else "notifications_deleted"
+    
+    def publish_chunk(ids, unread):
+        publish_notification_event([user_id], {"type": event_type, "notification_ids": ids})
+        publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread})
+    
+    try:
+        changed, unread = bulk_mutate_notifications(
+            user_id, action, notification_ids, unread_only=unread_only, notification_type=notification_type,
+            disaster_type=disaster_type, before=before, on_chunk=publish_chunk
+        )
+        return {
+            "message": f"{changed} notifications {'marked as read' if action == 'read' else 'deleted'}",
+            "updated": changed,
+            "unread_count": unread
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
 def create_system_notification(title: str, message: str, notification_type: str = "info", user_ids: Optional[List[int]] = None):
     """Create system notifications for specific users or all users, and send emails to subscribed users"""
     try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        
         # If no specific user IDs provided, send to all users
-        if user_ids is None:
-            cursor.execute("SELECT id FROM users")
-            user_ids = [row[0] for row in cursor.fetchall()]
-          # Create notifications for each user
-        created_count = 0
-        for user_id in user_ids:
-            try:
-                cursor.execute("""
-                    INSERT INTO notifications (user_id, title, message, type, created_at)
-                    VALUES (?, ?, ?, ?, GETDATE())
-                """, (user_id, title, message, notification_type))
-                created_count += 1
-            except Exception as e:
-                print(f"Failed to create notification for user {user_id}: {e}")
-                continue
-        
-        conn.commit()
+        created_count = fan_out_notification(
+            title, message, notification_type, user_ids=user_ids,
+            on_batch=lambda created: publish_created_batch(created, title, message, notification_type)
+        )
         
         # Send emails to users who have email notifications enabled
         email_result = send_system_notification_emails(title, message, notification_type, user_ids)
@@ -432,11 +486,22 @@ def create_system_notification(title: str, message: str, notification_type: str
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
+
+def publish_created_batch(created, title, message, notification_type, disaster_type=None, location=None):
+    """Push notification_created events for one committed fan-out batch of (id, user_id) rows"""
+    for notification_id, user_id in created:
+        publish_notification_event([user_id], _created_event(
+            notification_id, user_id, title, message, notification_type, disaster_type, location
+        ))
+
+def publish_updated_batch(updated, title, message, notification_type, disaster_type=None, location=None):
+    """Push notification_updated events for (id, user_id) receipts whose message content changed"""
+    for notification_id, user_id in updated:
+        event = _created_event(notification_id, user_id, title, message, notification_type, disaster_type, location)
+        event["type"] = "notification_updated"
+        # timestamp is only a stand-in here; the receipt keeps its created_at
+        event["notification"]["resurfaced_at"] = event["notification"]["timestamp"]
+        publish_notification_event([user_id], event)
 
 # Utility functions for automatic notifications
 
@@ -482,43 +547,48 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
         params = []
         
         if notification_type:
-            where_clauses.append("type = ?")
+            where_clauses.append("m.type = ?")
             params.append(notification_type)
         
         if disaster_type:
-            where_clauses.append("disaster_type = ?")
+            where_clauses.append("m.disaster_type = ?")
             params.append(disaster_type)
         
         if search:
-            where_clauses.append("(title LIKE ? OR message LIKE ?)")
+            where_clauses.append("(m.title LIKE ? OR m.message LIKE ?)")
             search_term = f"%{search}%"
             params.extend([search_term, search_term])
         
         where_clause = " AND ".join(where_clauses) if where_clauses else "1=1"
         
         if grouped:
-            # Get grouped notifications with user aggregation
-            # Use ISNULL to handle NULL values in GROUP BY for proper grouping
+            # One row per message: page the messages first, then aggregate
+            # only that page's receipts through IX_notifications_message_id
             query = f"""
-                WITH GroupedNotifications AS (
+                WITH page AS (
+                    SELECT m.id, m.title, m.message, m.type, m.disaster_type, m.location, m.created_at
+                    FROM notification_messages m
+                    WHERE {where_clause}
+                        AND EXISTS (SELECT 1 FROM notifications n WHERE n.message_id = m.id)
+                    ORDER BY m.created_at DESC, m.id DESC
+                    OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                )
+                SELECT 
+                    page.title, page.message, page.type, page.disaster_type, page.location,
+                    r.latest_created_at, r.first_created_at, r.user_count, r.total_notifications, r.unread_count,
+                    page.id
+                FROM page
+                CROSS APPLY (
                     SELECT 
-                        n.title, 
-                        n.message, 
-                        n.type, 
-                        ISNULL(n.disaster_type, '') as disaster_type,
-                        ISNULL(n.location, '') as location,
                         MAX(n.created_at) as latest_created_at,
                         MIN(n.created_at) as first_created_at,
                         COUNT(DISTINCT n.user_id) as user_count,
                         COUNT(*) as total_notifications,
                         SUM(CASE WHEN n.is_read = 0 THEN 1 ELSE 0 END) as unread_count
                     FROM notifications n
-                    WHERE {where_clause}
-                    GROUP BY n.title, n.message, n.type, ISNULL(n.disaster_type, ''), ISNULL(n.location, '')
-                )
-                SELECT * FROM GroupedNotifications
-                ORDER BY latest_created_at DESC
-                OFFSET ? ROWS FETCH NEXT ? ROWS ONLY
+                    WHERE n.message_id = page.id
+                ) r
+                ORDER BY page.created_at DESC, page.id DESC
             """
             
             params.extend([offset, limit])
@@ -527,16 +597,13 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
             
             notifications = []
             for row in rows:
-                # Convert empty strings back to None for disaster_type and location
-                disaster_type_val = row[3] if row[3] else None
-                location_val = row[4] if row[4] else None
-                
                 notifications.append({
+                    "message_id": row[10],
                     "title": row[0],
                     "message": row[1],
                     "type": row[2],
-                    "disaster_type": disaster_type_val,
-                    "location": location_val,
+                    "disaster_type": row[3],
+                    "location": row[4],
                     "latest_created_at": row[5].isoformat() if row[5] else None,
                     "first_created_at": row[6].isoformat() if row[6] else None,
                     "user_count": row[7],
@@ -545,13 +612,11 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
                     "is_grouped": True
                 })
             
-            # Get total count of unique notification groups
+            # Get total count of messages that still have recipients
             count_query = f"""
-                SELECT COUNT(*) FROM (
-                    SELECT 1 as grp FROM notifications n
-                    WHERE {where_clause}
-                    GROUP BY n.title, n.message, n.type, ISNULL(n.disaster_type, ''), ISNULL(n.location, '')
-                ) as groups
+                SELECT COUNT(*) FROM notification_messages m
+                WHERE {where_clause}
+                    AND EXISTS (SELECT 1 FROM notifications n WHERE n.message_id = m.id)
             """
             cursor.execute(count_query, params[:-2])
             total_count = cursor.fetchone()[0]
@@ -559,10 +624,11 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
             # Get individual notifications with user info
             query = f"""
                 SELECT 
-                    n.id, n.user_id, n.title, n.message, n.type, 
-                    n.disaster_type, n.location, n.is_read, n.created_at,
+                    n.id, n.user_id, m.title, m.message, m.type, 
+                    m.disaster_type, m.location, n.is_read, n.created_at,
                     u.email, u.name
                 FROM notifications n
+                INNER JOIN notification_messages m ON m.id = n.message_id
                 LEFT JOIN users u ON n.user_id = u.id
                 WHERE {where_clause}
                 ORDER BY n.created_at DESC
@@ -591,7 +657,11 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
                 })
             
             # Get total count
-            count_query = f"SELECT COUNT(*) FROM notifications WHERE {where_clause}"
+            count_query = f"""
+                SELECT COUNT(*) FROM notifications n
+                INNER JOIN notification_messages m ON m.id = n.message_id
+                WHERE {where_clause}
+            """
             cursor.execute(count_query, params[:-2])
             total_count = cursor.fetchone()[0]
         
@@ -612,8 +682,8 @@ def get_all_notifications(limit: int = 100, offset: int = 0, notification_type:
             pass
 
 def get_notification_users(title: str, message: str, notification_type: str, 
-                          disaster_type: str = None, location: str = None):
-    """Get all users who received a specific notification"""
+                          disaster_type: str = None, location: str = None, message_id: int = None):
+    """Get all users who received a specific notification (by message_id, or by its content)"""
     try:
         conn = get_db_conn()
         cursor = conn.cursor()
@@ -624,27 +694,37 @@ def get_notification_users(title: str, message: str, notification_type: str,
         if location == '':
             location = None
         
-        query = """
+        if message_id is not None:
+            match_clause = "n.message_id = ?"
+            match_params = (message_id,)
+        else:
+            match_clause = """
+                m.title = ? AND m.message = ? AND m.type = ?
+                AND (
+                    (m.disaster_type = ? AND ? IS NOT NULL) OR 
+                    (m.disaster_type IS NULL AND ? IS NULL)
+                )
+                AND (
+                    (m.location = ? AND ? IS NOT NULL) OR 
+                    (m.location IS NULL AND ? IS NULL)
+                )
+            """
+            match_params = (title, message, notification_type, 
+                            disaster_type, disaster_type, disaster_type,
+                            location, location, location)
+        
+        query = f"""
             SELECT 
                 n.id, n.user_id, n.is_read, n.created_at,
                 u.email, u.name
             FROM notifications n
+            INNER JOIN notification_messages m ON m.id = n.message_id
             LEFT JOIN users u ON n.user_id = u.id
-            WHERE n.title = ? AND n.message = ? AND n.type = ?
-                AND (
-                    (n.disaster_type = ? AND ? IS NOT NULL) OR 
-                    (n.disaster_type IS NULL AND ? IS NULL)
-                )
-                AND (
-                    (n.location = ? AND ? IS NOT NULL) OR 
-                    (n.location IS NULL AND ? IS NULL)
-                )
+            WHERE {match_clause}
             ORDER BY n.created_at DESC
         """
         
-        cursor.execute(query, (title, message, notification_type, 
-                              disaster_type, disaster_type, disaster_type,
-                              location, location, location))
+        cursor.execute(query, match_params)
         rows = cursor.fetchall()
         
         users = []
@@ -674,77 +754,40 @@ def get_notification_users(title: str, message: str, notification_type: str,
 def get_notification_stats():
     """Get notification statistics for admin dashboard"""
     try:
-        conn = get_db_conn()
-        cursor = conn.cursor()
-        
-        # Total notifications
-        cursor.execute("SELECT COUNT(*) FROM notifications")
-        total_notifications = cursor.fetchone()[0]
-        
-        # Unread notifications
-        cursor.execute("SELECT COUNT(*) FROM notifications WHERE is_read = 0")
-        unread_notifications = cursor.fetchone()[0]
-        
-        # Notifications by type
-        cursor.execute("""
-            SELECT type, COUNT(*) as count
-            FROM notifications
-            GROUP BY type
-        """)
-        by_type = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Notifications by disaster type
-        cursor.execute("""
-            SELECT disaster_type, COUNT(*) as count
-            FROM notifications
-            WHERE disaster_type IS NOT NULL
-            GROUP BY disaster_type
-        """)
-        by_disaster_type = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Recent notifications (last 24 hours)
-        cursor.execute("""
-            SELECT COUNT(*) FROM notifications
-            WHERE created_at >= DATEADD(hour, -24, GETDATE())
-        """)
-        recent_24h = cursor.fetchone()[0]
-        
-        # Recent notifications (last 7 days)
-        cursor.execute("""
-            SELECT COUNT(*) FROM notifications
-            WHERE created_at >= DATEADD(day, -7, GETDATE())
-        """)
-        recent_7days = cursor.fetchone()[0]
-        
-        return {
-            "total_notifications": total_notifications,
-            "unread_notifications": unread_notifications,
-            "read_notifications": total_notifications - unread_notifications,
-            "by_type": by_type,
-            "by_disaster_type": by_disaster_type,
-            "recent_24h": recent_24h,
-            "recent_7days": recent_7days
-        }
+        stats = get_cached_notification_stats()
+        stats["retention"] = get_notification_retention_stats()
+        return stats
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
-    finally:
-        try:
-            conn.close()
-        except:
-            pass
 
 def delete_notification_admin(notification_id: int):
     """Delete any notification (admin only)"""
     try:
         conn = get_db_conn()
+        conn.autocommit = False
         cursor = conn.cursor()
         
-        cursor.execute("DELETE FROM notifications WHERE id = ?", (notification_id,))
+        cursor.execute("SELECT user_id FROM notifications WHERE id = ?", (notification_id,))
+        owner = cursor.fetchone()
+        if owner is None:
+            raise HTTPException(status_code=404, detail="Notification not found")
         
-        if cursor.rowcount == 0:
+        ensure_counters(cursor, owner[0])
+        cursor.execute(f"""
+            DELETE FROM notifications
+            {TOMBSTONE_OUTPUT}
+            OUTPUT DELETED.user_id, DELETED.is_read, DELETED.message_id
+            WHERE id = ?
+        """, (notification_id,))
+        row = cursor.fetchone()
+        
+        if row is None:
             raise HTTPException(status_code=404, detail="Notification not found")
         
+        bump_counters(cursor, row[0], total_delta=-1, unread_delta=0 if row[1] else -1)
+        adjust_message_stats(cursor, stats_deltas([(row[2], row[1])], deleted=True))
+        
         conn.commit()
         return {"message": "Notification deleted successfully"}
         
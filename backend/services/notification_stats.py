@@ -0,0 +1,174 @@
+"""
+Admin notification statistics from precomputed per-message counts.
+
+notification_message_stats holds, for every message, how many receipts
+point at it and how many of those are unread. Every write path adjusts
+it in the same transaction as the receipts (fan-out per batch, mark
+read, deletes, bulk mutations, retention), and the counter
+reconciliation job repairs any drift. The dashboard then aggregates one
+row per message instead of scanning notifications: a single GROUP BY
+gives the totals, the by-type and by-disaster breakdowns and the 24 h /
+7 day figures (by message time, which is when fan-out creates the
+receipts).
+
+Results are cached for NOTIFICATION_STATS_CACHE_TTL seconds. If the
+stats table cannot be read (not migrated yet) the same figures come from
+one query over notifications.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+from database import get_db_conn
+from config.settings import NOTIFICATION_STATS_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+_cache_lock = threading.Lock()
+_cached = None  # (computed_at, stats)
+
+
+def insert_message_stats(cursor, message_id):
+    """Start a new message's counts at zero; fan-out adds its receipts"""
+    cursor.execute("INSERT INTO notification_message_stats (message_id) VALUES (?)", (message_id,))
+
+
+def stats_deltas(rows, deleted):
+    """{message_id: (recipients_delta, unread_delta)} for receipts read or deleted, from (message_id, was_read) rows"""
+    deltas = {}
+    for message_id, was_read in rows:
+        recipients, unread = deltas.get(message_id, (0, 0))
+        deltas[message_id] = (recipients - (1 if deleted else 0), unread - (0 if was_read else 1))
+    return deltas
+
+
+def adjust_message_stats(cursor, deltas):
+    """Apply {message_id: (recipients_delta, unread_delta)} to the per-message counts"""
+    # Ascending message_id, so concurrent writers lock the rows in the same order
+    rows = [(recipients, recipients, unread, unread, message_id)
+            for message_id, (recipients, unread) in sorted(deltas.items()) if recipients or unread]
+    if not rows:
+        return
+    statement = """
+        UPDATE notification_message_stats
+        SET recipients = CASE WHEN recipients + ? < 0 THEN 0 ELSE recipients + ? END,
+            unread = CASE WHEN unread + ? < 0 THEN 0 ELSE unread + ? END,
+            updated_at = GETDATE()
+        WHERE message_id = ?
+    """
+    if len(rows) == 1:
+        cursor.execute(statement, rows[0])
+    else:
+        cursor.fast_executemany = True
+        cursor.executemany(statement, rows)
+
+
+def reconcile_notification_message_stats():
+    """Recompute per-message counts that drifted from the notifications table; returns rows fixed"""
+    conn = None
+    try:
+        conn = get_db_conn()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE s
+            SET recipients = ISNULL(n.recipients, 0), unread = ISNULL(n.unread, 0), updated_at = GETDATE()
+            FROM notification_message_stats s
+            LEFT JOIN (
+                SELECT message_id, COUNT(*) AS recipients, SUM(CASE WHEN is_read = 0 THEN 1 ELSE 0 END) AS unread
+                FROM notifications
+                GROUP BY message_id
+            ) n ON n.message_id = s.message_id
+            WHERE s.recipients <> ISNULL(n.recipients, 0) OR s.unread <> ISNULL(n.unread, 0)
+        """)
+        fixed = cursor.rowcount
+        conn.commit()
+        if fixed:
+            print(f"Reconciled notification stats for {fixed} messages")
+        return fixed
+    except Exception as e:
+        print(f"Error reconciling notification stats: {e}")
+        return 0
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+# (type, disaster_type, total, unread, last 24 h, last 7 days) per message type/disaster type
+PRECOMPUTED_STATS_QUERY = """
+    SELECT m.type, m.disaster_type, SUM(s.recipients), SUM(s.unread),
+           SUM(CASE WHEN m.created_at >= DATEADD(hour, -24, GETDATE()) THEN s.recipients ELSE 0 END),
+           SUM(CASE WHEN m.created_at >= DATEADD(day, -7, GETDATE()) THEN s.recipients ELSE 0 END)
+    FROM notification_message_stats s
+    INNER JOIN notification_messages m ON m.id = s.message_id
+    GROUP BY m.type, m.disaster_type
+"""
+
+FALLBACK_STATS_QUERY = """
+    SELECT m.type, m.disaster_type, COUNT(*), SUM(CASE WHEN n.is_read = 0 THEN 1 ELSE 0 END),
+           SUM(CASE WHEN n.created_at >= DATEADD(hour, -24, GETDATE()) THEN 1 ELSE 0 END),
+           SUM(CASE WHEN n.created_at >= DATEADD(day, -7, GETDATE()) THEN 1 ELSE 0 END)
+    FROM notifications n
+    INNER JOIN notification_messages m ON m.id = n.message_id
+    GROUP BY m.type, m.disaster_type
+"""
+
+
+def _summarize(rows, source):
+    stats = {
+        "total_notifications": 0,
+        "unread_notifications": 0,
+        "by_type": {},
+        "by_disaster_type": {},
+        "recent_24h": 0,
+        "recent_7days": 0,
+    }
+    for notification_type, disaster_type, total, unread, recent_24h, recent_7days in rows:
+        if not total:
+            continue
+        stats["total_notifications"] += total
+        stats["unread_notifications"] += unread or 0
+        stats["recent_24h"] += recent_24h or 0
+        stats["recent_7days"] += recent_7days or 0
+        stats["by_type"][notification_type] = stats["by_type"].get(notification_type, 0) + total
+        if disaster_type is not None:
+            stats["by_disaster_type"][disaster_type] = stats["by_disaster_type"].get(disaster_type, 0) + total
+    stats["read_notifications"] = stats["total_notifications"] - stats["unread_notifications"]
+    stats["source"] = source
+    return stats
+
+
+def load_notification_stats(cursor):
+    """Dashboard figures from the precomputed counts, or one scan of notifications if they are unavailable"""
+    try:
+        cursor.execute(PRECOMPUTED_STATS_QUERY)
+        return _summarize(cursor.fetchall(), "precomputed")
+    except Exception as e:
+        logger.warning(f"Precomputed notification stats unavailable, counting notifications: {e}")
+        cursor.execute(FALLBACK_STATS_QUERY)
+        return _summarize(cursor.fetchall(), "notifications")
+
+
+def get_cached_notification_stats(ttl=NOTIFICATION_STATS_CACHE_TTL):
+    """load_notification_stats, reused for ttl seconds"""
+    global _cached
+    with _cache_lock:
+        if _cached is not None and time.time() - _cached[0] < ttl:
+            return dict(_cached[1])
+
+    conn = get_db_conn()
+    try:
+        stats = load_notification_stats(conn.cursor())
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    stats["generated_at"] = datetime.now().isoformat()
+    with _cache_lock:
+        _cached = (time.time(), stats)
+    return dict(stats)
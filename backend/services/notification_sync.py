@@ -0,0 +1,128 @@
+"""
+Delta sync for notification feeds (/notifications/changes).
+
+Every notifications row carries a ROWVERSION that SQL Server bumps on
+insert and on every update (mark read). Deletes copy the removed rows
+into notification_tombstones with TOMBSTONE_OUTPUT, and those rows get
+their own ROWVERSION from the same database-wide counter. (A trigger
+would not do: DELETE ... OUTPUT without INTO, which the service uses to
+learn what it removed, is not allowed on a table with a delete trigger.) A client cursor is therefore one number: the
+highest version it has seen. A poll returns rows and tombstones above
+it, and the new cursor.
+
+Cursors never pass MIN_ACTIVE_ROWVERSION(), so a version still held by
+an open transaction is not skipped when that transaction commits later.
+They also carry the time they were issued: tombstones are kept for
+NOTIFICATION_TOMBSTONE_DAYS, so an older cursor may have missed deletes
+and the client is told to reload ("reset") instead.
+"""
+import time
+
+from fastapi import HTTPException
+
+from config.settings import NOTIFICATION_TOMBSTONE_DAYS, NOTIFICATION_CHANGES_LIMIT
+from services.notification_counters import read_counters
+
+
+# Add to every DELETE FROM notifications so sync clients learn about it
+TOMBSTONE_OUTPUT = "OUTPUT DELETED.id, DELETED.user_id INTO notification_tombstones (notification_id, user_id)"
+
+
+def make_cursor(version, issued_at=None):
+    return f"{int(version)}.{int(issued_at if issued_at is not None else time.time())}"
+
+
+def parse_cursor(cursor):
+    """Return (version, issued_at) from a cursor string; 400 if it is malformed"""
+    try:
+        version, issued_at = cursor.split(".")
+        return int(version), int(issued_at)
+    except (AttributeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+
+
+def current_version(cursor):
+    """Highest version whose writes are all committed"""
+    cursor.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT) - 1")
+    return cursor.fetchone()[0]
+
+
+def current_sync_cursor(cursor):
+    """Cursor to hand out with a full feed read; take it before reading the feed"""
+    return make_cursor(current_version(cursor))
+
+
+def get_notification_changes(cursor, user_id, since=None, limit=NOTIFICATION_CHANGES_LIMIT):
+    """Notifications created, read or deleted for a user since the cursor"""
+    watermark = current_version(cursor)
+    _, unread = read_counters(cursor, user_id)
+
+    expired = False
+    if since:
+        since_version, issued_at = parse_cursor(since)
+        expired = issued_at < time.time() - NOTIFICATION_TOMBSTONE_DAYS * 86400
+    if not since or expired:
+        # First sync, or deletes may have been forgotten: reload the feed, then sync from here
+        return {"reset": True, "changes": [], "deleted": [], "has_more": False,
+                "cursor": make_cursor(watermark), "unread_count": unread}
+
+    cursor.execute("""
+        SELECT TOP (?) n.id, n.user_id, m.title, m.message, m.type, m.disaster_type, m.location,
+               n.is_read, n.created_at, CAST(n.row_version AS BIGINT), n.resurfaced_at
+        FROM notifications n
+        INNER JOIN notification_messages m ON m.id = n.message_id
+        WHERE n.user_id = ?
+            AND n.row_version > CAST(CAST(? AS BIGINT) AS BINARY(8))
+            AND n.row_version <= CAST(CAST(? AS BIGINT) AS BINARY(8))
+        ORDER BY n.row_version
+    """, (limit + 1, user_id, since_version, watermark))
+    updates = [(row[9], "change", row) for row in cursor.fetchall()]
+
+    cursor.execute("""
+        SELECT TOP (?) notification_id, CAST(row_version AS BIGINT)
+        FROM notification_tombstones
+        WHERE user_id = ?
+            AND row_version > CAST(CAST(? AS BIGINT) AS BINARY(8))
+            AND row_version <= CAST(CAST(? AS BIGINT) AS BINARY(8))
+        ORDER BY row_version
+    """, (limit + 1, user_id, since_version, watermark))
+    deletes = [(row[1], "delete", row) for row in cursor.fetchall()]
+
+    # Both lists are in version order; if either was cut off, stop at the
+    # limit-th change overall and continue from its version next time
+    merged = sorted(updates + deletes, key=lambda entry: entry[0])
+    has_more = len(merged) > limit
+    if has_more:
+        # Later deletes are only known to be newer than the original cursor
+        merged = merged[:limit]
+        next_cursor = make_cursor(merged[-1][0], issued_at)
+    else:
+        next_cursor = make_cursor(watermark)
+
+    changes, deleted = [], []
+    for _, kind, row in merged:
+        if kind == "delete":
+            deleted.append(row[0])
+        else:
+            changes.append({
+                "id": row[0],
+                "user_id": row[1],
+                "title": row[2],
+                "message": row[3],
+                "type": row[4],
+                "disaster_type": row[5],
+                "location": row[6],
+                "read": bool(row[7]),
+                "timestamp": row[8].isoformat() if row[8] else None,
+                "resurfaced_at": row[10].isoformat() if row[10] else None
+            })
+
+    return {
+        "reset": False,
+        "changes": changes,
+        "deleted": deleted,
+        "has_more": has_more,
+        "cursor": next_cursor,
+        "unread_count": unread
+    }
+
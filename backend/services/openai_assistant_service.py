@@ -3,12 +3,14 @@ OpenAI Assistant API Service
 Handles communication with OpenAI's Assistant API for chat functionality
 """
 from openai import OpenAI
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Union
 import logging
 import time
 import json
 from config.settings import OPENAI_API_KEY, OPENAI_ASSISTANT_ID, OPENAI_ASSISTANT_ENABLED
 from services.map_tools import MAP_TOOLS
+from services.chat_context import ChatContextManager
+from utils.performance import StageTimer
 
 logger = logging.getLogger(__name__)
 
@@ -41,7 +43,10 @@ class OpenAIAssistantService:
     def send_message(
         self, 
         thread_id: str, 
-        message: str
+        message: str,
+        timer: Optional[StageTimer] = None,
+        additional_instructions: Optional[str] = None,
+        last_messages: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Send a message to the assistant and get response
@@ -49,35 +54,50 @@ class OpenAIAssistantService:
         Args:
             thread_id: The OpenAI thread ID
             message: User's message
+            timer: Optional StageTimer that receives per-stage durations
+            additional_instructions: Extra run instructions (e.g. a conversation summary)
+            last_messages: Only feed the model this many of the newest thread messages
             
         Returns:
             Dict containing response, map_commands, and metadata
         """
         start_time = time.time()
+        timer = timer or StageTimer()
         
         try:
             # Add message to thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=message
-            )
+            with timer.stage("message_post"):
+                self.client.beta.threads.messages.create(
+                    thread_id=thread_id,
+                    role="user",
+                    content=message
+                )
             
             # Run the assistant with map tools
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id,
-                tools=MAP_TOOLS
-            )
+            run_options = {}
+            if additional_instructions:
+                run_options["additional_instructions"] = additional_instructions
+            if last_messages:
+                run_options["truncation_strategy"] = {"type": "last_messages", "last_messages": last_messages}
+            with timer.stage("run_queue"):
+                run = self.client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id,
+                    tools=MAP_TOOLS,
+                    **run_options
+                )
             
             # Wait for completion and handle tool calls
             map_commands = []
             while run.status in ["queued", "in_progress", "requires_action"]:
-                time.sleep(0.5)
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run.id
-                )
+                # Attribute each poll interval to the status observed before it
+                stage_name = "run_queue" if run.status == "queued" else "run_exec"
+                with timer.stage(stage_name):
+                    time.sleep(0.5)
+                    run = self.client.beta.threads.runs.retrieve(
+                        thread_id=thread_id,
+                        run_id=run.id
+                    )
                 
                 # Handle tool calls (map commands)
                 if run.status == "requires_action":
@@ -103,19 +123,21 @@ class OpenAIAssistantService:
                     
                     # Submit tool outputs
                     if tool_outputs:
-                        run = self.client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=thread_id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
+                        with timer.stage("tool_calls"):
+                            run = self.client.beta.threads.runs.submit_tool_outputs(
+                                thread_id=thread_id,
+                                run_id=run.id,
+                                tool_outputs=tool_outputs
+                            )
             
             if run.status == "completed":
                 # Retrieve the assistant's messages
-                messages = self.client.beta.threads.messages.list(
-                    thread_id=thread_id,
-                    order="desc",
-                    limit=1
-                )
+                with timer.stage("response_fetch"):
+                    messages = self.client.beta.threads.messages.list(
+                        thread_id=thread_id,
+                        order="desc",
+                        limit=1
+                    )
                 
                 # Get the latest message content
                 if messages.data:
@@ -130,6 +152,7 @@ class OpenAIAssistantService:
                         "thread_id": thread_id,
                         "provider": "openai",
                         "duration": duration,
+                        "timings": timer.as_dict(),
                         "status": "success"
                     }
                 else:
@@ -188,7 +211,7 @@ class OpenAIAssistantService:
         self, 
         prompt: str, 
         thread_id: Optional[str] = None,
-        history: Optional[List[Dict[str, Any]]] = None
+        history: Optional[Union[List[Dict[str, Any]], Dict[str, Any], Callable[[], Any]]] = None
     ) -> Dict[str, Any]:
         """
         Generate a response using OpenAI Assistant
@@ -196,20 +219,42 @@ class OpenAIAssistantService:
         Args:
             prompt: User's prompt/question
             thread_id: Optional existing thread ID for conversation continuity
+            history: Messages to seed a new thread with, or a context dict from
+                ChatContextManager.build (``messages`` plus rolling ``summary``),
+                or a callable returning either; a callable is resolved only after
+                the thread is acquired so the caller can load history concurrently.
+                A context dict is sent with the run as instructions and the run
+                only reads the new prompt from the thread, since the thread
+                does not hold the same turns as the database (e.g. the welcome
+                message, or messages still queued for write-behind).
             
         Returns:
-            Dict with response and metadata
+            Dict with response, metadata and per-stage ``timings`` (ms)
         """
+        timer = StageTimer()
         try:
             # Get or create thread
-            thread = self.get_or_create_thread(thread_id)
+            with timer.stage("thread"):
+                thread = self.get_or_create_thread(thread_id)
 
-            # Seed prior conversation so Assistant has context on first run
-            if history:
-                self.seed_thread_messages(thread, history)
+            if callable(history):
+                history = history()
+            instructions = None
+            last_messages = None
+            if isinstance(history, dict):
+                instructions = ChatContextManager.format_context_instructions(history)
+                last_messages = 1
+            elif history and thread != thread_id:
+                # Seed prior conversation so Assistant has context on first run
+                with timer.stage("history_seed"):
+                    self.seed_thread_messages(thread, history)
             
             # Send message and get response
-            result = self.send_message(thread, prompt)
+            result = self.send_message(
+                thread, prompt, timer=timer,
+                additional_instructions=instructions,
+                last_messages=last_messages
+            )
             
             return result
             
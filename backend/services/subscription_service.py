@@ -6,6 +6,8 @@ from datetime import datetime
 from typing import List, Optional, Dict
 import json
 from services.email_notification_service import send_targeted_notification_emails
+from services.notification_digest import claim_digest, resurface_digest
+from config.settings import NOTIFICATION_DIGEST_WINDOW
 
 # --- Subscription-related database logic ---
 
@@ -272,9 +274,16 @@ def get_popular_locations() -> List[str]:
 
 def create_targeted_disaster_notification(disaster_type: str, location: str, 
                                         title: str, message: str, 
-                                        notification_type: str = "warning"):
-    """Create notifications for users subscribed to specific disaster type and location, and send emails"""
-    from services.notification_service import create_notification
+                                        notification_type: str = "warning", coalesce: bool = False):
+    """
+    Create notifications for users subscribed to specific disaster type and location, and send emails.
+    
+    With coalesce, alerts for the same disaster type and location within
+    NOTIFICATION_DIGEST_WINDOW are merged into one notification and one
+    digest email, and exact repeats are dropped (see notification_digest).
+    """
+    from services.notification_service import publish_created_batch
+    from services.notification_fanout import fan_out_notification
     
     # Get users who should receive this notification
     subscribed_users = get_subscribed_users_for_alert(disaster_type, location)
@@ -283,15 +292,33 @@ def create_targeted_disaster_notification(disaster_type: str, location: str,
         print(f"No subscribed users found for {disaster_type} in {location}")
         return {"message": "No subscribed users found", "users_notified": 0}
     
+    message_id = None
+    if coalesce and NOTIFICATION_DIGEST_WINDOW > 0:
+        digest = claim_digest(disaster_type, location, title, message, notification_type)
+        if digest["status"] == "duplicate":
+            return {"message": "Duplicate alert suppressed", "users_notified": 0, "suppressed": True}
+        if digest["status"] == "merged":
+            return merge_targeted_disaster_notification(
+                digest, disaster_type, location, notification_type, subscribed_users
+            )
+        message_id = digest["message_id"]
+    
     notifications_created = 0
     errors = []
     
-    for user_id in subscribed_users:
-        try:
-            create_notification(user_id, title, message, notification_type, disaster_type, location)
-            notifications_created += 1
-        except Exception as e:
-            errors.append(f"User {user_id}: {str(e)}")
+    def on_batch(created):
+        # Counted per committed batch so a later failure still reports what was sent
+        nonlocal notifications_created
+        notifications_created += len(created)
+        publish_created_batch(created, title, message, notification_type, disaster_type, location)
+    
+    try:
+        fan_out_notification(
+            title, message, notification_type, disaster_type, location,
+            user_ids=subscribed_users, on_batch=on_batch, message_id=message_id
+        )
+    except Exception as e:
+        errors.append(str(e))
     
     # Send emails to users who have email notifications enabled
     email_result = send_targeted_notification_emails(disaster_type, location, title, message, notification_type)
@@ -304,6 +331,51 @@ def create_targeted_disaster_notification(disaster_type: str, location: str,
         "errors": errors if errors else None
     }
 
+def merge_targeted_disaster_notification(digest: dict, disaster_type: str, location: str,
+                                         notification_type: str = "warning", subscribed_users: Optional[List[int]] = None):
+    """
+    Re-surface the open digest notification with its new content; the email waits for the window to close.
+    
+    Users who subscribed after the window opened have no receipt to
+    re-surface, so they get one for the digest message instead.
+    """
+    from services.notification_service import publish_notification_event, publish_updated_batch, publish_created_batch
+    from services.notification_fanout import fan_out_notification
+    
+    def on_batch(updated, unread_counts):
+        publish_updated_batch(updated, digest["title"], digest["message"], notification_type, disaster_type, location)
+        for user_id, unread in unread_counts.items():
+            publish_notification_event([user_id], {"type": "unread_count_updated", "count": unread})
+    
+    errors = []
+    users_notified = 0
+    try:
+        users_notified = resurface_digest(digest["message_id"], on_batch=on_batch)
+    except Exception as e:
+        errors.append(str(e))
+    
+    def on_created(created):
+        nonlocal users_notified
+        users_notified += len(created)
+        publish_created_batch(created, digest["title"], digest["message"], notification_type, disaster_type, location)
+    
+    if subscribed_users:
+        try:
+            fan_out_notification(
+                digest["title"], digest["message"], notification_type, disaster_type, location,
+                user_ids=subscribed_users, on_batch=on_created, message_id=digest["message_id"]
+            )
+        except Exception as e:
+            errors.append(str(e))
+    
+    return {
+        "message": f"Merged into the open {disaster_type} alert for {location} ({users_notified} users)",
+        "users_notified": users_notified,
+        "emails_sent": 0,
+        "merged": True,
+        "errors": errors if errors else None
+    }
+
 def create_subscription_confirmation_notification(user_id: int, disaster_types: List[str], locations: List[str]):
     """Create a notification when user updates their subscription"""
     from services.notification_service import create_notification
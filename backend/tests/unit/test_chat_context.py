@@ -0,0 +1,90 @@
+"""
+Unit tests for services.chat_context module
+Tests token budgeting and rolling summaries
+"""
+import services.chat_context as chat_context
+from services.chat_context import ChatContextManager
+
+
+def _messages(count, length=40):
+    return [
+        {"id": i, "sender_type": "user" if i % 2 else "bot", "content": f"{i} " + "x" * length}
+        for i in range(1, count + 1)
+    ]
+
+
+def test_short_history_is_sent_verbatim_without_summary():
+    window = ChatContextManager(token_budget=2000).build(_messages(4))
+
+    assert len(window["messages"]) == 4
+    assert window["summary"] is None
+    assert window["metadata_updates"] is None
+    assert window["messages"][0] == {"role": "user", "content": "1 " + "x" * 40}
+
+
+def test_long_history_keeps_recent_turns_under_budget():
+    manager = ChatContextManager(token_budget=100, summary_tokens=40)
+    window = manager.build(_messages(20))
+
+    kept_ids = [int(m["content"].split()[0]) for m in window["messages"]]
+    assert kept_ids == list(range(21 - len(kept_ids), 21))
+    assert window["tokens"] <= 100
+    assert window["metadata_updates"]["context_summary_through"] == 20 - len(kept_ids)
+    # Only the newest evicted turns survive the summary budget
+    assert chat_context.count_tokens(window["summary"]) <= 40
+    assert f"{20 - len(kept_ids)} x" in window["summary"]
+
+
+def test_summary_rolls_forward_from_previous_metadata():
+    manager = ChatContextManager(token_budget=100, summary_tokens=60)
+    metadata = {"context_summary": "User: earlier question", "context_summary_through": 14}
+    window = manager.build(_messages(20), metadata)
+
+    assert window["summary"].startswith("User: earlier question")
+    # Turns already folded into the summary are not added again
+    assert "User: 13 " not in window["summary"]
+
+
+def test_unchanged_summary_is_not_rewritten():
+    manager = ChatContextManager(token_budget=2000)
+    metadata = {"context_summary": "User: earlier question", "context_summary_through": 3}
+    window = manager.build(_messages(3), metadata)
+
+    assert window["summary"] == "User: earlier question"
+    assert window["metadata_updates"] is None
+
+
+def test_latest_message_is_kept_even_if_over_budget():
+    window = ChatContextManager(token_budget=10, summary_tokens=5).build(_messages(2, length=400))
+
+    assert len(window["messages"]) == 1
+    assert window["messages"][0]["content"].startswith("2 ")
+
+
+def test_unsummarized_history_before_the_window_seeds_the_summary():
+    older = _messages(20, length=2000)
+    recent = _messages(24, length=10)[20:]
+    requested = []
+
+    def load_older(before_id):
+        requested.append(before_id)
+        return older
+
+    manager = ChatContextManager(token_budget=1200, summary_tokens=1000)
+    window = manager.build(recent, {"context_summary": "User: 5 ...", "context_summary_through": 5}, load_older)
+
+    assert requested == [21]
+    assert [int(m["content"].split()[0]) for m in window["messages"]] == [21, 22, 23, 24]
+    # Only the skipped turns after the summary are folded in, oldest first
+    lines = window["summary"].split("\n")
+    assert lines[0] == "User: 5 ..."
+    assert [line.split()[1] for line in lines[1:]] == [str(i) for i in range(6, 21)]
+    assert window["metadata_updates"]["context_summary_through"] == 20
+
+
+def test_older_history_is_not_loaded_when_the_summary_is_current():
+    def load_older(before_id):
+        raise AssertionError("should not be called")
+
+    window = ChatContextManager(token_budget=2000).build(_messages(4), {"context_summary_through": 0}, load_older)
+    assert len(window["messages"]) == 4
@@ -68,6 +68,49 @@ def test_generate_chat_response(client):
     assert resp.json()["ok"] is True
 
 
+def test_generate_chat_response_sets_server_timing(client, monkeypatch):
+    import routes.chat as routes_chat
+
+    monkeypatch.setattr(
+        routes_chat.ChatService,
+        "process_chat_message",
+        staticmethod(lambda *a, **k: {"ok": True, "processing_time": 0.5, "timings": {"session_lookup": 4.2, "run_exec": 300.0}}),
+    )
+    token = make_token()
+    resp = client.post(
+        "/chat/generate",
+        headers={"Authorization": f"Bearer {token}", "x-api-key": "k"},
+        json={"session_id": 1, "prompt": "hi", "message_type": "text"},
+    )
+    assert resp.status_code == 200
+    assert resp.headers["server-timing"] == "session_lookup;dur=4.2, run_exec;dur=300.0, total;dur=500.0"
+
+
+def test_search_passes_clamped_paging(client, monkeypatch):
+    import routes.chat as routes_chat
+
+    calls = []
+    monkeypatch.setattr(
+        routes_chat.ChatService,
+        "search_messages",
+        staticmethod(lambda *a: calls.append(a) or {"results": [], "total": 0, "has_more": False}),
+    )
+    token = make_token()
+    resp = client.get("/chat/search?q=banjir&limit=500", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert calls == [(1, "banjir", 100, 0)]
+
+
+def test_sync_rejects_oversized_batch(client, monkeypatch):
+    import services.chat_service as chat_service
+
+    monkeypatch.setattr(chat_service, "CHAT_SYNC_MAX_MESSAGES", 1)
+    token = make_token()
+    messages = [{"client_id": f"c{i}", "session_id": 1, "content": "hi"} for i in range(2)]
+    resp = client.post("/chat/sync", headers={"Authorization": f"Bearer {token}"}, json={"messages": messages})
+    assert resp.status_code == 413
+
+
 def test_update_and_delete(client):
     token = make_token()
     update = client.put(
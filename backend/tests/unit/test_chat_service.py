@@ -69,6 +69,40 @@ def test_process_chat_message_success(monkeypatch):
     assert result["bot_message"]["id"] == 2
 
 
+def test_process_chat_message_reports_stage_timings(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "ai_provider": "openai", "openai_thread_id": "t1"})
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(lambda *args, **kwargs: {"id": 1}))
+
+    saved = {}
+
+    def fake_save_bot_message(session_id, content, message_type="text", metadata=None):
+        saved["metadata"] = metadata
+        return {"id": 2}
+
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(fake_save_bot_message))
+
+    fake_service = types.SimpleNamespace(
+        generate_response=lambda prompt, thread_id=None, history=None: {
+            "response": "pong",
+            "duration": 0.1,
+            "thread_id": "t1",
+            "timings": {"thread": 3.0, "run_exec": 40.0},
+        }
+    )
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: fake_service)
+
+    result = chat_service.ChatService.process_chat_message(1, 7, "ping", None, {}, "text")
+
+    timings = result["timings"]
+    for stage in ("session_lookup", "user_persist", "thread", "run_exec", "bot_persist"):
+        assert stage in timings
+    assert timings["run_exec"] == 40.0
+    # The stored bot message carries the stages measured before it was written
+    assert saved["metadata"]["timings"]["thread"] == 3.0
+    assert "bot_persist" not in saved["metadata"]["timings"]
+
+
 def test_process_chat_message_missing_session(monkeypatch):
     monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: None)
 
@@ -99,8 +133,157 @@ def test_get_session_context_formats(monkeypatch):
         {"sender_type": "user", "content": "Hi"},
         {"sender_type": "bot", "content": "Hello"},
     ]
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "metadata": {}})
     monkeypatch.setattr(chat_service, "get_chat_messages", lambda *args, **kwargs: messages)
 
     context = chat_service.ChatService.get_session_context(session_id=1, user_id=1, last_messages=2)
     assert "Human: Hi" in context
     assert "Assistant: Hello" in context
+
+
+def test_get_session_context_includes_rolling_summary(monkeypatch):
+    metadata = {"context_summary": "User: where is the flood", "context_summary_through": 10}
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "metadata": metadata})
+    monkeypatch.setattr(chat_service, "get_chat_messages", lambda *args, **kwargs: [
+        {"id": 11, "sender_type": "user", "content": "Hi"},
+    ])
+
+    context = chat_service.ChatService.get_session_context(session_id=1, user_id=1)
+    assert context.index("where is the flood") < context.index("Human: Hi")
+
+
+def test_process_chat_message_seeds_history_without_current_prompt(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "ai_provider": "openai", "openai_thread_id": None})
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(lambda *args, **kwargs: {"id": 3, "content": "ping"}))
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(lambda *args, **kwargs: {"id": 4}))
+    monkeypatch.setattr("database.chat.update_session_metadata", lambda sid, data: True, raising=False)
+    # The concurrent history read may already see the prompt being inserted
+    monkeypatch.setattr(chat_service, "get_chat_messages", lambda *args, **kwargs: [
+        {"id": 1, "sender_type": "bot", "content": "Greetings!"},
+        {"id": 3, "sender_type": "user", "content": "ping"},
+    ])
+
+    seeded = {}
+
+    def fake_generate_response(prompt, thread_id=None, history=None):
+        seeded["history"] = history() if callable(history) else history
+        return {"response": "pong", "duration": 0.1, "thread_id": "t1"}
+
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: types.SimpleNamespace(generate_response=fake_generate_response))
+
+    chat_service.ChatService.process_chat_message(1, 7, "ping", None, {}, "text")
+
+    assert seeded["history"]["messages"] == [{"role": "assistant", "content": "Greetings!"}]
+
+
+def test_process_chat_message_persists_rolling_summary(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "_context_manager", chat_service.ChatContextManager(token_budget=40, summary_tokens=20))
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {
+        "id": sid, "ai_provider": "openai", "openai_thread_id": "t1", "metadata": {"openai_thread_id": "t1"}
+    })
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(lambda *args, **kwargs: {"id": 9}))
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(lambda *args, **kwargs: {"id": 10}))
+    monkeypatch.setattr(chat_service, "get_chat_messages", lambda *args, **kwargs: [
+        {"id": i, "sender_type": "user", "content": "x" * 40} for i in range(1, 6)
+    ])
+    saved = {}
+    monkeypatch.setattr("database.chat.update_session_metadata", lambda sid, data: saved.update(data) or True, raising=False)
+
+    sent = {}
+
+    def fake_generate_response(prompt, thread_id=None, history=None):
+        sent["context"] = history()
+        return {"response": "pong", "duration": 0.1, "thread_id": "t1"}
+
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: types.SimpleNamespace(generate_response=fake_generate_response))
+
+    chat_service.ChatService.process_chat_message(1, 7, "ping", None, {}, "text")
+
+    assert len(sent["context"]["messages"]) < 5
+    assert saved["context_summary"] == sent["context"]["summary"]
+    assert saved["context_summary_through"] == 5 - len(sent["context"]["messages"])
+    # The thread id is unchanged, so only the summary is written
+    assert "openai_thread_id" not in saved
+
+
+def test_process_chat_message_summarizes_history_beyond_the_fetch_limit(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "CHAT_CONTEXT_MAX_MESSAGES", 2)
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {
+        "id": sid, "ai_provider": "openai", "openai_thread_id": "t1", "metadata": {"openai_thread_id": "t1"}
+    })
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(lambda *args, **kwargs: {"id": 9}))
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(lambda *args, **kwargs: {"id": 10}))
+    monkeypatch.setattr("database.chat.update_session_metadata", lambda sid, data: True, raising=False)
+    reads = []
+
+    def get_messages(*args, **kwargs):
+        reads.append(kwargs.get("before_id"))
+        if kwargs.get("before_id"):
+            return [{"id": 1, "sender_type": "user", "content": "where is the flood"}]
+        return [{"id": 7, "sender_type": "user", "content": "hi"}, {"id": 8, "sender_type": "bot", "content": "hello"}]
+
+    monkeypatch.setattr(chat_service, "get_chat_messages", get_messages)
+    sent = {}
+
+    def fake_generate_response(prompt, thread_id=None, history=None):
+        sent["context"] = history()
+        return {"response": "pong", "duration": 0.1, "thread_id": "t1"}
+
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: types.SimpleNamespace(generate_response=fake_generate_response))
+
+    chat_service.ChatService.process_chat_message(1, 7, "ping", None, {}, "text")
+
+    # The recent fetch was cut at the limit, so the turns before it are loaded too
+    assert reads == [None, 7]
+    assert sent["context"]["messages"][0] == {"role": "user", "content": "where is the flood"}
+
+
+def test_process_chat_message_user_persist_failure_skips_bot_message(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "ai_provider": "openai", "openai_thread_id": "t1"})
+
+    def failing_save_user_message(*args, **kwargs):
+        raise HTTPException(status_code=500, detail="Failed to save message")
+
+    bot_saves = []
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(failing_save_user_message))
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(lambda *args, **kwargs: bot_saves.append(args)))
+    fake_service = types.SimpleNamespace(
+        generate_response=lambda prompt, thread_id=None, history=None: {"response": "pong", "duration": 0.1, "thread_id": "t1"}
+    )
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: fake_service)
+
+    with pytest.raises(HTTPException) as exc:
+        chat_service.ChatService.process_chat_message(1, 7, "hi", None, {}, "text")
+
+    assert exc.value.status_code == 500
+    assert bot_saves == []
+
+
+def test_process_chat_message_async_bot_persist_returns_pending(monkeypatch):
+    monkeypatch.setattr(chat_service, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(chat_service, "CHAT_ASYNC_BOT_PERSIST", True)
+    monkeypatch.setattr(chat_service, "get_chat_session", lambda sid, uid: {"id": sid, "ai_provider": "openai", "openai_thread_id": "t1"})
+    monkeypatch.setattr(chat_service.ChatService, "save_user_message", staticmethod(lambda *args, **kwargs: {"id": 1}))
+    monkeypatch.setattr(chat_service.ChatService, "save_bot_message", staticmethod(lambda *args, **kwargs: {"id": 2}))
+    fake_service = types.SimpleNamespace(
+        generate_response=lambda prompt, thread_id=None, history=None: {"response": "pong", "duration": 0.1, "thread_id": "t1"}
+    )
+    monkeypatch.setattr(chat_service, "get_openai_assistant_service", lambda: fake_service)
+
+    result = chat_service.ChatService.process_chat_message(1, 7, "hi", None, {}, "text")
+
+    assert result["bot_message"]["pending"] is True
+    assert result["bot_message"]["id"] is None
+    assert result["bot_message"]["content"] == "pong"
+
+
+def test_get_user_sessions_rejects_malformed_cursor(monkeypatch):
+    monkeypatch.setattr(chat_service, "get_user_chat_sessions_page", lambda *args: pytest.fail("should not query"))
+
+    with pytest.raises(HTTPException) as exc:
+        chat_service.ChatService.get_user_sessions(1, before="12")
+    assert exc.value.status_code == 400
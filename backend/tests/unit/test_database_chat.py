@@ -0,0 +1,359 @@
+"""
+Unit tests for database.chat module
+Tests pagination queries and message persistence SQL
+"""
+from datetime import datetime
+from unittest.mock import patch
+
+
+class FakeCursor:
+    """Mock database cursor that replays queued results"""
+
+    def __init__(self, fetchone_results=None, fetchall_results=None):
+        self.executed = []
+        self.fetchone_results = list(fetchone_results or [])
+        self.fetchall_results = list(fetchall_results or [])
+        self.rowcount = 1
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        return self
+
+    def fetchone(self):
+        return self.fetchone_results.pop(0) if self.fetchone_results else None
+
+    def fetchall(self):
+        return self.fetchall_results.pop(0) if self.fetchall_results else []
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Mock database connection usable as a context manager"""
+
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.committed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+def _message_rows(ids):
+    return [(i, "user", f"m{i}", "text", datetime(2024, 1, 1, 12, 0, i)) for i in ids]
+
+
+class TestGetChatMessagesPage:
+    """Test keyset pagination of chat messages"""
+
+    def test_before_id_uses_keyset_and_returns_chronological(self):
+        import database.chat as chat_module
+
+        # Newest-first rows older than the cursor; one extra row signals has_more
+        cursor = FakeCursor(fetchone_results=[(40, None)], fetchall_results=[_message_rows([9, 8, 7])])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 1, limit=2, before_id=10)
+
+        query, params = cursor.executed[1]
+        assert "OFFSET" not in query
+        assert "m.id < c.id" in query
+        assert params == (3, 10, 5)
+        assert [m["id"] for m in page["messages"]] == [8, 9]
+        assert page["has_more"] is True
+        assert page["total"] == 40
+
+    def test_after_id_reads_forward(self):
+        import database.chat as chat_module
+
+        cursor = FakeCursor(fetchone_results=[(3, None)], fetchall_results=[_message_rows([11, 12])])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 1, limit=5, after_id=10)
+
+        query, _ = cursor.executed[1]
+        assert "m.id > c.id" in query
+        assert [m["id"] for m in page["messages"]] == [11, 12]
+        assert page["has_more"] is False
+
+    def test_archived_session_reads_hot_and_archive_tables(self):
+        import database.chat as chat_module
+
+        cursor = FakeCursor(fetchone_results=[(4, datetime(2024, 6, 1))], fetchall_results=[_message_rows([2, 1])])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 1, limit=2, before_id=3)
+
+        query, params = cursor.executed[1]
+        assert query.count("chat_messages_archive") == 2
+        assert "DECOMPRESS(content_compressed)" in query
+        assert params == (3, 5, 5, 5, 5, 3, 5)
+        assert [m["id"] for m in page["messages"]] == [1, 2]
+
+    def test_foreign_session_returns_empty_page(self):
+        import database.chat as chat_module
+
+        cursor = FakeCursor(fetchone_results=[None])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 99)
+
+        assert page == {"messages": [], "total": 0, "has_more": False}
+        assert len(cursor.executed) == 1
+
+
+class TestGetUserChatSessionsPage:
+    """Test session listing pagination and totals"""
+
+    def test_offset_page_reports_real_total(self):
+        import database.chat as chat_module
+
+        rows = [
+            (i, f"s{i}", "openai", datetime(2024, 1, 1), datetime(2024, 1, 2), 1, 4, datetime(2024, 1, 2), "last")
+            for i in (3, 2)
+        ]
+        cursor = FakeCursor(fetchone_results=[(12,)], fetchall_results=[rows])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_user_chat_sessions_page(1, limit=2)
+
+        assert [s["id"] for s in page["sessions"]] == [3, 2]
+        assert page["total"] == 12
+        assert page["has_more"] is False
+
+    def test_session_list_reads_summary_columns_without_aggregating_messages(self):
+        import database.chat as chat_module
+
+        rows = [(3, "s3", "openai", datetime(2024, 1, 1), datetime(2024, 1, 2), 1, 7, datetime(2024, 1, 2, 9), "see you")]
+        cursor = FakeCursor(fetchone_results=[(1,)], fetchall_results=[rows])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            session = chat_module.get_user_chat_sessions_page(1)["sessions"][0]
+
+        query, _ = cursor.executed[0]
+        assert "chat_messages" not in query
+        assert "GROUP BY" not in query
+        assert session["message_count"] == 7
+        assert session["last_message_preview"] == "see you"
+        assert session["last_message_at"] == "2024-01-02T09:00:00"
+
+
+class SessionTableCursor(FakeCursor):
+    """Evaluates the session list queries against in-memory (id, updated_at) rows"""
+
+    def __init__(self, sessions):
+        super().__init__()
+        self.sessions = sessions
+
+    def execute(self, query, params=None):
+        super().execute(query, params)
+        if "FROM chat_sessions s" not in query:
+            self.fetchone_results = [(len(self.sessions),)]
+            return self
+        rows = sorted(self.sessions.items(), key=lambda item: (item[1], item[0]))
+        if "OFFSET" in query:
+            _, offset, size = params
+            rows = list(reversed(rows))[offset:offset + size]
+        else:
+            size, _, position_at, _, position_id = params
+            position = (datetime.strptime(position_at, "%Y-%m-%dT%H:%M:%S.%f"), position_id)
+            if "s.updated_at >" in query:
+                rows = [r for r in rows if (r[1], r[0]) > position][:size]
+            else:
+                rows = [r for r in reversed(rows) if (r[1], r[0]) < position][:size]
+        self.fetchall_results = [[(i, "s", "openai", at, at, 1, 0, None, None) for i, at in rows]]
+        return self
+
+
+class TestSessionListDrift:
+    """Keyset cursors carry their position while sessions are re-ordered by new messages"""
+
+    def _page(self, cursor, **kwargs):
+        import database.chat as chat_module
+
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            return chat_module.get_user_chat_sessions_page(1, limit=2, **kwargs)
+
+    def test_sessions_updated_while_paging_are_not_repeated(self):
+        import database.chat as chat_module
+
+        sessions = {i: datetime(2024, 1, 1, 12, 0, i) for i in range(1, 5)}
+        cursor = SessionTableCursor(sessions)
+        first = self._page(cursor)
+        assert [s["id"] for s in first["sessions"]] == [4, 3]
+
+        # The cursor's own session and an older one both get a new message
+        sessions[3] = datetime(2024, 1, 1, 13)
+        sessions[1] = datetime(2024, 1, 1, 13, 0, 1)
+
+        older = self._page(cursor, before=chat_module.parse_session_cursor(first["next_before"]))
+        assert [s["id"] for s in older["sessions"]] == [2]
+        assert older["has_more"] is False
+
+        # Sessions that moved above the first page are picked up from the top
+        newer = self._page(cursor, after=chat_module.parse_session_cursor(first["next_after"]))
+        assert [s["id"] for s in newer["sessions"]] == [1, 3]
+
+
+class TestSessionCounter:
+    """The session list total comes from chat_session_counters"""
+
+    def test_list_reads_the_counter_instead_of_counting(self):
+        import database.chat as chat_module
+
+        cursor = FakeCursor(fetchone_results=[(3,)], fetchall_results=[[]])
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_user_chat_sessions_page(1)
+
+        assert page["total"] == 3
+        assert not any("COUNT(*)" in q for q, _ in cursor.executed)
+
+    def test_create_and_delete_adjust_the_counter(self):
+        import database.chat as chat_module
+
+        created_row = (5, "t", "openai", datetime(2024, 1, 1), datetime(2024, 1, 1))
+        cursor = FakeCursor(fetchone_results=[created_row, (True,), (False,)])
+        conn = FakeConnection(cursor)
+        with patch.object(chat_module, "DatabaseConnection", return_value=conn):
+            chat_module.create_chat_session(1, "t")
+            assert chat_module.delete_chat_session(5, 1) is True
+            # Already deleted: still found, but not counted again
+            assert chat_module.delete_chat_session(5, 1) is True
+
+        bumps = [params for q, params in cursor.executed if "UPDATE chat_session_counters" in q]
+        assert bumps == [(1, 1, 1), (-1, -1, 1)]
+        seeds = [q for q, _ in cursor.executed if "INSERT INTO chat_session_counters" in q]
+        assert len(seeds) == 3
+        assert conn.autocommit is True
+
+
+def test_save_chat_message_increments_message_counter():
+    import database.chat as chat_module
+
+    cursor = FakeCursor(fetchone_results=[(1,), (77, datetime(2024, 1, 1))])
+    with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+        message = chat_module.save_chat_message(5, "user", "hello")
+
+    assert message["id"] == 77
+    update_query, update_params = cursor.executed[-1]
+    assert "message_count = message_count + 1" in update_query
+    assert update_params == (datetime(2024, 1, 1), "hello", 5)
+
+
+def test_make_message_preview_collapses_and_truncates():
+    import database.chat as chat_module
+
+    assert chat_module.make_message_preview("a\n\n  b") == "a b"
+    assert len(chat_module.make_message_preview("x" * 500)) == chat_module.LAST_MESSAGE_PREVIEW_LENGTH
+    assert chat_module.make_message_preview(None) == ""
+
+
+class TestSearchChatMessages:
+    """Test ranked chat history search"""
+
+    def _search(self, cursor, fulltext, query="Banjir kilat"):
+        import database.chat as chat_module
+
+        with patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)), \
+             patch.object(chat_module, "_chat_fulltext_enabled", fulltext):
+            return chat_module.search_chat_messages(1, query, limit=2)
+
+    def test_fulltext_search_uses_prefix_terms_and_rank(self):
+        rows = [(8, 3, "Flood", "bot", "Amaran banjir kilat di Kelantan", datetime(2024, 1, 1), 120, 5)]
+        cursor = FakeCursor(fetchall_results=[rows])
+        page = self._search(cursor, True)
+
+        query, params = cursor.executed[0]
+        assert "CONTAINSTABLE" in query
+        assert params == ('"banjir*" AND "kilat*"', 1, "%banjir%", "%kilat%", 1, 0, 2)
+        assert page["results"][0]["session_id"] == 3
+        assert page["results"][0]["rank"] == 120
+        assert page["results"][0]["snippet"].startswith("Amaran banjir")
+        assert page["total"] == 5
+        assert page["has_more"] is True
+
+    def test_falls_back_to_like_scan_of_user_sessions(self):
+        cursor = FakeCursor(fetchall_results=[[]])
+        page = self._search(cursor, False, query="flood_zone")
+
+        query, params = cursor.executed[0]
+        assert "CONTAINSTABLE" not in query
+        assert params == (1, "%flood[_]zone%", 1, "%flood[_]zone%", 0, 2)
+        assert page == {"results": [], "total": 0, "has_more": False}
+
+    def test_archived_sessions_are_decompressed_and_searched(self):
+        rows = [(4, 2, "Old", "user", "banjir kilat 2019", datetime(2019, 1, 1), 0, 1)]
+        for fulltext in (True, False):
+            cursor = FakeCursor(fetchall_results=[rows])
+            page = self._search(cursor, fulltext)
+
+            query, _ = cursor.executed[0]
+            assert "FROM chat_messages_archive" in query
+            assert "DECOMPRESS(content_compressed)" in query
+            assert "s.archived_at IS NOT NULL" in query
+            assert page["results"][0]["message_id"] == 4
+
+    def test_blank_query_skips_database(self):
+        cursor = FakeCursor()
+        assert self._search(cursor, True, query=" ?! ")["results"] == []
+        assert cursor.executed == []
+
+
+def test_make_search_snippet_centers_on_first_match():
+    import database.chat as chat_module
+
+    content = "a" * 100 + " Kebanjiran berlaku " + "b" * 100
+    snippet = chat_module.make_search_snippet(content, ["kebanjiran"])
+    assert snippet.startswith("...") and snippet.endswith("...")
+    assert "Kebanjiran berlaku" in snippet
+
+
+class TestSyncChatMessages:
+    """Test bulk offline sync"""
+
+    def test_inserts_new_dedupes_replays_and_rejects_foreign_sessions(self):
+        import database.chat as chat_module
+
+        ts = datetime(2024, 1, 1, 8)
+        cursor = FakeCursor(fetchall_results=[
+            [(5,)],                          # owned sessions
+            [(5, "c1", 101, ts)],            # inserted rows
+            [(5, "c0", 90, ts)],             # previously stored replay
+        ])
+        conn = FakeConnection(cursor)
+        items = [
+            {"client_id": "c0", "session_id": 5, "content": "old"},
+            {"client_id": "c1", "session_id": 5, "content": "new"},
+            {"client_id": "c1", "session_id": 5, "content": "new"},
+            {"client_id": "x", "session_id": 6, "content": "not mine"},
+        ]
+        with patch.object(chat_module, "DatabaseConnection", return_value=conn):
+            results = chat_module.sync_chat_messages(1, items)
+
+        assert [r["status"] for r in results] == ["duplicate", "created", "duplicate", "rejected"]
+        assert results[0]["message"]["id"] == 90
+        assert results[1]["message"]["id"] == 101
+        assert results[3]["message"] is None
+
+        # Ownership is checked once for all sessions in the batch
+        assert cursor.executed[0][1] == (1, 5, 6)
+        insert_query, insert_params = cursor.executed[1]
+        assert "WHERE NOT EXISTS" in insert_query
+        # A replay of a message archived since is still recognised
+        assert "FROM chat_messages_archive a WITH (UPDLOCK, HOLDLOCK)" in insert_query
+        replay_query, replay_params = cursor.executed[2]
+        assert "FROM chat_messages_archive" in replay_query
+        assert replay_params == [5, "c0", 5, "c0"]
+        assert insert_params == [0, 5, "c0", "old", "text", 1, 5, "c1", "new", "text"]
+        update_query, update_params = cursor.executed[-1]
+        assert "message_count = message_count + ?" in update_query
+        assert update_params == (1, ts, "new", 5)
+        assert conn.committed
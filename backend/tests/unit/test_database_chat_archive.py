@@ -0,0 +1,87 @@
+"""
+Unit tests for database.chat_archive module
+Tests the TEXT -> NVARCHAR(MAX) migration and the batched archive mover
+"""
+from unittest.mock import patch
+
+from tests.unit.test_database_chat import FakeConnection, FakeCursor
+
+
+def test_migration_skips_when_content_is_already_nvarchar():
+    import database.chat_archive as archive_module
+
+    cursor = FakeCursor(fetchone_results=[(0,), ("nvarchar",)])
+    with patch.object(archive_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+        assert archive_module.migrate_chat_message_content() is False
+
+    queries = [q for q, _ in cursor.executed]
+    assert len(queries) == 3
+    assert "sp_getapplock" in queries[0]
+    assert "sp_releaseapplock" in queries[-1]
+
+
+def test_migration_skips_while_another_worker_holds_the_lock():
+    import database.chat_archive as archive_module
+
+    cursor = FakeCursor(fetchone_results=[(-1,)])
+    with patch.object(archive_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+        assert archive_module.migrate_chat_message_content() is False
+
+    assert len(cursor.executed) == 1
+
+
+def test_maintenance_thread_is_not_started_when_nothing_is_enabled():
+    import database.chat_archive as archive_module
+
+    with patch.object(archive_module, "CHAT_ARCHIVE_ENABLED", False), \
+         patch.object(archive_module, "CHAT_CONTENT_MIGRATION_ENABLED", False), \
+         patch.object(archive_module.threading, "Thread") as thread:
+        archive_module.start_chat_maintenance()
+
+    thread.assert_not_called()
+
+
+def test_migration_copies_in_ranges_then_swaps_columns():
+    import database.chat as chat_module
+    import database.chat_archive as archive_module
+
+    cursor = FakeCursor(fetchone_results=[(0,), ("text",), (250,)])
+    conn = FakeConnection(cursor)
+    with patch.object(archive_module, "DatabaseConnection", return_value=conn), \
+         patch.object(chat_module, "create_chat_search_index") as create_index:
+        assert archive_module.migrate_chat_message_content(batch_size=100, pause=0) is True
+
+    queries = [q for q, _ in cursor.executed]
+    range_copies = [p for q, p in cursor.executed if "WHERE id > ? AND id <= ?" in q]
+    assert range_copies == [(0, 100), (100, 200), (200, 300)]
+    assert "NOT NULL" in queries[2] and "DEFAULT ''" in queries[2]
+    swap = next(i for i, q in enumerate(queries) if "TABLOCKX" in q)
+    assert cursor.executed[swap][1] == (250,)
+    assert "DROP CONSTRAINT DF_chat_messages_content_nv" in queries[swap + 1]
+    assert "DROP COLUMN content" in queries[swap + 2]
+    assert "sp_rename" in queries[swap + 3]
+    assert not any("ALTER COLUMN" in q for q in queries)
+    assert "sp_releaseapplock" in queries[-1]
+    assert conn.committed
+    assert conn.autocommit is True
+    create_index.assert_called_once()
+
+
+def test_archive_moves_batches_and_marks_sessions():
+    import database.chat_archive as archive_module
+
+    cursor = FakeCursor(fetchall_results=[[(1, 7), (2, 7), (3, 8)], []])
+    conn = FakeConnection(cursor)
+    with patch.object(archive_module, "DatabaseConnection", return_value=conn):
+        moved = archive_module.archive_idle_chat_messages(idle_days=30, batch_size=3, pause=0)
+
+    assert moved == 3
+    select_query, select_params = cursor.executed[0]
+    assert select_params == (3, 30)
+    insert_query, insert_params = cursor.executed[1]
+    assert "COMPRESS(" in insert_query
+    assert "client_message_id" in insert_query
+    assert insert_params == [1, 2, 3]
+    assert cursor.executed[2] == ("DELETE FROM chat_messages WHERE id IN (?, ?, ?)", [1, 2, 3])
+    assert cursor.executed[3][1] == [7, 8]
+    assert conn.autocommit is True
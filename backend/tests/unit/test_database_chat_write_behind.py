@@ -0,0 +1,195 @@
+"""
+Unit tests for database.chat_write_behind module
+Tests batching, flush failure handling and read-your-writes overlay
+"""
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from tests.unit.test_database_chat import FakeConnection, FakeCursor, _message_rows
+
+
+class BatchCursor(FakeCursor):
+    """FakeCursor that also records executemany calls"""
+
+    def __init__(self, fail=False, **kwargs):
+        super().__init__(**kwargs)
+        self.fail = fail
+        self.many = []
+        self.fast_executemany = False
+
+    def execute(self, query, params=None):
+        if self.fail:
+            raise Exception("database unavailable")
+        return super().execute(query, params)
+
+    def executemany(self, query, rows):
+        self.many.append((query, rows))
+
+
+@pytest.fixture
+def queue():
+    import database.chat_write_behind as wb_module
+
+    # A long interval keeps the background thread out of the way; tests flush explicitly
+    q = wb_module.ChatWriteBehindQueue(flush_interval=60, batch_size=500)
+    yield q
+    with patch.object(q, "_write_batch", side_effect=len):
+        q.close()
+
+
+class TestChatWriteBehindQueue:
+    """Test queueing and batched flushes"""
+
+    def test_enqueue_returns_pending_message(self, queue):
+        message = queue.enqueue(5, "user", "hello")
+
+        assert message["id"] is None
+        assert message["pending"] is True
+        assert message["session_id"] == 5
+        assert queue.pending_for_session(5)[0]["client_ref"] == message["client_ref"]
+        assert queue.pending_for_session(6) == []
+
+    def test_flush_batches_inserts_and_updates_each_session_once(self, queue):
+        import database.chat_write_behind as wb_module
+
+        for i in range(3):
+            queue.enqueue(5, "user", f"m{i}")
+        queue.enqueue(6, "bot", "other", metadata={"k": 1})
+
+        cursor = BatchCursor(fetchall_results=[[(5,), (5,), (5,), (6,)]])
+        conn = FakeConnection(cursor)
+        with patch.object(wb_module, "DatabaseConnection", return_value=conn):
+            assert queue.flush() == 4
+
+        assert conn.committed
+        inserts = [q for q, _ in cursor.executed if "INSERT INTO chat_messages" in q]
+        assert len(inserts) == 1
+        _, params = cursor.executed[0]
+        assert len(params) == 4 * 7
+        assert params[7 * 3 + 5] == '{"k": 1}'
+
+        _, rows = cursor.many[0]
+        summaries = {row[3]: row for row in rows}
+        assert summaries[5][0] == 3
+        assert summaries[5][2] == "m2"
+        assert summaries[6][0] == 1
+        assert queue.get_stats()["pending"] == 0
+        assert queue.version % 2 == 0
+
+    def test_messages_for_deleted_sessions_count_as_dropped(self, queue):
+        import database.chat_write_behind as wb_module
+
+        queue.enqueue(5, "user", "kept")
+        queue.enqueue(9, "user", "session deleted meanwhile")
+        queue.enqueue(5, "bot", "kept too")
+
+        # Only session 5's rows come back from OUTPUT
+        cursor = BatchCursor(fetchall_results=[[(5,), (5,)]])
+        with patch.object(wb_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            assert queue.flush() == 2
+
+        _, rows = cursor.many[0]
+        assert rows == [(2, rows[0][1], "kept too", 5)]
+        stats = queue.get_stats()
+        assert stats["flushed"] == 2
+        assert stats["dropped"] == 1
+        assert stats["pending"] == 0
+
+    def test_failed_flush_keeps_messages_queued(self, queue):
+        import database.chat_write_behind as wb_module
+
+        queue.enqueue(5, "user", "hello")
+        with patch.object(wb_module, "DatabaseConnection", return_value=FakeConnection(BatchCursor(fail=True))):
+            assert queue.flush() == 0
+
+        stats = queue.get_stats()
+        assert stats["pending"] == 1
+        assert stats["failed_flushes"] == 1
+        assert queue.version % 2 == 0
+
+    def test_repeatedly_failing_batch_is_retried_one_by_one_and_the_bad_message_dropped(self, queue):
+        def write_batch(batch):
+            if any(e["content"] == "bad" for e in batch):
+                raise Exception("String or binary data would be truncated")
+            return len(batch)
+
+        queue.max_attempts = 2
+        for content in ("first", "bad", "last"):
+            queue.enqueue(5, "user", content)
+        with patch.object(queue, "_write_batch", side_effect=write_batch), \
+             patch.object(queue, "_database_reachable", return_value=True):
+            assert queue.flush() == 0
+            assert queue.flush() == 2
+
+        stats = queue.get_stats()
+        assert stats["pending"] == 0
+        assert stats["dropped"] == 1
+        assert queue.version % 2 == 0
+
+    def test_outage_keeps_every_message_queued(self, queue):
+        queue.max_attempts = 1
+        queue.enqueue(5, "user", "hello")
+        queue.enqueue(5, "user", "again")
+        with patch.object(queue, "_write_batch", side_effect=Exception("database unavailable")), \
+             patch.object(queue, "_database_reachable", return_value=False):
+            assert queue.flush() == 0
+            assert queue.flush() == 0
+
+        stats = queue.get_stats()
+        assert stats["pending"] == 2
+        assert stats["dropped"] == 0
+
+
+class TestReadYourWrites:
+    """Test merging unflushed messages into message pages"""
+
+    def test_newest_first_page_puts_pending_last(self, queue):
+        import database.chat as chat_module
+
+        queue.enqueue(5, "user", "queued")
+        cursor = FakeCursor(fetchone_results=[(2, None)], fetchall_results=[_message_rows([2, 1])])
+        with patch.object(chat_module, "get_chat_write_behind", return_value=queue), \
+             patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 1, limit=2, order_desc=True)
+
+        # The pending message takes one slot, so only one persisted row is read
+        _, params = cursor.executed[1]
+        assert params == (5, 0, 2)
+        assert [m["content"] for m in page["messages"]] == ["m2", "queued"]
+        assert page["total"] == 3
+
+    def test_chronological_page_appends_pending_at_the_end(self, queue):
+        import database.chat as chat_module
+
+        queue.enqueue(5, "user", "queued")
+        cursor = FakeCursor(fetchone_results=[(1, None)], fetchall_results=[_message_rows([1])])
+        with patch.object(chat_module, "get_chat_write_behind", return_value=queue), \
+             patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 1, limit=10)
+
+        assert [m["id"] for m in page["messages"]] == [1, None]
+        assert page["has_more"] is False
+
+    def test_foreign_session_does_not_expose_pending(self, queue):
+        import database.chat as chat_module
+
+        queue.enqueue(5, "user", "queued")
+        cursor = FakeCursor(fetchone_results=[None])
+        with patch.object(chat_module, "get_chat_write_behind", return_value=queue), \
+             patch.object(chat_module, "DatabaseConnection", return_value=FakeConnection(cursor)):
+            page = chat_module.get_chat_messages_page(5, 99)
+
+        assert page == {"messages": [], "total": 0, "has_more": False}
+
+    def test_save_chat_message_enqueues_when_enabled(self, queue):
+        import database.chat as chat_module
+
+        with patch.object(chat_module, "get_chat_write_behind", return_value=queue), \
+             patch.object(chat_module, "DatabaseConnection") as connection:
+            message = chat_module.save_chat_message(5, "bot", "hi")
+
+        connection.assert_not_called()
+        assert message["pending"] is True
+        assert queue.get_stats()["enqueued"] == 1
@@ -25,6 +25,7 @@ class FakeConnection:
         self.cursor_obj = FakeCursor()
         self.autocommit = True
         self.closed = False
+        self.rolled_back = False
 
     def cursor(self):
         return self.cursor_obj
@@ -33,7 +34,7 @@ class FakeConnection:
         self.closed = True
 
     def rollback(self):
-        return None
+        self.rolled_back = True
 
 
 @pytest.fixture(autouse=True)
@@ -66,6 +67,31 @@ def test_get_and_return_connection(fake_connect):
     assert pool.active_connections >= 0
 
 
+def test_managed_connection_forwards_autocommit_and_the_pool_resets_it(fake_connect):
+    conn = connection_module.get_db_conn()
+    raw = conn.conn
+
+    conn.autocommit = False
+    assert raw.autocommit is False
+
+    conn.close()
+    # An unfinished transaction is rolled back, never committed by the next user
+    assert raw.rolled_back
+    assert raw.autocommit is True
+    assert raw in conn.pool.pool.queue
+
+
+def test_managed_connection_rolls_back_on_error(fake_connect):
+    conn = connection_module.get_db_conn()
+    with pytest.raises(RuntimeError):
+        with conn:
+            conn.autocommit = False
+            raise RuntimeError("statement failed")
+
+    assert conn.conn.rolled_back
+    assert conn.conn.autocommit is True
+
+
 def test_format_timestamp_handles_types():
     from datetime import datetime
 
@@ -0,0 +1,38 @@
+"""
+Unit tests for database.schema module
+Tests that the notification migrations run and report failure independently
+"""
+from unittest.mock import patch
+
+from tests.unit.test_database_chat import FakeConnection, FakeCursor
+
+
+class FailingCursor(FakeCursor):
+    """FakeCursor that raises on statements containing a marker"""
+
+    def __init__(self, marker, **kwargs):
+        super().__init__(**kwargs)
+        self.marker = marker
+
+    def execute(self, query, params=None):
+        if self.marker in query:
+            raise Exception("Cannot create index")
+        return super().execute(query, params)
+
+
+def test_a_failing_notification_migration_does_not_skip_the_others():
+    import database.schema as schema_module
+
+    # message_id column, then COL_LENGTH of each legacy column (none left)
+    cursor = FailingCursor("IX_notifications_user_feed", fetchone_results=[(None,)] * 5)
+    with patch.object(schema_module, "DatabaseConnection", side_effect=lambda: FakeConnection(cursor)), \
+         patch.object(schema_module.logger, "error") as log_error:
+        assert schema_module.migrate_notification_messages() is False
+
+    queries = " ".join(q for q, _ in cursor.executed)
+    assert "IX_notifications_message_id" in queries
+    assert "IX_notifications_user_version" in queries
+    assert "notification_message_stats" in queries
+    assert "notification_digest_items" in queries
+    log_error.assert_called_once()
+    assert "feed indexes" in log_error.call_args[0][0]
@@ -42,3 +42,52 @@ def test_get_or_create_thread_uses_existing(monkeypatch):
     service = oas.get_openai_assistant_service()
     thread_id = service.get_or_create_thread("existing")
     assert thread_id == "existing"
+
+
+def test_generate_response_budgets_existing_thread(monkeypatch):
+    monkeypatch.setattr(oas, "OPENAI_ASSISTANT_ENABLED", True)
+    monkeypatch.setattr(oas, "OPENAI_API_KEY", "k")
+    monkeypatch.setattr(oas, "OPENAI_ASSISTANT_ID", "asst")
+    monkeypatch.setattr(oas, "_openai_service", None, raising=False)
+
+    run_kwargs = {}
+    posted = []
+    reply = types.SimpleNamespace(content=[types.SimpleNamespace(text=types.SimpleNamespace(value="pong"))])
+
+    def create_run(**kwargs):
+        run_kwargs.update(kwargs)
+        return types.SimpleNamespace(id="r1", status="completed")
+
+    fake_client = types.SimpleNamespace(
+        beta=types.SimpleNamespace(
+            threads=types.SimpleNamespace(
+                retrieve=lambda tid: True,
+                create=lambda: types.SimpleNamespace(id="t-new"),
+                messages=types.SimpleNamespace(
+                    create=lambda **kwargs: posted.append(kwargs),
+                    list=lambda **kwargs: types.SimpleNamespace(data=[reply]),
+                ),
+                runs=types.SimpleNamespace(create=create_run),
+            ),
+        )
+    )
+    monkeypatch.setattr(oas, "OpenAI", lambda api_key=None: fake_client)
+
+    service = oas.get_openai_assistant_service()
+    context = {"messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}],
+               "summary": "User: flood in Kelantan"}
+    result = service.generate_response("ping", thread_id="t1", history=lambda: context)
+
+    assert result["response"] == "pong"
+    # Only the prompt is posted; the selected context travels with the run
+    assert [m["content"] for m in posted] == ["ping"]
+    assert run_kwargs["truncation_strategy"] == {"type": "last_messages", "last_messages": 1}
+    instructions = run_kwargs["additional_instructions"]
+    assert "flood in Kelantan" in instructions
+    assert instructions.endswith("User: hi\nAssistant: hello")
+
+    # A new thread is not seeded message by message either
+    posted.clear()
+    result = service.generate_response("ping", thread_id=None, history=context)
+    assert result["thread_id"] == "t-new"
+    assert [m["content"] for m in posted] == ["ping"]
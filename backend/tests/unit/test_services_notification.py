@@ -243,3 +243,94 @@ class TestNotificationService:
             notif_service.get_notifications(user_id=42)
         
         assert fake_conn.closed
+
+
+class TestNotificationMessages:
+    """Test admin views over shared notification messages"""
+    
+    def test_grouped_view_pages_messages(self, monkeypatch):
+        """Test grouped admin view returns one row per message with its id"""
+        import services.notification_service as notif_service
+        
+        fake_conn = FakeConnection()
+        fake_conn.cursor_obj.fetchall_data = [
+            ("Flood", "Evacuate", "danger", "flood", "Kelantan",
+             datetime(2024, 1, 2), datetime(2024, 1, 1), 3, 3, 1, 77)
+        ]
+        fake_conn.cursor_obj.fetchone_data = (1,)
+        
+        with patch.object(notif_service, 'get_db_conn', return_value=fake_conn):
+            result = notif_service.get_all_notifications(grouped=True)
+        
+        group = result["notifications"][0]
+        assert group["message_id"] == 77
+        assert group["user_count"] == 3 and group["unread_count"] == 1
+        query = fake_conn.cursor_obj.executed[0][0]
+        assert "FROM notification_messages m" in query
+        assert "GROUP BY" not in query
+    
+    def test_users_lookup_by_message_id(self, monkeypatch):
+        """Test recipients are found by message id instead of matching text"""
+        import services.notification_service as notif_service
+        
+        fake_conn = FakeConnection()
+        fake_conn.cursor_obj.fetchall_data = [
+            (5, 42, 0, datetime(2024, 1, 1), "a@example.com", "Aina")
+        ]
+        
+        with patch.object(notif_service, 'get_db_conn', return_value=fake_conn):
+            result = notif_service.get_notification_users(None, None, None, message_id=77)
+        
+        query, params = fake_conn.cursor_obj.executed[0]
+        assert "n.message_id = ?" in query
+        assert params == (77,)
+        assert result["users"][0]["user_email"] == "a@example.com"
+
+
+class TestFeedPagination:
+    """Test keyset pagination of the user feed"""
+    
+    def _page(self, ids):
+        return [(i, 42, "T", "M", "info", None, None, 0, datetime(2024, 1, 1), None) for i in ids]
+    
+    def test_full_page_returns_next_cursor(self, monkeypatch):
+        """Test a full page hands back its last id as the next cursor"""
+        import services.notification_service as notif_service
+        
+        fake_conn = FakeConnection()
+        fake_conn.cursor_obj.fetchall_data = self._page([9, 8])
+        fake_conn.cursor_obj.fetchone_data = (5, 5)
+        
+        with patch.object(notif_service, 'get_db_conn', return_value=fake_conn):
+            result = notif_service.get_user_notifications(42, limit=2)
+        
+        assert result["next_before"] == "2024-01-01T00:00:00.000_8"
+        assert "OFFSET ? ROWS" in fake_conn.cursor_obj.executed[1][0]
+    
+    def test_before_seeks_past_cursor_position(self, monkeypatch):
+        """Test before= filters on the cursor's (created_at, id) without looking the row up"""
+        import services.notification_service as notif_service
+        
+        fake_conn = FakeConnection()
+        fake_conn.cursor_obj.fetchall_data = self._page([7])
+        fake_conn.cursor_obj.fetchone_data = (5, 5)
+        
+        with patch.object(notif_service, 'get_db_conn', return_value=fake_conn):
+            result = notif_service.get_user_notifications(
+                42, limit=2, unread_only=True, before="2024-01-01T09:30:00.003_8"
+            )
+        
+        query, params = fake_conn.cursor_obj.executed[1]
+        assert "n.created_at < CAST(? AS DATETIME)" in query
+        assert "WHERE id = ?" not in query
+        assert "n.is_read = 0" in query
+        assert params == [42, "2024-01-01T09:30:00.003", "2024-01-01T09:30:00.003", 8, 2]
+        assert result["next_before"] is None
+    
+    def test_malformed_cursor_is_rejected(self):
+        """Test a cursor that is not (created_at, id) is a 400, not an empty page"""
+        import services.notification_service as notif_service
+        
+        with pytest.raises(notif_service.HTTPException) as exc:
+            notif_service.get_user_notifications(42, before="8")
+        assert exc.value.status_code == 400
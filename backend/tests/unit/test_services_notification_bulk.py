@@ -0,0 +1,108 @@
+"""
+Unit tests for services.notification_bulk module
+Tests that bulk mutations run in bounded chunks, each committing its own counter deltas
+"""
+from unittest.mock import patch
+
+import pytest
+
+import services.notification_bulk as bulk
+import services.notification_service as notif_service
+
+
+class ChunkCursor:
+    """Cursor replaying OUTPUT rows for each UPDATE/DELETE and counter rows for each bump"""
+
+    def __init__(self, outputs=(), counters=()):
+        self.outputs = list(outputs)
+        self.counters = list(counters)
+        self.executed = []
+        self.many = []
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    def executemany(self, query, rows):
+        self.many.append(rows)
+
+    def fetchall(self):
+        return self.outputs.pop(0) if self.outputs else []
+
+    def fetchone(self):
+        return self.counters.pop(0) if self.counters else None
+
+    def mutations(self):
+        return [(q, p) for q, p in self.executed if q.startswith(("UPDATE TOP", "DELETE TOP"))]
+
+    def bumps(self):
+        return [p for q, p in self.executed if q.startswith("UPDATE notification_counters")]
+
+    def stats_updates(self):
+        return self.many + [[p] for q, p in self.executed if q.startswith("UPDATE notification_message_stats")]
+
+
+class ChunkConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def run(cursor, *args, **kwargs):
+    conn = ChunkConnection(cursor)
+    with patch.object(bulk, "get_db_conn", return_value=conn):
+        result = bulk.bulk_mutate_notifications(*args, **kwargs)
+    return conn, result
+
+
+def test_mark_read_repeats_chunks_until_one_comes_back_short():
+    cursor = ChunkCursor(outputs=[[(1, 30), (2, 31)], [(3, 30)]], counters=[(10, 1), (10, 0)])
+    chunks = []
+
+    conn, result = run(cursor, 42, "read", chunk_size=2, on_chunk=lambda ids, unread: chunks.append((ids, unread)))
+
+    assert result == (3, 0)
+    assert conn.commits == 2
+    assert [p for _, p in cursor.mutations()] == [[2, 42], [2, 42]]
+    # (total_delta, total_delta, unread_delta, unread_delta, user_id)
+    assert cursor.bumps() == [(0, 0, -2, -2, 42), (0, 0, -1, -1, 42)]
+    assert chunks == [([1, 2], 1), ([3], 0)]
+    assert cursor.stats_updates() == [[(0, 0, -1, -1, 30), (0, 0, -1, -1, 31)], [(0, 0, -1, -1, 30)]]
+    assert conn.autocommit is True
+    assert conn.closed
+
+
+def test_delete_by_ids_and_filter_writes_tombstones_and_counts_unread():
+    cursor = ChunkCursor(outputs=[[(5, False, 30), (9, True, 30)]], counters=[(4, 1)])
+
+    conn, result = run(cursor, 42, "delete", [9, 5, 5], notification_type="warning", chunk_size=10)
+
+    assert result == (2, 1)
+    (query, params), = cursor.mutations()
+    assert "INTO notification_tombstones" in query
+    assert "m.type = ?" in query and "id IN (?, ?)" in query
+    assert params == [10, 42, "warning", 5, 9]
+    assert cursor.bumps() == [(-2, -2, -1, -1, 42)]
+    assert cursor.stats_updates() == [[(-2, -2, -1, -1, 30)]]
+
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        bulk.bulk_mutate_notifications(42, "archive")
+
+    with pytest.raises(notif_service.HTTPException) as exc:
+        notif_service.bulk_update_notifications(42, "archive")
+    assert exc.value.status_code == 400
@@ -0,0 +1,153 @@
+"""
+Unit tests for services.notification_counters module
+Tests that notification mutations keep the per-user counters in the same transaction
+"""
+import pytest
+from unittest.mock import patch
+from fastapi import HTTPException
+
+import services.notification_service as notif_service
+import services.notification_counters as counters
+from database.connection import ManagedDatabaseConnection
+
+
+class ScriptedCursor:
+    """Cursor whose fetchone results are queued up front"""
+
+    def __init__(self, rows=(), rowcount=0):
+        self.rows = list(rows)
+        self.rowcount = rowcount
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        return []
+
+    def sql(self):
+        return [query for query, _ in self.executed]
+
+
+class ScriptedConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.committed = False
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.committed = True
+
+    def close(self):
+        self.closed = True
+
+
+def run(func, cursor, *args):
+    conn = ScriptedConnection(cursor)
+    with patch.object(notif_service, "get_db_conn", return_value=conn), \
+         patch.object(notif_service, "publish_notification_event") as publish:
+        result = func(*args)
+    return conn, publish, result
+
+
+def test_managed_connection_forwards_autocommit():
+    class Raw:
+        autocommit = True
+
+    raw = Raw()
+    wrapper = ManagedDatabaseConnection(raw, pool=None)
+    wrapper.autocommit = False
+
+    assert raw.autocommit is False
+    assert wrapper.autocommit is False
+
+
+def test_create_notification_bumps_counters_in_transaction():
+    cursor = ScriptedCursor(rows=[(9,), (17,), (4, 3)])
+
+    conn, publish, result = run(notif_service.create_notification, cursor, 42, "Flood", "Move to higher ground")
+
+    sql = cursor.sql()
+    assert conn.autocommit is False and conn.committed
+    assert "notification_counters WITH (UPDLOCK, HOLDLOCK)" in sql[0]
+    assert sql[1].startswith("INSERT INTO notification_messages")
+    assert sql[2].startswith("INSERT INTO notification_message_stats")
+    assert sql[3].startswith("INSERT INTO notifications (user_id, message_id")
+    assert cursor.executed[3][1] == (42, 9)
+    assert sql[4].startswith("UPDATE notification_counters")
+    assert cursor.executed[4][1] == (1, 1, 1, 1, 42)
+    # The message's precomputed stats count the new unread receipt
+    assert cursor.executed[5][1] == (1, 1, 1, 1, 9)
+    assert result["id"] == 17
+    assert publish.call_args_list[-1].args == ([42], {"type": "unread_count_updated", "count": 3})
+
+
+def test_marking_a_read_notification_leaves_the_count():
+    cursor = ScriptedCursor(rows=[(True, 9)])
+
+    conn, publish, _ = run(notif_service.mark_notification_as_read, cursor, 5, 42)
+
+    assert not any("notification_counters SET" in query for query in cursor.sql())
+    assert not any("notification_message_stats" in query for query in cursor.sql())
+    assert conn.committed
+    publish.assert_called_once_with([42], {"type": "notification_read", "notification_id": 5})
+
+
+def test_deleting_unread_notification_decrements_both_counts():
+    cursor = ScriptedCursor(rows=[(False, 9), (2, 0)])
+
+    conn, _, _ = run(notif_service.delete_notification, cursor, 5, 42)
+
+    assert cursor.executed[-2][1] == (-1, -1, -1, -1, 42)
+    assert cursor.executed[-1][1] == (-1, -1, -1, -1, 9)
+    assert conn.committed
+
+
+def test_deleting_missing_notification_does_not_commit():
+    cursor = ScriptedCursor(rows=[])
+
+    with pytest.raises(HTTPException) as exc:
+        run(notif_service.delete_notification, cursor, 5, 42)
+
+    assert exc.value.status_code == 404
+
+
+def test_feed_totals_come_from_counters():
+    # Sync cursor version, then the counter row
+    cursor = ScriptedCursor(rows=[(100,), (12, 5)])
+
+    conn, _, result = run(notif_service.get_user_notifications, cursor, 42)
+
+    assert result["total"] == 12
+    assert result["unread_count"] == 5
+    assert not any("COUNT(*)" in query for query in cursor.sql())
+
+    cursor = ScriptedCursor(rows=[(100,), (12, 5)])
+    _, _, result = run(notif_service.get_user_notifications, cursor, 42, 50, 0, True)
+    assert result["total"] == 5
+
+
+def test_missing_counter_row_is_seeded_on_read():
+    cursor = ScriptedCursor(rows=[None, (3, 1)])
+
+    total, unread = counters.read_counters(cursor, 42)
+
+    assert (total, unread) == (3, 1)
+    assert "INSERT INTO notification_counters" in cursor.sql()[1]
+
+
+def test_reconcile_reports_fixed_rows():
+    cursor = ScriptedCursor(rowcount=2)
+    conn = ScriptedConnection(cursor)
+
+    with patch.object(counters, "get_db_conn", return_value=conn):
+        assert counters.reconcile_notification_counters() == 2
+
+    assert conn.committed and conn.closed
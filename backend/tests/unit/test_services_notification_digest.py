@@ -0,0 +1,189 @@
+"""
+Unit tests for services.notification_digest module
+Tests that alerts for the same disaster type and location are merged or suppressed within a window
+"""
+from unittest.mock import patch
+
+import services.notification_digest as digest
+import services.subscription_service as subscription_service
+
+
+class DigestCursor:
+    """Cursor replaying fetchone/fetchall results in order"""
+
+    def __init__(self, rows=(), results=()):
+        self.rows = list(rows)
+        self.results = list(results)
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+
+    def fetchone(self):
+        return self.rows.pop(0) if self.rows else None
+
+    def fetchall(self):
+        return self.results.pop(0) if self.results else []
+
+    def params_of(self, prefix):
+        return [p for q, p in self.executed if q.startswith(prefix)]
+
+
+class DigestConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.commits = 0
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def claim(cursor, title="Disaster Report: flood", message="A flood has been reported in Kuantan. River"):
+    conn = DigestConnection(cursor)
+    with patch.object(digest, "get_db_conn", return_value=conn):
+        return conn, digest.claim_digest("flood", "Kuantan", title, message, window=900)
+
+
+def test_first_alert_opens_a_window():
+    # No open window; then the new message id and digest id
+    cursor = DigestCursor(rows=[None, (30,), (4,)])
+
+    conn, result = claim(cursor)
+
+    assert result["status"] == "new" and result["message_id"] == 30
+    assert cursor.params_of("INSERT INTO notification_digests") == [("flood", "Kuantan", 30)]
+    # The first report is emailed right away, so it is recorded as already emailed
+    assert "emailed) VALUES (?, ?, ?, ?, 1)" in cursor.executed[-1][0]
+    assert conn.commits == 1
+
+
+def test_repeat_within_the_window_is_suppressed():
+    cursor = DigestCursor(rows=[(4, 30), (1,)])
+
+    _, result = claim(cursor)
+
+    assert result["status"] == "duplicate"
+    assert not cursor.params_of("INSERT INTO notification_digest_items")
+    assert not cursor.params_of("UPDATE notification_messages")
+
+
+def test_new_report_within_the_window_rewrites_the_message():
+    cursor = DigestCursor(
+        rows=[(4, 30), None],
+        results=[[("Disaster Report: flood", "River burst"), ("Disaster Report: flood", "Road closed")]]
+    )
+
+    _, result = claim(cursor, message="Road closed")
+
+    assert result["status"] == "merged"
+    assert result["title"] == "2 reports: flood in Kuantan"
+    assert result["message"] == "- Road closed\n- River burst"
+    assert cursor.params_of("UPDATE notification_messages") == [(result["title"], result["message"], 30)]
+
+
+def test_digest_lists_the_newest_reports():
+    items = [("t", f"report {i}") for i in range(12)]
+
+    title, message = digest.digest_content("flood", "Kuantan", items)
+
+    assert title == "12 reports: flood in Kuantan"
+    assert message.splitlines()[0] == "- report 11"
+    assert message.splitlines()[-1] == "...and 2 earlier reports"
+
+
+def test_resurfacing_marks_receipts_unread_and_counts_only_read_ones():
+    cursor = DigestCursor(
+        rows=[(500,)],                         # sync watermark
+        results=[
+            [(1, 7), (2, 8)],                  # receipts not yet touched
+            [(7,), (8,)],                      # locked counter rows
+            [(1, 7, True), (2, 8, False)],     # OUTPUT INSERTED.id, INSERTED.user_id, DELETED.is_read
+            [(7, 3)],                          # counters after the bump
+        ]
+    )
+    conn = DigestConnection(cursor)
+    batches = []
+
+    with patch.object(digest, "get_db_conn", return_value=conn):
+        updated = digest.resurface_digest(30, batch_size=5, on_batch=lambda rows, counts: batches.append((rows, counts)))
+
+    assert updated == 2
+    # The feed's keyset order must not move
+    resurface, = [q for q, _ in cursor.executed if q.startswith("UPDATE notifications ")]
+    assert "resurfaced_at = GETDATE()" in resurface and "created_at" not in resurface
+    assert cursor.params_of("UPDATE notification_counters") == [[7]]
+    assert cursor.params_of("UPDATE notification_message_stats") == [(0, 0, 1, 1, 30)]
+    assert batches == [([(1, 7), (2, 8)], {7: 3})]
+    assert conn.autocommit is True
+
+
+def test_coalesced_duplicate_sends_nothing():
+    with patch.object(subscription_service, "get_subscribed_users_for_alert", return_value=[7, 8]), \
+         patch.object(subscription_service, "claim_digest", return_value={"status": "duplicate"}), \
+         patch.object(subscription_service, "send_targeted_notification_emails") as send_emails, \
+         patch("services.notification_fanout.fan_out_notification") as fan_out:
+        result = subscription_service.create_targeted_disaster_notification(
+            "flood", "Kuantan", "Disaster Report: flood", "Same text", coalesce=True
+        )
+
+    assert result["suppressed"] is True
+    send_emails.assert_not_called()
+    fan_out.assert_not_called()
+
+
+def test_merge_gives_late_subscribers_a_receipt():
+    open_digest = {"status": "merged", "message_id": 30, "title": "Disaster Report: flood", "message": "Two reports"}
+
+    def fan_out(*args, **kwargs):
+        # User 8 subscribed after the window opened
+        kwargs["on_batch"]([(51, 8)])
+        return 1
+
+    with patch.object(subscription_service, "get_subscribed_users_for_alert", return_value=[7, 8]), \
+         patch.object(subscription_service, "claim_digest", return_value=open_digest), \
+         patch.object(subscription_service, "resurface_digest", return_value=1), \
+         patch("services.notification_service.publish_created_batch") as publish_created, \
+         patch("services.notification_fanout.fan_out_notification", side_effect=fan_out) as fan_out_mock:
+        result = subscription_service.create_targeted_disaster_notification(
+            "flood", "Kuantan", "Disaster Report: flood", "River", coalesce=True
+        )
+
+    assert result["users_notified"] == 2
+    assert fan_out_mock.call_args.kwargs["user_ids"] == [7, 8]
+    assert fan_out_mock.call_args.kwargs["message_id"] == 30
+    publish_created.assert_called_once()
+
+
+def test_failed_digest_email_is_retried_and_does_not_stop_other_windows():
+    import services.email_notification_service as email_service
+
+    cursor = DigestCursor(results=[
+        [(1, "flood", "Kuantan"), (2, "fire", "Klang")],   # claimed windows
+        [(10, "Disaster Report: flood", "River burst")],  # window 1 items
+        [(11, "Disaster Report: fire", "Smoke")],         # window 2 items
+    ])
+    sends = [Exception("SMTP down"), {"emails_sent": 3, "emails_failed": 0, "total_users": 3}]
+
+    def send(*args):
+        result = sends.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with patch.object(digest, "get_db_conn", return_value=DigestConnection(cursor)), \
+         patch.object(email_service, "send_targeted_notification_emails", side_effect=send):
+        assert digest.flush_notification_digests(window=900) == 1
+
+    # Window 1 goes back to the next flush with its item unsent; window 2 is marked sent
+    assert cursor.params_of("UPDATE notification_digests SET flushed_at = NULL") == [(1, 1)]
+    assert cursor.params_of("UPDATE notification_digest_items SET emailed = 1") == [[11]]
@@ -0,0 +1,147 @@
+"""
+Unit tests for services.notification_fanout module
+Tests batched, set-based fan-out of one notification to many users
+"""
+import pytest
+from unittest.mock import patch
+
+import services.notification_fanout as fanout
+
+
+class AudienceCursor:
+    """Fakes the temp-table audience well enough to drive the batch loop"""
+
+    def __init__(self, fail_on_batch=None, receipts=()):
+        self.audience = []
+        self.receipts = set(receipts)
+        self.fast_executemany = False
+        self.executed = []
+        self.batches = 0
+        self.fail_on_batch = fail_on_batch
+        self._one = None
+        self._all = []
+
+    def execute(self, query, params=None):
+        sql = " ".join(query.split())
+        self.executed.append(sql)
+        if sql.startswith("INSERT INTO #notification_audience (user_id) SELECT id FROM users"):
+            self.audience = [1, 2, 3, 4, 5]
+        elif sql.startswith("DELETE a FROM #notification_audience a WHERE EXISTS (SELECT 1 FROM notifications"):
+            assert params == (9,)
+            self.audience = [u for u in self.audience if u not in self.receipts]
+        elif sql.startswith("SELECT COUNT(*)"):
+            self._one = (len(self.audience),)
+        elif sql.startswith("SELECT MAX(user_id)"):
+            size, after = params
+            batch = [u for u in sorted(self.audience) if u > after][:size]
+            self._one = (max(batch) if batch else None,)
+        elif sql.startswith("INSERT INTO notification_messages"):
+            self.message_params = params
+            self._one = (9,)
+        elif sql.startswith("INSERT INTO notifications"):
+            self.batches += 1
+            if self.batches == self.fail_on_batch:
+                raise RuntimeError("deadlock")
+            message_id, low, high = params
+            assert message_id == 9
+            self._all = [(100 + u, u) for u in sorted(self.audience) if low < u <= high]
+
+    def executemany(self, query, rows):
+        assert self.fast_executemany
+        self.audience = [row[0] for row in rows]
+
+    def fetchone(self):
+        return self._one
+
+    def fetchall(self):
+        return self._all
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_everyone_is_sent_in_batches_with_progress():
+    cursor = AudienceCursor()
+    conn = FakeConnection(cursor)
+    batches, progress = [], []
+
+    with patch.object(fanout, "get_db_conn", return_value=conn):
+        sent = fanout.fan_out_notification("Alert", "Stay indoors", batch_size=2,
+                                           on_batch=batches.append, progress=lambda *p: progress.append(p))
+
+    assert sent == 5
+    assert batches == [[(101, 1), (102, 2)], [(103, 3), (104, 4)], [(105, 5)]]
+    assert progress == [(2, 5), (4, 5), (5, 5)]
+    assert conn.commits == 3
+    assert conn.autocommit is True and conn.closed
+    assert cursor.executed[-1].endswith("DROP TABLE #notification_audience")
+
+
+def test_explicit_ids_are_deduplicated_and_bulk_loaded():
+    cursor = AudienceCursor()
+    conn = FakeConnection(cursor)
+
+    with patch.object(fanout, "get_db_conn", return_value=conn):
+        sent = fanout.fan_out_notification("Alert", "Flood", user_ids=[7, 3, 7], batch_size=10)
+
+    assert cursor.audience == [3, 7]
+    assert sent == 2
+    # The content is stored once, and one INSERT ... SELECT covers the whole batch
+    assert cursor.message_params == ("Alert", "Flood", "info", None, None)
+    assert sum(sql.startswith("INSERT INTO notifications") for sql in cursor.executed) == 1
+
+
+def test_stored_message_skips_users_who_already_have_a_receipt():
+    cursor = AudienceCursor(receipts=[3])
+    conn = FakeConnection(cursor)
+    batches = []
+
+    with patch.object(fanout, "get_db_conn", return_value=conn):
+        sent = fanout.fan_out_notification("Alert", "Flood", user_ids=[3, 7], message_id=9,
+                                           on_batch=batches.append)
+
+    assert sent == 1
+    assert batches == [[(107, 7)]]
+    assert not any(sql.startswith("INSERT INTO notification_messages") for sql in cursor.executed)
+
+
+def test_empty_audience_stores_nothing():
+    cursor = AudienceCursor()
+    conn = FakeConnection(cursor)
+
+    with patch.object(fanout, "get_db_conn", return_value=conn):
+        assert fanout.fan_out_notification("Alert", "Flood", user_ids=[]) == 0
+
+    assert not any(sql.startswith("INSERT INTO notification_messages") for sql in cursor.executed)
+
+
+def test_failed_batch_is_rolled_back_and_earlier_batches_kept():
+    cursor = AudienceCursor(fail_on_batch=2)
+    conn = FakeConnection(cursor)
+    batches = []
+
+    with patch.object(fanout, "get_db_conn", return_value=conn):
+        with pytest.raises(RuntimeError):
+            fanout.fan_out_notification("Alert", "Quake", batch_size=2, on_batch=batches.append)
+
+    assert len(batches) == 1
+    assert conn.commits == 1 and conn.rollbacks == 1
+    assert conn.autocommit is True and conn.closed
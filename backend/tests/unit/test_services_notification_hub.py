@@ -0,0 +1,83 @@
+"""
+Unit tests for services.notification_hub module
+Tests per-user fan-out to subscriber queues and publishing from the service
+"""
+import asyncio
+import threading
+from unittest.mock import patch
+
+from services.notification_hub import NotificationHub
+
+
+def test_events_reach_only_the_users_sockets():
+    hub = NotificationHub(queue_size=10, redis_url=None)
+
+    async def scenario():
+        mine = hub.subscribe(42)
+        other_tab = hub.subscribe(42)
+        someone_else = hub.subscribe(7)
+
+        # Published from a request thread, not the event loop
+        thread = threading.Thread(target=hub.publish, args=(42, {"type": "notifications_cleared"}))
+        thread.start()
+        thread.join()
+
+        first = await asyncio.wait_for(mine.get(), timeout=1)
+        second = await asyncio.wait_for(other_tab.get(), timeout=1)
+        return first, second, someone_else.empty()
+
+    first, second, other_empty = asyncio.run(scenario())
+
+    assert first == second == {"type": "notifications_cleared"}
+    assert other_empty
+    assert hub.get_stats()["delivered"] == 2
+
+
+def test_unsubscribe_and_slow_clients():
+    hub = NotificationHub(queue_size=1, redis_url=None)
+
+    async def scenario():
+        queue = hub.subscribe(1)
+        hub.publish(1, {"type": "a"})
+        hub.publish(1, {"type": "b"})
+        await asyncio.sleep(0)
+        hub.unsubscribe(1, queue)
+        hub.publish(1, {"type": "c"})
+        await asyncio.sleep(0)
+        return queue.qsize()
+
+    assert asyncio.run(scenario()) == 1
+    stats = hub.get_stats()
+    assert stats["dropped"] == 1
+    assert stats["connections"] == 0
+
+
+def test_stats_count_every_publish_across_threads():
+    hub = NotificationHub(queue_size=10, redis_url=None)
+
+    threads = [threading.Thread(target=lambda: [hub.publish(1, {"type": "a"}) for _ in range(500)])
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert hub.get_stats()["published"] == 4000
+
+
+def test_mark_read_publishes_event():
+    import services.notification_service as notif_service
+    from tests.unit.test_services_notification import FakeConnection
+
+    fake_conn = FakeConnection()
+    # OUTPUT DELETED.is_read (was unread) and the message id, then the bumped counters
+    rows = iter([(False, 9), (3, 2)])
+    fake_conn.cursor_obj.fetchone = lambda: next(rows)
+    fake_conn.commit = lambda: None
+
+    with patch.object(notif_service, "get_db_conn", return_value=fake_conn), \
+         patch.object(notif_service, "publish_notification_event") as publish:
+        notif_service.mark_notification_as_read(5, 42)
+
+    assert publish.call_args_list[0].args == ([42], {"type": "notification_read", "notification_id": 5})
+    assert publish.call_args_list[1].args == ([42], {"type": "unread_count_updated", "count": 2})
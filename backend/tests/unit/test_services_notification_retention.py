@@ -0,0 +1,106 @@
+"""
+Unit tests for services.notification_retention module
+Tests the retention rules and that the purge deletes in batches with tombstones and counter updates
+"""
+from unittest.mock import patch
+
+import services.notification_retention as retention
+
+
+class PurgeCursor:
+    """Cursor that replays fetchall results and DELETE rowcounts in order"""
+
+    def __init__(self, fetches=(), rowcounts=()):
+        self.fetches = list(fetches)
+        self.rowcounts = list(rowcounts)
+        self.rowcount = 0
+        self.executed = []
+        self.many = []
+
+    def execute(self, query, params=None):
+        query = " ".join(query.split())
+        self.executed.append((query, params))
+        if query.startswith("DELETE TOP"):
+            self.rowcount = self.rowcounts.pop(0) if self.rowcounts else 0
+
+    def executemany(self, query, rows):
+        self.many.append((" ".join(query.split()), rows))
+
+    def fetchall(self):
+        return self.fetches.pop(0) if self.fetches else []
+
+
+class PurgeConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+        self.autocommit = True
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def purge(cursor, **kwargs):
+    conn = PurgeConnection(cursor)
+    options = {"batch_size": 2, "pause": 0, "default_days": 180, "by_type": {}, "tombstone_days": 14}
+    options.update(kwargs)
+    with patch.object(retention, "get_db_conn", return_value=conn):
+        result = retention.purge_expired_notifications(**options)
+    return conn, result
+
+
+def test_retention_rules_put_type_limits_before_the_default():
+    assert retention.retention_rules(180, {"warning": 30, "info": 0}) == [("warning", 30), (None, 180)]
+    assert retention.retention_rules(0, {}) == []
+    assert retention._rule_clause(None, {"warning": 30, "alert": 90}) == ("m.type NOT IN (?, ?)", ["alert", "warning"])
+
+
+def test_expired_notifications_are_deleted_with_tombstones_and_counter_updates():
+    cursor = PurgeCursor(fetches=[
+        [(1,), (2,)],                    # first batch of expired ids
+        [(7, False, 30), (7, True, 30)],  # OUTPUT DELETED.user_id, DELETED.is_read, DELETED.message_id
+        [(3,)],
+        [(8, False, 31)],
+        [],                              # nothing left
+    ])
+
+    conn, result = purge(cursor, enabled=True)
+
+    assert result["notifications"] == 3
+    deletes = [(q, p) for q, p in cursor.executed if q.startswith("DELETE FROM notifications")]
+    assert [p for _, p in deletes] == [[1, 2], [3]]
+    assert all("INTO notification_tombstones" in q for q, _ in deletes)
+    # Owners' counters drop by what was deleted: (total, total, unread, unread, user_id)
+    assert [rows for _, rows in cursor.many] == [[(2, 2, 1, 1, 7)], [(1, 1, 1, 1, 8)]]
+    # and so do the messages' precomputed stats
+    stats = [p for q, p in cursor.executed if q.startswith("UPDATE notification_message_stats")]
+    assert stats == [(-2, -2, -1, -1, 30), (-1, -1, -1, -1, 31)]
+    assert conn.autocommit is True
+    assert conn.closed
+
+
+def test_disabled_retention_still_prunes_orphans_and_tombstones():
+    cursor = PurgeCursor(rowcounts=[2, 1, 0, 0])
+    before = retention.get_notification_retention_stats()
+
+    conn, result = purge(cursor, enabled=False)
+
+    assert result == {"notifications": 0, "messages": 3, "tombstones": 0}
+    assert not any(q.startswith("SELECT TOP") for q, _ in cursor.executed)
+    assert [p for _, p in cursor.executed] == [[2, 1], [2, 1], [2, 1], [2, 14]]
+
+    stats = retention.get_notification_retention_stats()
+    assert stats["runs"] == before["runs"] + 1
+    assert stats["messages_purged"] == before["messages_purged"] + 3
+    assert stats["last_run"] == result
+    assert "policy" in stats
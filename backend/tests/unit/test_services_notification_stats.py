@@ -0,0 +1,86 @@
+"""
+Unit tests for services.notification_stats module
+Tests the dashboard figures from precomputed counts, the single-query fallback and the TTL cache
+"""
+from unittest.mock import patch
+
+import services.notification_stats as notification_stats
+
+# type, disaster_type, total, unread, last 24 h, last 7 days
+ROWS = [
+    ("warning", "flood", 100, 40, 10, 60),
+    ("warning", None, 20, 5, 0, 20),
+    ("info", None, 0, 0, 0, 0),
+]
+
+
+class StatsCursor:
+    def __init__(self, rows=ROWS, precomputed_fails=False):
+        self.rows = rows
+        self.precomputed_fails = precomputed_fails
+        self.executed = []
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        if self.precomputed_fails and "notification_message_stats" in query:
+            raise RuntimeError("Invalid object name 'notification_message_stats'")
+
+    def fetchall(self):
+        return self.rows
+
+
+class StatsConnection:
+    def __init__(self, cursor):
+        self.cursor_obj = cursor
+
+    def cursor(self):
+        return self.cursor_obj
+
+    def close(self):
+        pass
+
+
+def test_precomputed_rows_are_folded_into_dashboard_figures():
+    stats = notification_stats.load_notification_stats(StatsCursor())
+
+    assert stats["source"] == "precomputed"
+    assert stats["total_notifications"] == 120
+    assert stats["unread_notifications"] == 45
+    assert stats["read_notifications"] == 75
+    assert stats["by_type"] == {"warning": 120}
+    assert stats["by_disaster_type"] == {"flood": 100}
+    assert (stats["recent_24h"], stats["recent_7days"]) == (10, 80)
+
+
+def test_missing_stats_table_falls_back_to_one_query():
+    cursor = StatsCursor(precomputed_fails=True)
+
+    stats = notification_stats.load_notification_stats(cursor)
+
+    assert stats["source"] == "notifications"
+    assert stats["total_notifications"] == 120
+    assert len(cursor.executed) == 2
+    assert "FROM notifications n" in cursor.executed[1]
+
+
+def test_stats_are_cached_for_the_ttl():
+    cursor = StatsCursor()
+
+    with patch.object(notification_stats, "get_db_conn", return_value=StatsConnection(cursor)), \
+         patch.object(notification_stats, "_cached", None):
+        first = notification_stats.get_cached_notification_stats(ttl=60)
+        second = notification_stats.get_cached_notification_stats(ttl=60)
+        assert len(cursor.executed) == 1
+
+        notification_stats.get_cached_notification_stats(ttl=0)
+        notification_stats.get_cached_notification_stats(ttl=0)
+        assert len(cursor.executed) == 3
+
+    assert first == second
+
+
+def test_deltas_group_receipts_by_message():
+    assert notification_stats.stats_deltas([(30, False), (30, True), (31, False)], deleted=True) == {
+        30: (-2, -1), 31: (-1, -1)
+    }
+    assert notification_stats.stats_deltas([(30, False)], deleted=False) == {30: (0, -1)}
@@ -0,0 +1,94 @@
+"""
+Unit tests for services.notification_sync module
+Tests cursor handling and merging of changes and tombstones for delta sync
+"""
+import time
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import services.notification_sync as sync
+
+
+class SyncCursor:
+    """Answers the watermark, counter, change and tombstone queries in order"""
+
+    def __init__(self, watermark, changes=(), tombstones=()):
+        self.watermark = watermark
+        self.changes = list(changes)
+        self.tombstones = list(tombstones)
+        self.executed = []
+        self._one = None
+        self._all = []
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        if "MIN_ACTIVE_ROWVERSION" in query:
+            self._one = (self.watermark,)
+        elif "FROM notification_counters" in query:
+            self._one = (10, 3)
+        elif "FROM notification_tombstones" in query:
+            self._all = self.tombstones[:params[0]]
+        elif "FROM notifications n" in query:
+            self._all = self.changes[:params[0]]
+
+    def fetchone(self):
+        return self._one
+
+    def fetchall(self):
+        return self._all
+
+
+def change(notification_id, version, read=False):
+    return (notification_id, 42, "Flood", "Move", "danger", "flood", "Kelantan", read, datetime(2024, 1, 1), version, None)
+
+
+def test_first_sync_asks_client_to_reload():
+    result = sync.get_notification_changes(SyncCursor(watermark=500), 42, since=None)
+
+    assert result["reset"] is True
+    assert result["cursor"].startswith("500.")
+    assert result["unread_count"] == 3
+
+
+def test_changes_and_deletes_since_cursor():
+    cursor = SyncCursor(watermark=520, changes=[change(7, 505, read=True), change(9, 512)],
+                        tombstones=[(4, 508)])
+
+    result = sync.get_notification_changes(cursor, 42, since=sync.make_cursor(500))
+
+    assert [c["id"] for c in result["changes"]] == [7, 9]
+    assert result["changes"][0]["read"] is True
+    assert result["deleted"] == [4]
+    assert result["has_more"] is False
+    assert result["cursor"].startswith("520.")
+    # Rows above the cursor but not past the committed watermark
+    assert cursor.executed[2][1] == (201, 42, 500, 520)
+
+
+def test_truncated_page_resumes_from_last_version_with_original_issue_time():
+    issued = int(time.time()) - 60
+    cursor = SyncCursor(watermark=520, changes=[change(7, 505), change(9, 512)], tombstones=[(4, 508)])
+
+    result = sync.get_notification_changes(cursor, 42, since=sync.make_cursor(500, issued), limit=2)
+
+    assert result["has_more"] is True
+    assert [c["id"] for c in result["changes"]] == [7]
+    assert result["deleted"] == [4]
+    assert result["cursor"] == f"508.{issued}"
+
+
+def test_cursor_older_than_tombstones_forces_reload():
+    stale = sync.make_cursor(500, time.time() - (sync.NOTIFICATION_TOMBSTONE_DAYS + 1) * 86400)
+
+    result = sync.get_notification_changes(SyncCursor(watermark=520), 42, since=stale)
+
+    assert result["reset"] is True
+
+
+def test_malformed_cursor_is_rejected():
+    with pytest.raises(HTTPException) as exc:
+        sync.get_notification_changes(SyncCursor(watermark=520), 42, since="nonsense")
+
+    assert exc.value.status_code == 400
@@ -0,0 +1,77 @@
+"""
+Unit tests for utils.audio_chunking module
+Tests silence-aligned chunk planning, stitching and the parallel path in utils.chat
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import utils.chat as chat_module
+from utils.audio_chunking import AudioChunk, merge_word_overlap, plan_chunks, stitch_chunks
+from utils.audio_preprocess import PreparedAudio
+
+RATE = 16000
+
+
+def speech_with_pauses(seconds, pauses):
+    """Tone with 0.5s gaps of silence starting at each pause second"""
+    t = np.arange(int(seconds * RATE)) / RATE
+    samples = (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+    for pause in pauses:
+        samples[int(pause * RATE):int((pause + 0.5) * RATE)] = 0
+    return samples
+
+
+def test_short_recording_is_a_single_chunk():
+    chunks = plan_chunks(np.zeros(RATE * 20, dtype=np.float32), chunk_seconds=30)
+
+    assert len(chunks) == 1
+    assert (chunks[0].start, chunks[0].end) == (0, RATE * 20)
+
+
+def test_cuts_move_to_nearby_silence_and_overlap():
+    samples = speech_with_pauses(75, pauses=[27, 58])
+
+    chunks = plan_chunks(samples, chunk_seconds=30, overlap_seconds=1.0)
+
+    assert len(chunks) == 3
+    cuts = [chunk.keep_to / RATE for chunk in chunks[:-1]]
+    assert 27 <= cuts[0] <= 27.5
+    assert 58 <= cuts[1] <= 58.5
+    assert chunks[1].start == chunks[0].keep_to - RATE // 2
+    assert chunks[0].end == chunks[0].keep_to + RATE // 2
+    assert chunks[-1].end == len(samples)
+
+
+def test_stitch_uses_segment_midpoints_to_drop_overlap():
+    chunks = [AudioChunk(0, 31 * RATE, 0, 30 * RATE), AudioChunk(29 * RATE, 50 * RATE, 30 * RATE, 50 * RATE)]
+    results = [
+        {"segments": [{"start": 0, "end": 28, "text": " Banjir di Kuala Krai"}, {"start": 28.5, "end": 30.8, "text": " sila pindah"}]},
+        {"segments": [{"start": 0, "end": 1.8, "text": " sila pindah"}, {"start": 2, "end": 10, "text": " sekarang juga."}]},
+    ]
+
+    assert stitch_chunks(chunks, results) == "Banjir di Kuala Krai sila pindah sekarang juga."
+
+
+def test_text_only_results_dedupe_repeated_words():
+    assert merge_word_overlap("the water is rising near the bridge.", "Near the bridge, move to higher ground") == \
+        "move to higher ground"
+    assert merge_word_overlap("first part", "second part") == "second part"
+
+
+def test_long_recording_is_transcribed_in_parallel_chunks(monkeypatch):
+    received = []
+
+    class FakePool:
+        def transcribe_many(self, inputs, **options):
+            received.extend(inputs)
+            return [{"text": f"part {i}", "segments": []} for i in range(len(inputs))]
+
+    monkeypatch.setattr(chat_module, "get_whisper_pool", lambda: FakePool())
+    samples = speech_with_pauses(75, pauses=[27, 58])
+    chunks = plan_chunks(samples, chunk_seconds=30)
+
+    result = chat_module._transcribe_chunked(PreparedAudio(samples, 75), chunks, "ms", "local_whisper")
+
+    assert len(received) == 3
+    assert result == {"transcript": "part 0 part 1 part 2", "method": "local_whisper"}
@@ -0,0 +1,152 @@
+"""
+Unit tests for utils.audio_preprocess module
+Tests WAV decoding, mono downmix, resampling and silence trimming
+"""
+import io
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import utils.audio_preprocess as preprocess_module
+import utils.chat as chat_module
+from utils.audio_upload import StagedAudio
+
+
+def make_wav(samples, rate, channels=1):
+    """Encode float samples (frames x channels) as a 16-bit PCM WAV file object"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.asarray(samples) * 32767).astype("<i2").tobytes())
+    buffer.seek(0)
+    return buffer
+
+
+def speech_with_silence(rate, lead=1.0, speech=1.0, tail=1.5):
+    t = np.arange(int(rate * speech)) / rate
+    tone = 0.5 * np.sin(2 * np.pi * 220 * t)
+    return np.concatenate([np.zeros(int(rate * lead)), tone, np.zeros(int(rate * tail))])
+
+
+def test_stereo_44k_is_downmixed_resampled_and_trimmed():
+    mono = speech_with_silence(44100)
+    stereo = np.stack([mono, mono], axis=1)
+    source = make_wav(stereo, 44100, channels=2)
+
+    prepared = preprocess_module.preprocess_audio(source)
+
+    assert prepared.original_seconds == pytest.approx(3.5, abs=0.01)
+    # 1s of speech plus up to TRANSCRIBE_VAD_PAD_MS (300ms) either side
+    assert 1.0 <= prepared.seconds <= 1.7
+    assert prepared.samples.dtype == np.float32
+    assert np.abs(prepared.samples).max() == pytest.approx(0.5, abs=0.02)
+    assert source.tell() == 0
+
+
+def test_silent_recording_has_no_speech():
+    prepared = preprocess_module.preprocess_audio(make_wav(np.zeros(16000 * 2), 16000))
+
+    assert prepared.has_speech is False
+
+
+def test_resample_preserves_duration_and_tone():
+    rate = 48000
+    t = np.arange(rate) / rate
+    out = preprocess_module.resample(np.sin(2 * np.pi * 440 * t).astype(np.float32), rate)
+
+    assert len(out) == 16000
+    spectrum = np.abs(np.fft.rfft(out))
+    assert np.argmax(spectrum) == 440
+
+
+def test_undecodable_audio_is_passed_through(monkeypatch):
+    monkeypatch.setattr(preprocess_module.shutil, "which", lambda name: None)
+    source = io.BytesIO(b"OggS not a wav file")
+
+    assert preprocess_module.preprocess_audio(source) is None
+    assert source.tell() == 0
+
+
+def test_local_backend_receives_trimmed_samples(monkeypatch):
+    received = {}
+
+    class FakePool:
+        def transcribe(self, audio, **options):
+            received["audio"] = audio
+            return {"text": "tolong"}
+
+    monkeypatch.setattr(chat_module, "get_whisper_pool", lambda: FakePool())
+    source = make_wav(speech_with_silence(16000), 16000)
+    staged = StagedAudio("note.wav", fileobj=source, size=len(source.getvalue()))
+
+    result = chat_module.transcribe_staged_audio(staged, "ms", backend="local_whisper")
+
+    assert result == {"transcript": "tolong", "method": "local_whisper"}
+    assert isinstance(received["audio"], np.ndarray)
+    assert len(received["audio"]) < 16000 * 2
+
+
+def test_silence_is_rejected_before_calling_a_backend(monkeypatch):
+    monkeypatch.setattr(chat_module, "get_whisper_pool", lambda: pytest.fail("backend called"))
+    source = make_wav(np.zeros(16000), 16000)
+    staged = StagedAudio("note.wav", fileobj=source, size=len(source.getvalue()))
+
+    with pytest.raises(chat_module.HTTPException) as exc:
+        chat_module.transcribe_staged_audio(staged, "auto", backend="local_whisper")
+
+    assert exc.value.status_code == 400
+
+
+def test_resampling_in_blocks_matches_one_pass(monkeypatch):
+    rate = 44100
+    samples = np.random.default_rng(0).standard_normal(rate).astype(np.float32)
+    whole = preprocess_module.resample(samples, rate)
+
+    monkeypatch.setattr(preprocess_module, "RESAMPLE_BLOCK", 1000)
+    blocked = preprocess_module.resample(samples, rate)
+
+    assert blocked.dtype == np.float32
+    np.testing.assert_allclose(blocked, whole, atol=1e-6)
+
+
+def test_recording_over_the_limit_is_passed_through(monkeypatch):
+    monkeypatch.setattr(preprocess_module._decode_wav, "__defaults__", (1,))
+    source = make_wav(speech_with_silence(16000), 16000)
+
+    assert preprocess_module.preprocess_audio(source) is None
+    assert source.tell() == 0
+
+
+def fake_ffmpeg(tmp_path, seconds):
+    """Executable that drains stdin and writes `seconds` of 16 kHz float32 silence"""
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        "#!/usr/bin/env python3\n"
+        "import sys\n"
+        "sys.stdin.buffer.read()\n"
+        f"sys.stdout.buffer.write(bytes(4 * 16000 * {seconds}))\n"
+    )
+    script.chmod(0o755)
+    return str(script)
+
+
+def test_in_memory_upload_is_streamed_to_ffmpeg(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocess_module.shutil, "which", lambda name: fake_ffmpeg(tmp_path, 2))
+    spool = preprocess_module.tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(b"OggS" + bytes(1000))
+
+    samples, rate = preprocess_module._decode_ffmpeg(spool, max_seconds=5)
+
+    assert (samples.shape, rate) == ((32000, 1), 16000)
+    assert spool._rolled is False
+
+
+def test_ffmpeg_output_past_the_limit_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocess_module.shutil, "which", lambda name: fake_ffmpeg(tmp_path, 3))
+
+    with pytest.raises(ValueError):
+        preprocess_module._decode_ffmpeg(io.BytesIO(b"OggS"), max_seconds=1)
@@ -0,0 +1,73 @@
+"""
+Unit tests for utils.audio_upload module
+Tests size cutoff, zero-copy handoff and temp file staging
+"""
+import io
+import os
+import tempfile
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from utils.audio_upload import copy_upload, stage_audio_upload
+
+
+class NonSeekableStream(io.RawIOBase):
+    """Stream that can only be read forward, counting what was read"""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        chunk = self._data.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def test_seekable_upload_is_handed_over_without_copying():
+    stream = io.BytesIO(b"RIFF" + b"\0" * 100)
+    upload = UploadFile(file=stream, filename="clip.webm")
+
+    with stage_audio_upload(upload) as audio:
+        assert audio.fileobj is stream
+        assert audio.size == 104
+        assert audio.as_openai_file() == ("clip.webm", stream)
+        assert stream.tell() == 0
+
+
+def test_oversized_upload_is_rejected_before_reading():
+    stream = io.BytesIO(b"\0" * 2048)
+    upload = UploadFile(file=stream, filename="big.wav")
+
+    with pytest.raises(HTTPException) as exc:
+        with stage_audio_upload(upload, max_bytes=1024):
+            pass
+
+    assert exc.value.status_code == 413
+    assert stream.tell() == 0
+
+
+def test_unknown_size_stops_at_first_chunk_over_limit():
+    stream = NonSeekableStream(b"\0" * 10_000)
+
+    with pytest.raises(HTTPException):
+        copy_upload(stream, io.BytesIO(), max_bytes=2500, chunk_size=1000)
+
+    assert stream.bytes_read == 3000
+
+
+def test_local_staging_writes_named_temp_file_and_removes_it():
+    upload = UploadFile(file=io.BytesIO(b"audio-bytes"), filename="../../note.MP3")
+
+    with stage_audio_upload(upload, need_path=True) as audio:
+        path = audio.path
+        assert os.path.dirname(path) == tempfile.gettempdir()
+        assert path.endswith(".mp3")
+        with open(path, "rb") as f:
+            assert f.read() == b"audio-bytes"
+
+    assert not os.path.exists(path)
@@ -19,3 +19,19 @@ def test_performance_monitor_tracks():
     stats = perf.get_performance_stats()
     assert stats["total_requests"] >= 1
     assert "avg_model_time" in stats
+
+
+def test_stage_timer_accumulates_and_formats():
+    timer = perf.StageTimer()
+    with timer.stage("db"):
+        pass
+    timer.add("db", 5.0)
+    timer.merge({"run_exec": 12.34})
+
+    stages = timer.as_dict()
+    assert list(stages) == ["db", "run_exec"]
+    assert stages["db"] >= 5.0
+    assert stages["run_exec"] == 12.3
+
+    header = perf.format_server_timing({"db": 5.0, "run_exec": 12.34}, total_ms=20)
+    assert header == "db;dur=5.0, run_exec;dur=12.3, total;dur=20.0"
@@ -0,0 +1,86 @@
+import re
+
+import pytest
+
+from utils.chat import md_table_to_html
+from utils.markdown_stream import StreamingMarkdownRenderer, render_markdown
+
+
+TABLE_RESPONSE = """Status **update**:
+
+| Negeri | Tahap |
+|---|:---:|
+| Kelantan | *Bahaya* |
+| Pahang |
+
+Stay *safe out there*."""
+
+
+def test_render_markdown_inline_and_table():
+    html = render_markdown(TABLE_RESPONSE)
+
+    assert html.startswith("Status <b>update</b>:")
+    assert '<table border="1"><thead><tr><th>Negeri</th><th>Tahap</th></tr></thead><tbody>' in html
+    assert "<tr><td>Kelantan</td><td>_Bahaya_</td></tr>" in html
+    assert html.endswith("Stay _safe out there_.")
+
+
+def test_ragged_rows_are_padded_to_header_width():
+    html = render_markdown("| A | B | C |\n|---|---|---|\n| 1 |\n| 1 | 2 | 3 | 4 |")
+
+    assert "<tr><td>1</td><td></td><td></td></tr>" in html
+    assert "<tr><td>1</td><td>2</td><td>3</td></tr>" in html
+    assert html.endswith("</tbody></table>")
+
+
+def test_pipe_line_without_separator_is_plain_text():
+    assert render_markdown("Pilih A | B\n\nthen continue") == "Pilih A | B\n\nthen continue"
+
+
+def test_streamed_chunks_match_full_render_and_never_change():
+    renderer = StreamingMarkdownRenderer()
+    fragments = []
+    for i in range(0, len(TABLE_RESPONSE), 3):
+        fragments.append(renderer.feed(TABLE_RESPONSE[i:i + 3]))
+    fragments.append(renderer.finish())
+
+    assert "".join(fragments) == render_markdown(TABLE_RESPONSE)
+
+
+def test_partial_line_is_held_until_complete():
+    renderer = StreamingMarkdownRenderer()
+
+    assert renderer.feed("**bo") == ""
+    assert renderer.feed("ld** text\nnext") == "<b>bold</b> text"
+    assert renderer.finish() == "\nnext"
+
+
+def legacy_render(content):
+    """The regex passes generate_response ran before the streaming renderer"""
+    content = re.sub(r'(?<!\*)\*(\w[^*]+\w)\*(?!\*)', r'_\1_', content)
+    content = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', content)
+    return md_table_to_html(content)
+
+
+LEGACY_CORPUS = [
+    "  indented",
+    "text  ",
+    "\n\n  Hello **world**  \n\n",
+    "first  \n   \n\tsecond\t",
+    "Stay *safe out there* and **calm**.",
+    "Status **update**:\n\n| Negeri | Tahap |\n|---|:---:|\n| Kelantan | *Bahaya* |\n\nStay *safe*.",
+    "  | A | B |\n|---|---|\n| **1** | *two words* |  \n\nAfter the table  ",
+]
+
+
+@pytest.mark.parametrize("text", LEGACY_CORPUS)
+def test_output_matches_legacy_renderer(text):
+    assert render_markdown(text) == legacy_render(text)
+
+
+@pytest.mark.parametrize("text", LEGACY_CORPUS)
+def test_streamed_output_matches_legacy_renderer(text):
+    renderer = StreamingMarkdownRenderer()
+    html = "".join(renderer.feed(ch) for ch in text) + renderer.finish()
+
+    assert html == legacy_render(text)
@@ -0,0 +1,136 @@
+"""
+Unit tests for utils.transcription_jobs and utils.transcription_cache
+Transcription itself is replaced by a fake; jobs run on the real thread pool
+"""
+import hashlib
+import io
+import os
+import threading
+import types
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import utils.chat as chat_module
+import utils.transcription_jobs as jobs_module
+from utils.transcription_cache import TranscriptionCache, transcription_cache_key
+
+
+@pytest.fixture
+def fake_transcribe(monkeypatch):
+    calls = []
+    gate = threading.Event()
+    gate.set()
+
+    def transcribe(audio, language, backend):
+        gate.wait(timeout=5)
+        with open(audio.path, "rb") as f:
+            calls.append((f.read(), language, backend))
+        return {"transcript": "selamat pagi", "method": backend}
+
+    cache = TranscriptionCache(max_entries=8, ttl=60)
+    monkeypatch.setattr(jobs_module, "transcribe_staged_audio", transcribe)
+    monkeypatch.setattr(jobs_module, "resolve_transcription_method", lambda method: "openai_api")
+    monkeypatch.setattr(jobs_module, "get_transcription_cache", lambda: cache)
+    return types.SimpleNamespace(calls=calls, gate=gate, cache=cache)
+
+
+def upload(data=b"voice-note"):
+    return UploadFile(file=io.BytesIO(data), filename="note.webm")
+
+
+def wait_for(manager, job):
+    manager._executor.shutdown(wait=True)
+    return manager.get(job.id).to_dict()
+
+
+def test_job_runs_in_background_and_caches_result(fake_transcribe):
+    manager = jobs_module.TranscriptionJobManager(workers=1, max_pending=4, ttl=60)
+
+    job = manager.submit(upload(), language="ms")
+    result = wait_for(manager, job)
+
+    assert result == {
+        "job_id": job.id, "status": "completed", "cached": False,
+        "result": {"transcript": "selamat pagi", "method": "openai_api"},
+    }
+    assert fake_transcribe.calls == [(b"voice-note", "ms", "openai_api")]
+    key = transcription_cache_key(hashlib.sha256(b"voice-note").hexdigest(), "ms", "openai_api")
+    assert fake_transcribe.cache.get(key)["transcript"] == "selamat pagi"
+
+
+def test_resubmitted_audio_completes_from_cache(fake_transcribe):
+    manager = jobs_module.TranscriptionJobManager(workers=1, max_pending=4, ttl=60)
+    wait_for(manager, manager.submit(upload(), language="ms"))
+    manager = jobs_module.TranscriptionJobManager(workers=1, max_pending=4, ttl=60)
+
+    retry = manager.submit(upload(), language="ms")
+    other_language = manager.submit(upload(), language="en")
+
+    assert retry.to_dict()["status"] == "completed"
+    assert retry.cached is True
+    assert wait_for(manager, other_language)["cached"] is False
+    assert len(fake_transcribe.calls) == 2
+
+
+def test_duplicate_submission_joins_in_flight_job(fake_transcribe):
+    manager = jobs_module.TranscriptionJobManager(workers=1, max_pending=4, ttl=60)
+    fake_transcribe.gate.clear()
+
+    first = manager.submit(upload())
+    second = manager.submit(upload())
+    fake_transcribe.gate.set()
+    wait_for(manager, first)
+
+    assert second is first
+    assert len(fake_transcribe.calls) == 1
+
+
+def test_failed_job_reports_error_and_removes_temp_file(fake_transcribe, monkeypatch):
+    paths = []
+
+    def failing(audio, language, backend):
+        paths.append(audio.path)
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+
+    monkeypatch.setattr(jobs_module, "transcribe_staged_audio", failing)
+    manager = jobs_module.TranscriptionJobManager(workers=1, max_pending=4, ttl=60)
+
+    result = wait_for(manager, manager.submit(upload()))
+
+    assert result["status"] == "failed"
+    assert result["status_code"] == 400
+    assert result["error"] == "No speech detected in audio"
+    assert not os.path.exists(paths[0])
+
+
+def test_transcribe_audio_file_answers_retries_from_cache(monkeypatch):
+    calls = []
+
+    def transcribe(audio, language, backend):
+        calls.append(audio.sha256)
+        return {"transcript": "hello", "method": backend}
+
+    monkeypatch.setattr(chat_module, "resolve_transcription_method", lambda method: "openai_api")
+    monkeypatch.setattr(chat_module, "transcribe_staged_audio", transcribe)
+    cache = TranscriptionCache(max_entries=8, ttl=60)
+    monkeypatch.setattr(chat_module, "get_transcription_cache", lambda: cache)
+
+    first = chat_module.transcribe_audio_file(upload(b"retry"), language="en")
+    second = chat_module.transcribe_audio_file(upload(b"retry"), language="en")
+
+    assert first == second == {"transcript": "hello", "method": "openai_api"}
+    assert calls == [hashlib.sha256(b"retry").hexdigest()]
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TranscriptionCache(max_entries=2, ttl=60)
+    cache.put("a", {"transcript": "a"})
+    cache.put("b", {"transcript": "b"})
+    cache.get("a")
+    cache.put("c", {"transcript": "c"})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"transcript": "a"}
+    assert cache.get("c") == {"transcript": "c"}
@@ -0,0 +1,126 @@
+"""
+Unit tests for utils.whisper_pool module
+Runs the worker functions on a thread executor with a fake whisper module
+"""
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+import utils.whisper_pool as pool_module
+
+
+class FakeModel:
+    def __init__(self, size, gate=None):
+        self.size = size
+        self.gate = gate
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        self.calls.append((audio, options))
+        return {"text": f"{self.size}:{audio}", "language": "ms", "segments": [{"start": 0.0, "end": 1.0, "text": "hai"}]}
+
+
+@pytest.fixture
+def fake_whisper(monkeypatch):
+    loads = []
+    gate = threading.Event()
+    gate.set()
+
+    def load_model(size):
+        loads.append(size)
+        return FakeModel(size, gate)
+
+    monkeypatch.setitem(sys.modules, "whisper", types.SimpleNamespace(load_model=load_model))
+    monkeypatch.setattr(pool_module, "_models", {})
+    return types.SimpleNamespace(loads=loads, gate=gate)
+
+
+def make_pool(workers=1, max_queue=2):
+    def thread_executor(max_workers, mp_context, initializer, initargs):
+        return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer, initargs=initargs)
+
+    with patch.object(pool_module, "ProcessPoolExecutor", thread_executor):
+        return pool_module.WhisperPool(workers=workers, max_queue=max_queue)
+
+
+def test_model_is_loaded_once_per_worker(fake_whisper):
+    pool = make_pool()
+
+    first = pool.transcribe("a.wav", "base", language="ms")
+    second = pool.transcribe("b.wav", "base")
+
+    assert first["text"] == "base:a.wav"
+    assert second["segments"] == [{"start": 0.0, "end": 1.0, "text": "hai"}]
+    assert fake_whisper.loads == ["base"]
+    assert pool_module._models["base"].calls == [("a.wav", {"language": "ms"}), ("b.wav", {})]
+    pool._executor.shutdown(wait=True)
+    stats = pool.get_stats()
+    assert stats["completed"] == 2
+    assert stats["model_loads"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_warmup_preloads_requested_sizes(fake_whisper):
+    pool = make_pool()
+
+    assert pool.warm(["base", "small"]) == [["base", "small"]]
+    pool.transcribe("a.wav", "small")
+
+    assert fake_whisper.loads == ["base", "small"]
+    pool._executor.shutdown(wait=True)
+    assert pool.get_stats()["model_loads"] == 0
+
+
+def test_full_queue_is_rejected_with_503(fake_whisper):
+    pool = make_pool(workers=1, max_queue=2)
+    fake_whisper.gate.clear()
+
+    running = pool.submit("a.wav")
+    queued = pool.submit("b.wav")
+    with pytest.raises(HTTPException) as exc:
+        pool.submit("c.wav")
+
+    assert exc.value.status_code == 503
+    stats = pool.get_stats()
+    assert stats["in_flight"] == 2
+    assert stats["queue_depth"] == 1
+    assert stats["rejected"] == 1
+
+    fake_whisper.gate.set()
+    running.result(timeout=5)
+    queued.result(timeout=5)
+    pool._executor.shutdown(wait=True)
+    assert pool.get_stats()["in_flight"] == 0
+
+
+def test_failed_job_is_counted(fake_whisper):
+    pool = make_pool()
+
+    def broken_load(size):
+        raise RuntimeError("no weights")
+
+    sys.modules["whisper"].load_model = broken_load
+    with pytest.raises(RuntimeError):
+        pool.transcribe("a.wav")
+
+    pool._executor.shutdown(wait=True)
+    stats = pool.get_stats()
+    assert stats["failed"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_transcribe_many_keeps_input_order(fake_whisper):
+    pool = make_pool(workers=2, max_queue=2)
+
+    results = pool.transcribe_many(["a.wav", "b.wav", "c.wav", "d.wav"], "base")
+
+    assert [r["text"] for r in results] == ["base:a.wav", "base:b.wav", "base:c.wav", "base:d.wav"]
+    pool._executor.shutdown(wait=True)
+    assert pool.get_stats()["rejected"] == 0
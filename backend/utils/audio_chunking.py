@@ -0,0 +1,97 @@
+"""
+Splitting long recordings for parallel transcription and stitching the
+results back together.
+
+plan_chunks cuts preprocessed 16 kHz audio near every
+TRANSCRIBE_CHUNK_SECONDS, moving each cut to the quietest frame within a
+few seconds so words are not split, and extends every chunk by half the
+overlap on each side. stitch_chunks keeps, from each chunk, only the
+segments whose midpoint falls between that chunk's own cuts, so text in
+the overlap is taken once. Results without segment timestamps fall back
+to removing the longest run of words repeated across the boundary.
+"""
+import re
+
+from config.settings import TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP_SECONDS
+from .audio_preprocess import TARGET_RATE, frame_energy_db
+
+# How far either side of the target a cut may move to find silence
+CUT_SEARCH_SECONDS = 5.0
+# Longest word run compared when deduplicating text without timestamps
+MAX_OVERLAP_WORDS = 20
+
+
+class AudioChunk:
+    """A slice of the recording plus the span it is responsible for"""
+
+    def __init__(self, start, end, keep_from, keep_to):
+        self.start = start          # sample range sent for transcription
+        self.end = end
+        self.keep_from = keep_from  # cut points: this chunk's share of the text
+        self.keep_to = keep_to
+
+
+def plan_chunks(samples, rate=TARGET_RATE, chunk_seconds=TRANSCRIBE_CHUNK_SECONDS,
+                overlap_seconds=TRANSCRIBE_CHUNK_OVERLAP_SECONDS):
+    """Split at silence; a recording that fits in one chunk comes back whole"""
+    total = len(samples)
+    target = int(chunk_seconds * rate)
+    if target <= 0 or total <= target + int(CUT_SEARCH_SECONDS * rate):
+        return [AudioChunk(0, total, 0, total)]
+
+    energy_db, frame = frame_energy_db(samples, rate)
+    search = int(CUT_SEARCH_SECONDS * rate) // frame
+    cuts = [0]
+    while total - cuts[-1] > target + search * frame:
+        center = (cuts[-1] + target) // frame
+        window = energy_db[max(center - search, 0):center + search + 1]
+        cuts.append((max(center - search, 0) + int(window.argmin())) * frame)
+    cuts.append(total)
+
+    half_overlap = int(overlap_seconds * rate / 2)
+    return [
+        AudioChunk(max(cut_from - half_overlap, 0), min(cut_to + half_overlap, total), cut_from, cut_to)
+        for cut_from, cut_to in zip(cuts, cuts[1:])
+    ]
+
+
+def _words(text):
+    return text.split()
+
+
+def _normalize(word):
+    return re.sub(r"[^\w]", "", word.lower())
+
+
+def merge_word_overlap(previous, text, max_words=MAX_OVERLAP_WORDS):
+    """Drop the leading words of text that repeat the end of previous"""
+    head = _words(text)
+    tail = [_normalize(w) for w in _words(previous)[-max_words:]]
+    normalized = [_normalize(w) for w in head[:max_words]]
+    for size in range(min(len(tail), len(normalized)), 0, -1):
+        if tail[-size:] == normalized[:size]:
+            return " ".join(head[size:])
+    return text.strip()
+
+
+def stitch_chunks(chunks, results, rate=TARGET_RATE):
+    """Join per-chunk results ({"text", "segments"?}) into one transcript"""
+    parts = []
+    for index, (chunk, result) in enumerate(zip(chunks, results)):
+        segments = result.get("segments")
+        if segments:
+            # The first and last chunks also own anything before/after the cuts
+            low = chunk.keep_from / rate if index > 0 else float("-inf")
+            high = chunk.keep_to / rate if index < len(chunks) - 1 else float("inf")
+            offset = chunk.start / rate
+            text = " ".join(
+                seg["text"].strip() for seg in segments
+                if low <= offset + (seg["start"] + seg["end"]) / 2 < high
+            )
+        else:
+            text = result.get("text", "").strip()
+            if parts:
+                text = merge_word_overlap(parts[-1], text)
+        if text:
+            parts.append(text)
+    return " ".join(parts)
@@ -0,0 +1,290 @@
+"""
+Audio preprocessing before transcription.
+
+Decodes the upload, downmixes to mono, resamples to 16 kHz and trims
+leading/trailing silence with a frame-energy voice activity check, all as
+vectorized NumPy operations. Whisper works on 16 kHz mono internally, so
+nothing it would use is lost, and trimmed seconds are seconds neither the
+API nor the local model has to process.
+
+PCM WAV is decoded with the standard library; other formats go through
+ffmpeg (already required by Whisper), whose output is read in chunks
+into one growing buffer. Recordings longer than
+TRANSCRIBE_PREPROCESS_MAX_SECONDS are not decoded past the limit. If
+NumPy or a decoder is missing, or the recording is too long,
+preprocessing is skipped and the original audio is sent unchanged.
+"""
+import subprocess
+import tempfile
+import shutil
+import logging
+import threading
+import wave
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from config.settings import (
+    TRANSCRIBE_PREPROCESS, TRANSCRIBE_PREPROCESS_MAX_SECONDS, TRANSCRIBE_VAD_THRESHOLD_DB, TRANSCRIBE_VAD_PAD_MS
+)
+
+logger = logging.getLogger(__name__)
+
+TARGET_RATE = 16000
+FRAME_MS = 30
+# Frames must be this much louder than the quietest 10% of the recording
+VAD_MARGIN_DB = 10.0
+# Bytes read from ffmpeg's stdout at a time
+PIPE_CHUNK_SIZE = 1024 * 1024
+# Output samples interpolated at a time when resampling
+RESAMPLE_BLOCK = TARGET_RATE * 60
+
+
+class PreparedAudio:
+    """16 kHz mono float32 samples plus how much was trimmed"""
+
+    def __init__(self, samples, original_seconds):
+        self.samples = samples
+        self.original_seconds = original_seconds
+
+    @property
+    def seconds(self):
+        return len(self.samples) / TARGET_RATE
+
+    @property
+    def has_speech(self):
+        return len(self.samples) > 0
+
+    def to_wav(self):
+        """Encode as 16-bit PCM WAV in a spooled temp file (rewound)"""
+        pcm = (np.clip(self.samples, -1.0, 1.0) * 32767).astype("<i2")
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        with wave.open(spool, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(TARGET_RATE)
+            wav.writeframes(pcm.tobytes())
+        spool.seek(0)
+        return spool
+
+    def wav_size(self):
+        return 44 + len(self.samples) * 2
+
+
+# ---- decoding ----------------------------------------------------------
+
+def _too_long(seconds, max_seconds):
+    return ValueError(f"audio is longer than {max_seconds}s ({seconds:.0f}s)")
+
+
+def _decode_wav(source, max_seconds=TRANSCRIBE_PREPROCESS_MAX_SECONDS):
+    """Decode PCM WAV to (frames x channels float32, rate); None if not PCM WAV"""
+    try:
+        with wave.open(source, "rb") as wav:
+            channels = wav.getnchannels()
+            width = wav.getsampwidth()
+            rate = wav.getframerate()
+            frames = wav.getnframes()
+            if frames > max_seconds * rate:
+                raise _too_long(frames / rate, max_seconds)
+            raw = wav.readframes(frames)
+    except (wave.Error, EOFError):
+        return None
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        # 24-bit: widen each little-endian triplet to int32
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        samples = ints.astype(np.float32) / 8388608.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        return None
+    return samples.reshape(-1, channels), rate
+
+
+def _backed_by_file(source):
+    """Whether ffmpeg can read the object's file descriptor directly"""
+    if isinstance(source, tempfile.SpooledTemporaryFile):
+        # fileno() would roll a small in-memory upload over to disk
+        return source._rolled
+    try:
+        source.fileno()
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def _feed(source, pipe):
+    try:
+        shutil.copyfileobj(source, pipe)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg stopped reading (decode error or duration limit)
+        pass
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+
+def _decode_ffmpeg(source, max_seconds=TRANSCRIBE_PREPROCESS_MAX_SECONDS):
+    """Decode any format ffmpeg understands to 16 kHz mono; None if unavailable"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+    is_path = isinstance(source, str)
+    # One second past the limit, so a longer recording is told apart from one exactly at it
+    cmd = [ffmpeg, "-loglevel", "error", "-i", source if is_path else "pipe:0", "-t", str(max_seconds + 1),
+           "-f", "f32le", "-ac", "1", "-ar", str(TARGET_RATE), "pipe:1"]
+    max_bytes = max_seconds * TARGET_RATE * 4
+
+    feeder = None
+    if is_path:
+        stdin = subprocess.DEVNULL
+    else:
+        source.seek(0)
+        stdin = source if _backed_by_file(source) else subprocess.PIPE
+    with tempfile.TemporaryFile() as stderr:
+        proc = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr)
+        if stdin is subprocess.PIPE:
+            # Upload still held in memory: stream it in while stdout is drained
+            feeder = threading.Thread(target=_feed, args=(source, proc.stdin), daemon=True)
+            feeder.start()
+
+        pcm = bytearray()
+        finished = False
+        try:
+            while len(pcm) <= max_bytes:
+                chunk = proc.stdout.read(PIPE_CHUNK_SIZE)
+                if not chunk:
+                    finished = True
+                    break
+                pcm += chunk
+        finally:
+            if not finished:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+            if feeder is not None:
+                feeder.join()
+
+        if not finished:
+            raise _too_long(len(pcm) / (TARGET_RATE * 4), max_seconds)
+        if proc.returncode != 0:
+            stderr.seek(0)
+            logger.warning(f"ffmpeg could not decode audio: {stderr.read(200).decode(errors='ignore')}")
+            return None
+    # Whole float32 samples only; the buffer is used in place, not copied
+    del pcm[len(pcm) - len(pcm) % 4:]
+    return np.frombuffer(pcm, dtype="<f4").reshape(-1, 1), TARGET_RATE
+
+
+def decode_audio(source):
+    """Decode a path or binary file object to (frames x channels, rate) or None"""
+    try:
+        decoded = _decode_wav(source)
+        if decoded is None:
+            decoded = _decode_ffmpeg(source)
+    finally:
+        if not isinstance(source, str):
+            source.seek(0)
+    return decoded
+
+
+# ---- signal processing -------------------------------------------------
+
+def to_mono(samples):
+    """Average the channels of a (frames x channels) array"""
+    if samples.ndim == 1:
+        return samples.astype(np.float32, copy=False)
+    if samples.shape[1] == 1:
+        return samples[:, 0].astype(np.float32, copy=False)
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def resample(samples, rate, target_rate=TARGET_RATE):
+    """Resample by linear interpolation, low-passing first when downsampling"""
+    if rate == target_rate or len(samples) == 0:
+        return samples
+    if target_rate < rate:
+        # Windowed-sinc FIR at the new Nyquist frequency to avoid aliasing
+        cutoff = 0.5 * target_rate / rate
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, (kernel / kernel.sum()).astype(np.float32), mode="same")
+    length = int(round(len(samples) * target_rate / rate))
+    # Interpolate block by block, so the float64 positions and results
+    # never exist for the whole recording at once
+    out = np.empty(length, dtype=np.float32)
+    step = rate / target_rate
+    for start in range(0, length, RESAMPLE_BLOCK):
+        positions = np.arange(start, min(start + RESAMPLE_BLOCK, length), dtype=np.float64) * step
+        first = int(positions[0])
+        window = samples[first:int(positions[-1]) + 2]
+        out[start:start + len(positions)] = np.interp(positions - first, np.arange(len(window)), window)
+    return out
+
+
+def frame_energy_db(samples, rate=TARGET_RATE):
+    """Mean power (dBFS) of each FRAME_MS frame; returns (energies, frame length)"""
+    frame = rate * FRAME_MS // 1000
+    count = len(samples) // frame
+    frames = samples[:count * frame].reshape(count, frame)
+    return 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-12), frame
+
+
+def trim_silence(samples, rate=TARGET_RATE, threshold_db=TRANSCRIBE_VAD_THRESHOLD_DB, pad_ms=TRANSCRIBE_VAD_PAD_MS):
+    """
+    Cut leading and trailing silence using per-frame RMS energy.
+
+    A frame counts as voice when it is above threshold_db (dBFS) and
+    VAD_MARGIN_DB above the recording's noise floor. Returns an empty
+    array when no frame qualifies.
+    """
+    energy_db, frame = frame_energy_db(samples, rate)
+    if len(energy_db) == 0:
+        return samples
+
+    noise_db = np.percentile(energy_db, 10)
+    threshold = max(threshold_db, min(noise_db + VAD_MARGIN_DB, energy_db.max() - 6))
+    voiced = np.flatnonzero(energy_db >= threshold)
+    if len(voiced) == 0:
+        return samples[:0]
+
+    pad = rate * pad_ms // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def preprocess_audio(source):
+    """
+    Decode, downmix, resample and trim an audio path or file object.
+
+    Returns PreparedAudio, or None when preprocessing is disabled or the
+    audio cannot be decoded here (the caller then sends the original).
+    """
+    if not (TRANSCRIBE_PREPROCESS and NUMPY_AVAILABLE):
+        return None
+    try:
+        decoded = decode_audio(source)
+    except Exception as e:
+        logger.warning(f"Audio preprocessing skipped: {e}")
+        return None
+    if decoded is None:
+        return None
+
+    samples, rate = decoded
+    mono = resample(to_mono(samples), rate)
+    prepared = PreparedAudio(trim_silence(mono), original_seconds=len(samples) / rate)
+    logger.info(f"Preprocessed audio: {prepared.original_seconds:.1f}s -> {prepared.seconds:.1f}s at {TARGET_RATE} Hz mono")
+    return prepared
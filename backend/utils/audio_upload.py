@@ -0,0 +1,154 @@
+"""
+Staging of uploaded audio for transcription without buffering it in memory.
+
+Starlette already spools multipart uploads to a temporary file, so the size
+is checked with a seek (or counted chunk by chunk when the stream cannot
+seek) and the upload's own file object is handed to the OpenAI client.
+Local Whisper needs a path a worker process can open, so the upload is
+copied in fixed-size chunks to a named temp file in the system temp
+directory. Peak memory per upload stays around one chunk either way.
+The SHA-256 of the audio is computed on the same pass so results can be
+cached by content.
+"""
+from contextlib import contextmanager
+from fastapi import HTTPException, UploadFile
+import hashlib
+import tempfile
+import os
+
+from config.settings import TRANSCRIBE_MAX_UPLOAD_MB, TRANSCRIBE_TEMP_DIR
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = TRANSCRIBE_MAX_UPLOAD_MB * 1024 * 1024
+
+
+def _too_large():
+    return HTTPException(
+        status_code=413,
+        detail=f"Audio file too large. Maximum size is {TRANSCRIBE_MAX_UPLOAD_MB}MB."
+    )
+
+
+def upload_size(file: UploadFile):
+    """Size of the upload in bytes without reading it, or None if unknown"""
+    if getattr(file, "size", None) is not None:
+        return file.size
+    stream = file.file
+    try:
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END) - position
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def copy_upload(stream, dest, max_bytes=MAX_UPLOAD_BYTES, chunk_size=UPLOAD_CHUNK_SIZE, hasher=None):
+    """Copy in chunks, stopping with 413 as soon as max_bytes is exceeded"""
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return total
+        total += len(chunk)
+        if total > max_bytes:
+            raise _too_large()
+        if hasher is not None:
+            hasher.update(chunk)
+        dest.write(chunk)
+
+
+def hash_stream(stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """SHA-256 of a seekable stream from its start, leaving it rewound"""
+    hasher = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
+
+
+def _suffix(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if ext and len(ext) <= 6 else ".wav"
+
+
+class StagedAudio:
+    """An upload ready for transcription"""
+
+    def __init__(self, filename, fileobj=None, path=None, size=None, sha256=None):
+        self.filename = filename
+        self.fileobj = fileobj
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    def as_openai_file(self):
+        # (name, file object) tuple: the client streams it without reading it into memory
+        return (self.filename, self.fileobj)
+
+
+def _check_upload(file: UploadFile, max_bytes):
+    if not file:
+        raise HTTPException(status_code=400, detail="No audio file provided")
+    size = upload_size(file)
+    if size is not None and size > max_bytes:
+        raise _too_large()
+    if size is not None:
+        file.file.seek(0)
+    return os.path.basename(file.filename or "") or "audio.wav", size
+
+
+def save_audio_upload(file: UploadFile, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Copy the upload to a named temp file that outlives the request.
+    The caller owns the returned StagedAudio.path and must remove it.
+    """
+    filename, _ = _check_upload(file, max_bytes)
+    hasher = hashlib.sha256()
+    temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=_suffix(filename), dir=TRANSCRIBE_TEMP_DIR)
+    try:
+        with temp_audio:
+            size = copy_upload(file.file, temp_audio, max_bytes, hasher=hasher)
+    except BaseException:
+        os.unlink(temp_audio.name)
+        raise
+    return StagedAudio(filename, path=temp_audio.name, size=size, sha256=hasher.hexdigest())
+
+
+@contextmanager
+def stage_audio_upload(file: UploadFile, need_path=False, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Validate the upload size and yield a StagedAudio.
+
+    need_path=False yields the upload's file object (spooled again in chunks
+    only if its size cannot be determined); need_path=True yields a temp
+    file path that is removed on exit.
+    """
+    if need_path:
+        audio = save_audio_upload(file, max_bytes)
+        try:
+            yield audio
+        finally:
+            try:
+                os.unlink(audio.path)
+            except OSError:
+                pass
+        return
+
+    filename, size = _check_upload(file, max_bytes)
+    if size is not None:
+        yield StagedAudio(filename, fileobj=file.file, size=size, sha256=hash_stream(file.file))
+        return
+
+    hasher = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE, dir=TRANSCRIBE_TEMP_DIR)
+    try:
+        size = copy_upload(file.file, spool, max_bytes, hasher=hasher)
+        spool.seek(0)
+        yield StagedAudio(filename, fileobj=spool, size=size, sha256=hasher.hexdigest())
+    finally:
+        spool.close()
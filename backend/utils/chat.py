@@ -1,19 +1,25 @@
 from fastapi import HTTPException, Header, UploadFile, File, Depends
+from concurrent.futures import ThreadPoolExecutor
+import importlib.util
 import ollama
 import os
-import re
 import time
 from config.models import AI_MODEL, MODEL_SETTINGS
+from config.settings import TRANSCRIBE_API_CONCURRENCY
 from .language import detect_language, get_language_instruction
+from .markdown_stream import render_markdown
+from .whisper_pool import get_whisper_pool
+from .audio_upload import StagedAudio, stage_audio_upload
+from .audio_preprocess import TARGET_RATE, PreparedAudio, preprocess_audio
+from .audio_chunking import plan_chunks, stitch_chunks
+from .transcription_cache import get_transcription_cache, transcription_cache_key
 import logging
 
-# Optional whisper import for voice transcription
-try:
-    import whisper as openai_whisper
-    WHISPER_AVAILABLE = True
-except Exception as e:
-    WHISPER_AVAILABLE = False
-    print(f"Warning: Whisper not available for audio transcription: {e}")
+# Optional local whisper for voice transcription. Only checked here: the
+# model (and torch) is imported by the whisper_pool worker processes
+WHISPER_AVAILABLE = importlib.util.find_spec("whisper") is not None
+if not WHISPER_AVAILABLE:
+    print("Warning: Whisper not available for audio transcription: package not installed")
 
 # OpenAI API for better speech recognition (supports Malay and English)
 try:
@@ -64,12 +70,8 @@ Question: {request.prompt}"""
     )
     model_duration = time.time() - model_start
     
-    content = response["message"]["content"]
-    # Convert *text* to _text_ (Markdown italics)
-    content = re.sub(r'(?<!\*)\*(\w[^*]+\w)\*(?!\*)', r'_\1_', content)
-    # Convert **text** to <b>text</b> (HTML bold)
-    content = re.sub(r'\*\*(.+?)\*\*', r'<b>\1</b>', content)
-    content = md_table_to_html(content)
+    # *text* -> _text_, **text** -> <b>text</b> and tables -> HTML in one pass
+    content = render_markdown(response["message"]["content"])
     
     total_duration = time.time() - start_time
     logger.info(f"Total request time: {total_duration:.2f}s (Model: {model_duration:.2f}s)")
@@ -77,6 +79,7 @@ Question: {request.prompt}"""
     return {"response": content}
 
 def md_table_to_html(md):
+    """Convert markdown tables in a complete response (see utils.markdown_stream for streaming)"""
     lines = md.strip().split('\n')
     html = []
     i = 0
@@ -95,30 +98,12 @@ def md_table_to_html(md):
             i += 1
     return '\n'.join(html)
 
-def transcribe_audio_file(file: UploadFile, language: str = "auto", method: str = "auto"):
+def resolve_transcription_method(method: str = "auto"):
     """
-    Transcribe audio file to text with language support.
+    Pick the transcription backend for a request.
     
-    Args:
-        file: Audio file to transcribe
-        language: Language code ("ms" for Malay, "en" for English, "auto" for auto-detect)
-        method: Transcription method ("openai" for API, "local" for local Whisper, "auto" for best available)
+    Returns "openai_api" or "local_whisper"; raises 503 if neither can serve it.
     """
-    # Validate file
-    if not file:
-        raise HTTPException(status_code=400, detail="No audio file provided")
-    
-    # Check file size (limit to 25MB)
-    try:
-        audio_bytes = file.file.read()
-        file_size_mb = len(audio_bytes) / (1024 * 1024)
-        if file_size_mb > 25:
-            raise HTTPException(status_code=413, detail="Audio file too large. Maximum size is 25MB.")
-    except Exception as e:
-        if isinstance(e, HTTPException):
-            raise
-        raise HTTPException(status_code=400, detail="Failed to read audio file")
-    
     # Determine which method to use
     use_openai_api = False
     if method == "openai" and OPENAI_API_AVAILABLE:
@@ -126,82 +111,167 @@ def transcribe_audio_file(file: UploadFile, language: str = "auto", method: str
     elif method == "auto" and OPENAI_API_AVAILABLE:
         # Prefer OpenAI API as it has better Malay support
         use_openai_api = True
-    elif not WHISPER_AVAILABLE and not OPENAI_API_AVAILABLE:
+    
+    if not use_openai_api and not WHISPER_AVAILABLE:
         raise HTTPException(
             status_code=503,
             detail="Voice transcription is currently unavailable. Please try again later."
         )
+    return "openai_api" if use_openai_api else "local_whisper"
+
+def _transcribe_with_openai(upload, language: str = "auto", timestamps: bool = False):
+    """Send a (filename, file object) upload to the OpenAI Whisper API"""
+    transcription_params = {"model": "whisper-1", "file": upload}
+    
+    if language and language != "auto":
+        transcription_params["language"] = language
+    if timestamps:
+        # Segment timestamps are needed to stitch chunked recordings
+        transcription_params["response_format"] = "verbose_json"
+    
+    logger.info(f"Using OpenAI Whisper API with language: {language}")
     
     try:
-        if use_openai_api:
-            # Use OpenAI Whisper API (better for Malay and multilingual)
-            import io
-            
-            # OpenAI API requires file-like object with name attribute
-            audio_file = io.BytesIO(audio_bytes)
-            audio_file.name = "audio.wav"
-            
-            # Set language parameter for OpenAI API
-            transcription_params = {"model": "whisper-1", "file": audio_file}
-            
-            if language and language != "auto":
-                transcription_params["language"] = language
-            
-            logger.info(f"Using OpenAI Whisper API with language: {language}")
-            
-            try:
-                transcript = openai_client.audio.transcriptions.create(**transcription_params)
-                
-                if not transcript or not transcript.text:
-                    raise HTTPException(status_code=400, detail="No speech detected in audio")
-                
-                return {"transcript": transcript.text, "method": "openai_api"}
-            except Exception as api_error:
-                logger.error(f"OpenAI API error: {str(api_error)}")
-                
-                if "insufficient_quota" in str(api_error):
-                    raise HTTPException(status_code=503, detail="Transcription quota exceeded. Please try again later.")
-                elif "invalid_api_key" in str(api_error):
-                    raise HTTPException(status_code=503, detail="Transcription service configuration error.")
-                else:
-                    raise HTTPException(status_code=500, detail="Transcription failed. Please try again.")
+        transcript = openai_client.audio.transcriptions.create(**transcription_params)
+        
+        if not transcript or not transcript.text:
+            raise HTTPException(status_code=400, detail="No speech detected in audio")
         
+        result = {"transcript": transcript.text, "method": "openai_api"}
+        if timestamps:
+            result["segments"] = [
+                {"start": seg.start, "end": seg.end, "text": seg.text}
+                for seg in (getattr(transcript, "segments", None) or [])
+            ]
+        return result
+    except HTTPException:
+        raise
+    except Exception as api_error:
+        logger.error(f"OpenAI API error: {str(api_error)}")
+        
+        if "insufficient_quota" in str(api_error):
+            raise HTTPException(status_code=503, detail="Transcription quota exceeded. Please try again later.")
+        elif "invalid_api_key" in str(api_error):
+            raise HTTPException(status_code=503, detail="Transcription service configuration error.")
         else:
-            # Use local Whisper model
-            if not WHISPER_AVAILABLE:
-                raise HTTPException(
-                    status_code=503,
-                    detail="Voice transcription is currently unavailable. Please try again later."
-                )
-            
-            temp_dir = os.path.dirname(os.path.abspath(__file__))
-            import tempfile
-            temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=temp_dir)
+            raise HTTPException(status_code=500, detail="Transcription failed. Please try again.")
+
+def _transcribe_chunk_with_openai(samples, language: str = "auto"):
+    """Transcribe one chunk of a long recording via the API; silence gives empty text"""
+    wav = PreparedAudio(samples, len(samples) / TARGET_RATE).to_wav()
+    try:
+        result = _transcribe_with_openai(("audio.wav", wav), language, timestamps=True)
+        return {"text": result["transcript"], "segments": result["segments"]}
+    except HTTPException as e:
+        if e.status_code == 400:
+            return {"text": "", "segments": []}
+        raise
+    finally:
+        wav.close()
+
+def _transcribe_chunked(prepared, chunks, language: str = "auto", backend: str = "openai_api"):
+    """Transcribe a long recording as overlapping chunks in parallel and stitch the text"""
+    pieces = [prepared.samples[chunk.start:chunk.end] for chunk in chunks]
+    logger.info(f"Transcribing {prepared.seconds:.0f}s of audio as {len(pieces)} parallel chunks ({backend})")
+    
+    if backend == "openai_api":
+        with ThreadPoolExecutor(max_workers=min(TRANSCRIBE_API_CONCURRENCY, len(pieces))) as executor:
+            results = list(executor.map(lambda piece: _transcribe_chunk_with_openai(piece, language), pieces))
+    else:
+        transcribe_params = {}
+        if language and language != "auto":
+            transcribe_params["language"] = language
+        results = get_whisper_pool().transcribe_many(pieces, **transcribe_params)
+    
+    transcript = stitch_chunks(chunks, results)
+    if not transcript:
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+    
+    return {"transcript": transcript, "method": backend}
+
+def transcribe_staged_audio(audio, language: str = "auto", backend: str = "openai_api"):
+    """
+    Transcribe audio staged by utils.audio_upload with the given backend.
+    
+    Args:
+        audio: StagedAudio (file object for the API, or a path)
+        language: Language code ("ms", "en" or "auto")
+        backend: "openai_api" or "local_whisper" (see resolve_transcription_method)
+    """
+    if backend == "openai_api" and audio.fileobj is None:
+        # Saved to disk (background job): stream it from the file
+        with open(audio.path, "rb") as audio_file:
+            staged = StagedAudio(audio.filename, fileobj=audio_file, size=audio.size, sha256=audio.sha256)
+            return transcribe_staged_audio(staged, language, backend)
+    
+    # Decode, downmix, resample to 16 kHz and trim silence before either
+    # backend sees the audio (None if it could not be decoded here)
+    prepared = preprocess_audio(audio.fileobj if audio.fileobj is not None else audio.path)
+    if prepared is not None and not prepared.has_speech:
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+    
+    # Long recordings are split at silence and transcribed in parallel
+    chunks = plan_chunks(prepared.samples) if prepared is not None else []
+    if len(chunks) > 1:
+        return _transcribe_chunked(prepared, chunks, language, backend)
+    
+    if backend == "openai_api":
+        # Use OpenAI Whisper API (better for Malay and multilingual).
+        # The trimmed 16 kHz WAV is sent only when it is smaller than the upload
+        wav = prepared.to_wav() if prepared is not None and prepared.wav_size() < (audio.size or 0) else None
+        try:
+            return _transcribe_with_openai(("audio.wav", wav) if wav is not None else audio.as_openai_file(), language)
+        finally:
+            if wav is not None:
+                wav.close()
+    
+    # Use local Whisper model
+    logger.info(f"Using local Whisper model with language: {language}")
+    
+    # Set language parameter for local Whisper
+    transcribe_params = {}
+    if language and language != "auto":
+        transcribe_params["language"] = language
+    
+    # Runs in a warm worker process that keeps the model loaded; decoded
+    # samples skip the worker's own ffmpeg pass
+    source = prepared.samples if prepared is not None else audio.path
+    result = get_whisper_pool().transcribe(source, **transcribe_params)
+    
+    if not result or not result.get("text"):
+        raise HTTPException(status_code=400, detail="No speech detected in audio")
+    
+    return {"transcript": result["text"], "method": "local_whisper"}
+
+def transcribe_audio_file(file: UploadFile, language: str = "auto", method: str = "auto"):
+    """
+    Transcribe audio file to text with language support.
+    
+    Args:
+        file: Audio file to transcribe
+        language: Language code ("ms" for Malay, "en" for English, "auto" for auto-detect)
+        method: Transcription method ("openai" for API, "local" for local Whisper, "auto" for best available)
+    """
+    # Validate file
+    if not file:
+        raise HTTPException(status_code=400, detail="No audio file provided")
+    
+    backend = resolve_transcription_method(method)
+    
+    try:
+        # Size is checked before anything is read; the audio is streamed
+        # in chunks rather than loaded into memory (see utils.audio_upload)
+        with stage_audio_upload(file, need_path=backend == "local_whisper") as audio:
+            # Re-uploads of the same recording are answered from the cache
+            cache = get_transcription_cache()
+            cache_key = transcription_cache_key(audio.sha256, language, backend)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                return cached
             
-            try:
-                temp_audio.write(audio_bytes)
-                temp_audio.flush()
-                temp_audio.close()
-                
-                logger.info(f"Using local Whisper model with language: {language}")
-                model = openai_whisper.load_model("base")
-                
-                # Set language parameter for local Whisper
-                transcribe_params = {"audio": temp_audio.name}
-                if language and language != "auto":
-                    transcribe_params["language"] = language
-                
-                result = model.transcribe(**transcribe_params)
-                
-                if not result or not result.get("text"):
-                    raise HTTPException(status_code=400, detail="No speech detected in audio")
-                
-                return {"transcript": result["text"], "method": "local_whisper"}
-            finally:
-                try:
-                    os.unlink(temp_audio.name)
-                except:
-                    pass
+            result = transcribe_staged_audio(audio, language, backend)
+            cache.put(cache_key, result)
+            return result
     
     except HTTPException:
         raise
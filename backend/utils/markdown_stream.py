@@ -0,0 +1,134 @@
+"""
+Incremental markdown-to-HTML rendering for chat responses.
+
+StreamingMarkdownRenderer consumes the response in arbitrary chunks and
+returns HTML only for lines that are complete, so fragments never change
+once emitted and the caller can append them as they arrive. Bold, italics
+and tables are handled by one line tokenizer. Like the regex passes and
+md_table_to_html generate_response used before, the response is
+stripped of leading and trailing whitespace; the output is the same
+except that:
+
+- ragged table rows are padded or trimmed to the header width,
+- a table needs a real separator line under its header (a blank line
+  used to count as one), and header rows without outer pipes keep their
+  first and last cells,
+- emphasis never spans lines.
+"""
+import re
+
+# One tokenizer for inline emphasis: **bold** is tried before a single-'*'
+# italic span at each position (same patterns the old regex passes used)
+_INLINE = re.compile(r"\*\*(.+?)\*\*|(?<!\*)\*(\w[^*]+\w)\*(?!\*)")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+
+def _inline_token(match):
+    bold = match.group(1)
+    if bold is not None:
+        return "<b>" + _render_inline(bold) + "</b>"
+    return "_" + match.group(2) + "_"
+
+
+def _render_inline(text):
+    """Render **bold** as <b> and *italic* as _italic_ in one scan"""
+    if "*" not in text:
+        return text
+    return _INLINE.sub(_inline_token, text)
+
+
+def _split_row(line):
+    cells = line.strip()
+    if cells.startswith("|"):
+        cells = cells[1:]
+    if cells.endswith("|"):
+        cells = cells[:-1]
+    return [cell.strip() for cell in cells.split("|")]
+
+
+class StreamingMarkdownRenderer:
+    """Render streamed markdown into append-only HTML fragments"""
+
+    def __init__(self):
+        self._buffer = ""
+        self._held_header = None   # a '|' line waiting to see if a separator follows
+        self._table_columns = 0    # header width while inside a table, else 0
+        self._pending = ""         # trailing whitespace and blank lines held back until more content arrives
+        self._started = False
+
+    def feed(self, chunk):
+        """Add a chunk of text; returns the HTML for any lines it completed"""
+        self._buffer += chunk
+        if "\n" not in self._buffer:
+            return ""
+        *lines, self._buffer = self._buffer.split("\n")
+        return "".join(self._process_line(line) for line in lines)
+
+    def finish(self):
+        """Flush the final partial line and close any open table"""
+        out = []
+        if self._buffer:
+            out.append(self._process_line(self._buffer))
+            self._buffer = ""
+        if self._held_header is not None:
+            out.append(self._emit(_render_inline(self._held_header)))
+            self._held_header = None
+        if self._table_columns:
+            out.append(self._emit("</tbody></table>"))
+            self._table_columns = 0
+        return "".join(out)
+
+    def _emit(self, line):
+        # Lines are joined with newlines; whitespace is released only once
+        # something follows, so the response comes out stripped
+        if not line.strip():
+            if self._started:
+                self._pending += "\n" + line
+            return ""
+        text = line.rstrip()
+        if self._started:
+            out = self._pending + "\n" + text
+        else:
+            out = text.lstrip()
+            self._started = True
+        self._pending = line[len(text):]
+        return out
+
+    def _process_line(self, line):
+        prefix = ""
+
+        if self._held_header is not None:
+            header, self._held_header = self._held_header, None
+            if "-" in line and _TABLE_SEPARATOR.match(line):
+                cells = _split_row(header)
+                self._table_columns = len(cells)
+                return self._emit(
+                    '<table border="1"><thead><tr>'
+                    + "".join(f"<th>{_render_inline(c)}</th>" for c in cells)
+                    + "</tr></thead><tbody>"
+                )
+            prefix = self._emit(_render_inline(header))
+
+        if self._table_columns:
+            if "|" in line:
+                cells = _split_row(line)
+                # Ragged rows are padded or trimmed to the header width
+                if len(cells) != self._table_columns:
+                    cells = (cells + [""] * self._table_columns)[:self._table_columns]
+                return prefix + self._emit(
+                    "<tr>" + "".join(f"<td>{_render_inline(c)}</td>" for c in cells) + "</tr>"
+                )
+            prefix += self._emit("</tbody></table>")
+            self._table_columns = 0
+
+        if "|" in line:
+            # Possible table header; decided when the next line completes
+            self._held_header = line
+            return prefix
+        return prefix + self._emit(_render_inline(line))
+
+
+def render_markdown(text):
+    """Render a complete response in one pass"""
+    renderer = StreamingMarkdownRenderer()
+    return renderer.feed(text or "") + renderer.finish()
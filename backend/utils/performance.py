@@ -1,5 +1,7 @@
 import time
 import logging
+import threading
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +33,51 @@ class PerformanceMonitor:
         return dict(self.metrics)
 
 
+class StageTimer:
+    """Collect per-stage wall-clock durations (in milliseconds) for one request.
+
+    Stages recorded more than once (e.g. repeated tool-call round trips) are
+    accumulated, and insertion order is preserved for reporting. Stages may be
+    recorded from worker threads.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def merge(self, stages: dict):
+        for name, duration_ms in (stages or {}).items():
+            self.add(name, duration_ms)
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {name: round(duration, 1) for name, duration in self.stages.items()}
+
+
+def format_server_timing(stages: dict, total_ms: float = None) -> str:
+    """Render stage durations as a Server-Timing header value."""
+    entries = [f"{name};dur={duration:.1f}" for name, duration in (stages or {}).items()]
+    if total_ms is not None:
+        entries.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(entries)
+
+
 perf_monitor = PerformanceMonitor()
 
 
@@ -0,0 +1,60 @@
+"""
+In-memory LRU cache of transcription results.
+
+Keyed by the SHA-256 of the audio plus the requested language and the
+backend that produced the text, so a re-upload of the same recording
+(typically a client retry) is answered without transcribing it again.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+from config.settings import TRANSCRIBE_CACHE_SIZE, TRANSCRIBE_CACHE_TTL
+
+
+def transcription_cache_key(sha256, language, method):
+    return f"{sha256}:{language or 'auto'}:{method}"
+
+
+class TranscriptionCache:
+    """Thread-safe LRU with a per-entry time to live"""
+
+    def __init__(self, max_entries=TRANSCRIBE_CACHE_SIZE, ttl=TRANSCRIBE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key, result):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Global cache instance
+_transcription_cache = TranscriptionCache()
+
+def get_transcription_cache():
+    return _transcription_cache
@@ -0,0 +1,174 @@
+"""
+Background transcription jobs.
+
+POST /transcribe/jobs saves the upload to a temp file (hashing it on the
+way), answers from the result cache when the same audio was already
+transcribed, joins an in-flight job for identical audio, and otherwise
+queues the work on a small thread pool. Clients poll GET
+/transcribe/jobs/{job_id} (optionally long-polling with ?wait=) instead of
+holding a request open for the whole transcription. Jobs live in memory
+and are forgotten TRANSCRIBE_JOB_TTL seconds after they finish.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, UploadFile
+import threading
+import logging
+import time
+import uuid
+import os
+
+from config.settings import TRANSCRIBE_JOB_WORKERS, TRANSCRIBE_MAX_PENDING_JOBS, TRANSCRIBE_JOB_TTL
+from .audio_upload import save_audio_upload
+from .chat import resolve_transcription_method, transcribe_staged_audio
+from .transcription_cache import get_transcription_cache, transcription_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionJob:
+    def __init__(self, language, backend, cache_key):
+        self.id = uuid.uuid4().hex
+        self.language = language
+        self.backend = backend
+        self.cache_key = cache_key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.status_code = None
+        self.cached = False
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed")
+
+    def complete(self, result, cached=False):
+        self.result = result
+        self.cached = cached
+        self.status = "completed"
+        self.finished_at = time.time()
+
+    def fail(self, status_code, error):
+        self.status_code = status_code
+        self.error = error
+        self.status = "failed"
+        self.finished_at = time.time()
+
+    def to_dict(self):
+        job = {"job_id": self.id, "status": self.status, "cached": self.cached}
+        if self.status == "completed":
+            job["result"] = self.result
+        elif self.status == "failed":
+            job["error"] = self.error
+            job["status_code"] = self.status_code
+        return job
+
+
+class TranscriptionJobManager:
+    """Runs transcriptions off the request path and tracks their status"""
+
+    def __init__(self, workers=TRANSCRIBE_JOB_WORKERS, max_pending=TRANSCRIBE_MAX_PENDING_JOBS, ttl=TRANSCRIBE_JOB_TTL):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="transcribe-job")
+        self._jobs = {}
+        self._in_flight = {}    # cache key -> job, for joining duplicate submissions
+        self._lock = threading.Lock()
+
+    def submit(self, file: UploadFile, language="auto", method="auto"):
+        """Queue an uploaded file for transcription and return its job"""
+        backend = resolve_transcription_method(method)
+        self._prune()
+        with self._lock:
+            if len(self._in_flight) >= self.max_pending:
+                raise HTTPException(status_code=503, detail="Too many transcriptions in progress. Please try again shortly.")
+
+        audio = save_audio_upload(file)
+        cache_key = transcription_cache_key(audio.sha256, language, backend)
+        job = TranscriptionJob(language, backend, cache_key)
+
+        cached = get_transcription_cache().get(cache_key)
+        with self._lock:
+            existing = self._in_flight.get(cache_key) if cached is None else None
+            if cached is not None:
+                job.complete(cached, cached=True)
+            elif existing is None:
+                self._in_flight[cache_key] = job
+            if existing is None:
+                self._jobs[job.id] = job
+
+        if cached is not None or existing is not None:
+            _remove(audio.path)
+            return existing or job
+
+        self._executor.submit(self._run, job, audio)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def get_stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            "jobs": len(statuses),
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "completed": statuses.count("completed"),
+            "failed": statuses.count("failed"),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job, audio):
+        job.status = "running"
+        try:
+            result = transcribe_staged_audio(audio, job.language, job.backend)
+            get_transcription_cache().put(job.cache_key, result)
+            job.complete(result)
+        except HTTPException as e:
+            job.fail(e.status_code, e.detail)
+        except Exception as e:
+            logger.error(f"Transcription job {job.id} failed: {e}")
+            job.fail(500, "Voice transcription failed. Please try again.")
+        finally:
+            _remove(audio.path)
+            with self._lock:
+                if self._in_flight.get(job.cache_key) is job:
+                    del self._in_flight[job.cache_key]
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+# Global job manager
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+def get_transcription_jobs():
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = TranscriptionJobManager()
+    return _job_manager
+
+def get_transcription_job_stats():
+    return _job_manager.get_stats() if _job_manager is not None else None
+
+def shutdown_transcription_jobs():
+    if _job_manager is not None:
+        _job_manager.shutdown()
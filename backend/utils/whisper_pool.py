@@ -0,0 +1,195 @@
+"""
+Local Whisper inference in a bounded process pool.
+
+Each worker process keeps a registry of loaded models, so a model size is
+loaded once per worker (at warmup or on first use) instead of once per
+request. Jobs run outside the API process, and admission is capped at
+WHISPER_MAX_QUEUE jobs in flight so a burst of uploads is turned away with
+503 instead of piling up.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from fastapi import HTTPException
+import multiprocessing
+import threading
+import logging
+import time
+
+from config.settings import WHISPER_MODELS, WHISPER_WORKERS, WHISPER_MAX_QUEUE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WHISPER_MODEL = WHISPER_MODELS[0] if WHISPER_MODELS else "base"
+
+# ---- worker side -------------------------------------------------------
+
+# Models loaded in this worker process, by size
+_models = {}
+
+def _load_model(size):
+    model = _models.get(size)
+    if model is None:
+        import whisper
+        start = time.perf_counter()
+        model = whisper.load_model(size)
+        _models[size] = model
+        logger.info(f"Loaded Whisper model '{size}' in {time.perf_counter() - start:.1f}s")
+    return model
+
+def _init_worker(preload):
+    for size in preload:
+        _load_model(size)
+
+def _warm_worker(sizes):
+    for size in sizes:
+        _load_model(size)
+    return sorted(_models)
+
+def _transcribe_in_worker(audio, model_size, options):
+    """Run one transcription; audio is a file path or a float32 sample array"""
+    loaded = model_size in _models
+    model = _load_model(model_size)
+    start = time.perf_counter()
+    result = model.transcribe(audio, **options)
+    return {
+        "text": result.get("text", ""),
+        "language": result.get("language"),
+        "segments": [
+            {"start": seg.get("start"), "end": seg.get("end"), "text": seg.get("text", "")}
+            for seg in result.get("segments", [])
+        ],
+        "inference_ms": round((time.perf_counter() - start) * 1000, 1),
+        "model_cached": loaded,
+    }
+
+# ---- API side ----------------------------------------------------------
+
+class WhisperPool:
+    """Bounded process pool for local Whisper transcription"""
+
+    def __init__(self, workers=WHISPER_WORKERS, max_queue=WHISPER_MAX_QUEUE, preload=()):
+        self.workers = max(1, workers)
+        self.max_queue = max(self.workers, max_queue)
+        # spawn: torch does not survive fork() reliably
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(tuple(preload),)
+        )
+        self._lock = threading.Lock()
+        self._futures = set()   # jobs submitted and not yet finished
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "model_loads": 0,
+            "total_inference_ms": 0.0,
+        }
+
+    def submit(self, audio, model_size=DEFAULT_WHISPER_MODEL, **options):
+        """Queue a transcription and return its future; 503 when the queue is full"""
+        with self._lock:
+            if self._in_flight() >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Voice transcription is busy. Please try again shortly."
+                )
+            future = self._executor.submit(_transcribe_in_worker, audio, model_size, options)
+            self._futures.add(future)
+            self.stats["submitted"] += 1
+        future.add_done_callback(self._record)
+        return future
+
+    def transcribe(self, audio, model_size=DEFAULT_WHISPER_MODEL, **options):
+        """Transcribe and wait for the result"""
+        return self.submit(audio, model_size, **options).result()
+
+    def transcribe_many(self, inputs, model_size=DEFAULT_WHISPER_MODEL, **options):
+        """Transcribe several inputs in parallel, one per worker at a time; results in input order"""
+        results = [None] * len(inputs)
+        pending = {}
+        queue = iter(enumerate(inputs))
+        try:
+            for index, audio in queue:
+                pending[self.submit(audio, model_size, **options)] = index
+                if len(pending) >= self.workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+            for future in list(pending):
+                results[pending.pop(future)] = future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+        return results
+
+    def warm(self, sizes):
+        """Load the given model sizes in every worker"""
+        futures = [self._executor.submit(_warm_worker, tuple(sizes)) for _ in range(self.workers)]
+        return [f.result() for f in futures]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            in_flight = self._in_flight()
+        done = stats["completed"]
+        stats.update({
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight,
+            "queue_depth": max(0, in_flight - self.workers),
+            "avg_inference_ms": round(stats.pop("total_inference_ms") / done, 1) if done else 0.0,
+        })
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _in_flight(self):
+        # Checked against future state rather than a counter so a caller that
+        # has just seen a job finish can submit again before its callback runs
+        self._futures = {f for f in self._futures if not f.done()}
+        return len(self._futures)
+
+    def _record(self, future):
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                self.stats["failed"] += 1
+                return
+            result = future.result()
+            self.stats["completed"] += 1
+            self.stats["total_inference_ms"] += result["inference_ms"]
+            if not result["model_cached"]:
+                self.stats["model_loads"] += 1
+
+
+# Global pool instance
+_whisper_pool = None
+_whisper_pool_lock = threading.Lock()
+
+def get_whisper_pool():
+    """Get the process-wide Whisper pool, creating it on first use"""
+    global _whisper_pool
+    if _whisper_pool is None:
+        with _whisper_pool_lock:
+            if _whisper_pool is None:
+                _whisper_pool = WhisperPool()
+    return _whisper_pool
+
+def warm_whisper_pool():
+    """Load the configured models in every worker (called at startup when WHISPER_WARMUP is set)"""
+    try:
+        loaded = get_whisper_pool().warm(WHISPER_MODELS)
+        logger.info(f"Whisper workers warmed: {loaded}")
+    except Exception as e:
+        logger.error(f"Whisper warmup failed: {e}")
+
+def get_whisper_pool_stats():
+    """Pool metrics, or None if no local transcription has run yet"""
+    return _whisper_pool.get_stats() if _whisper_pool is not None else None
+
+def shutdown_whisper_pool():
+    if _whisper_pool is not None:
+        _whisper_pool.shutdown()
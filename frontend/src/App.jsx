@@ -1,6 +1,7 @@
 import React, { Suspense } from 'react';
 import Routes from './Routes';
 import { LayerProvider } from './contexts/LayerContext';
+import { NotificationProvider } from './contexts/NotificationContext';
 import './i18n'; // Initialize i18n
 
 function App() {
@@ -9,7 +10,9 @@ function App() {
       fallback={<div className="flex items-center justify-center min-h-screen">Loading...</div>}
     >
       <LayerProvider>
-        <Routes />
+        <NotificationProvider>
+          <Routes />
+        </NotificationProvider>
       </LayerProvider>
     </Suspense>
   );
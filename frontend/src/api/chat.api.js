@@ -31,11 +31,30 @@ const chatAPI = {
     });
   },
 
+  // Search the user's chat history (ranked hits with snippets)
+  searchMessages: (query, limit = 20, offset = 0) => {
+    return api.get('/chat/search', {
+      params: { q: query, limit, offset },
+    });
+  },
+
   // Save a message to a session
   saveMessage: (sessionId, messageData) => {
     return api.post(`/chat/sessions/${sessionId}/messages`, messageData);
   },
 
+  // Replay messages queued while offline; each needs a stable clientId
+  syncMessages: (messages) => {
+    return api.post('/chat/sync', {
+      messages: messages.map((m) => ({
+        client_id: m.clientId,
+        session_id: m.sessionId,
+        content: m.content,
+        message_type: m.messageType || 'text',
+      })),
+    });
+  },
+
   // Update session title
   updateSessionTitle: (sessionId, title) => {
     return api.put(`/chat/sessions/${sessionId}`, { title });
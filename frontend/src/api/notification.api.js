@@ -2,11 +2,19 @@ import api from './client';
 
 // Notification API endpoints
 const notificationAPI = {
-  // Get notifications with optional filters
+  // Get notifications with optional filters; pass the previous response's
+  // next_before as `before` to page without an offset
   getNotifications: (params = {}) => {
-    const { limit = 50, offset = 0, unread_only = false } = params;
+    const { limit = 50, offset = 0, unread_only = false, before } = params;
     return api.get('/notifications', {
-      params: { limit, offset, unread_only },
+      params: before != null ? { limit, unread_only, before } : { limit, offset, unread_only },
+    });
+  },
+
+  // Get notifications created, read or deleted since a sync cursor
+  getChanges: (since, limit = 200) => {
+    return api.get('/notifications/changes', {
+      params: since ? { since, limit } : { limit },
     });
   },
 
@@ -35,6 +43,11 @@ const notificationAPI = {
     return api.put('/notifications/mark-all-read');
   },
 
+  // Mark read or delete many notifications: { action: 'read' | 'delete', ids?, unread_only?, type?, disaster_type?, before? }
+  bulkUpdate: (request) => {
+    return api.post('/notifications/bulk', request);
+  },
+
   // Delete a notification
   deleteNotification: (notificationId) => {
     return api.delete(`/notifications/${notificationId}`);
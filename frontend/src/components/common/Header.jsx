@@ -7,7 +7,7 @@ import ProfileDropdown from './ProfileDropdown';
 import ModalsContainer from './ModalsContainer';
 import NotificationSettings from '../../pages/user/NotificationSettings';
 import useUserProfile from '../../hooks/useUserProfile';
-import { useNotifications } from '../../hooks/useNotifications';
+import { useNotificationContext } from '../../contexts/NotificationContext';
 import { useNotificationService } from '../../services/notificationService';
 import { useLayer } from '../../contexts/LayerContext';
 import { useLayerEffects } from '../../hooks/useLayerEffects';
@@ -34,7 +34,7 @@ const Header = () => {
     markAllAsRead,
     deleteNotification,
     clearAll: clearAllNotifications,
-  } = useNotifications();
+  } = useNotificationContext();
 
   const notificationService = useNotificationService();
 
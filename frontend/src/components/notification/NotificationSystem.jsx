@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { Bell } from 'lucide-react';
-import { useNotifications } from '../../hooks/useNotifications';
+import { useNotificationContext } from '../../contexts/NotificationContext';
 import NotificationDropdown from '../ui/NotificationDropdown';
 import SubscriptionBadge from '../ui/SubscriptionBadge';
 
@@ -19,7 +19,7 @@ const NotificationSystem = () => {
     createNotification,
     fetchNotifications,
     clearError,
-  } = useNotifications();
+  } = useNotificationContext();
   // Handle clicks outside the notification dropdown
   useEffect(() => {
     const handleClickOutside = (event) => {
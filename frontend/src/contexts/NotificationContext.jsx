@@ -1,5 +1,6 @@
 import React, { createContext, useContext } from 'react';
 import { useNotifications } from '../hooks/useNotifications';
+import { useAuth } from './AuthContext';
 
 const NotificationContext = createContext();
 
@@ -11,8 +12,11 @@ export const useNotificationContext = () => {
   return context;
 };
 
+// One notification state and push socket for the whole app, reconnected when
+// the signed-in user changes
 export const NotificationProvider = ({ children }) => {
-  const notificationData = useNotifications();
+  const { token } = useAuth();
+  const notificationData = useNotifications(token);
 
   return (
     <NotificationContext.Provider value={notificationData}>{children}</NotificationContext.Provider>
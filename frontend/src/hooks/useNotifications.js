@@ -1,11 +1,17 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { notificationAPI } from '../api';
+import apiClient from '../api/client';
 
-export const useNotifications = () => {
+// Mounted once by NotificationProvider so the app shares one push socket;
+// components read it through useNotificationContext
+export const useNotifications = (token = localStorage.getItem('token')) => {
   const [notifications, setNotifications] = useState([]);
   const [unreadCount, setUnreadCount] = useState(0);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const socketRef = useRef(null);
+  // Delta sync cursor from the last full load; polls fetch only what changed after it
+  const syncCursorRef = useRef(null);
 
   // Fetch notifications - only called when dropdown is opened
   const fetchNotifications = useCallback(async (params = {}) => {
@@ -18,6 +24,7 @@ export const useNotifications = () => {
       });
       setNotifications(response.data.notifications);
       setUnreadCount(response.data.unread_count);
+      syncCursorRef.current = response.data.sync_cursor || null;
     } catch (err) {
       setError(err.response?.data?.detail || 'Failed to fetch notifications');
     } finally {
@@ -35,6 +42,38 @@ export const useNotifications = () => {
     }
   }, []);
 
+  // Apply what changed since the last load instead of downloading the list again
+  const syncNotifications = useCallback(async () => {
+    if (!syncCursorRef.current) {
+      return fetchUnreadCount();
+    }
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const { data } = await notificationAPI.getChanges(syncCursorRef.current);
+        if (data.reset) {
+          syncCursorRef.current = null;
+          return fetchNotifications();
+        }
+        const deleted = new Set(data.deleted);
+        const changed = new Map(data.changes.map((n) => [n.id, n]));
+        setNotifications((prev) => {
+          const kept = prev
+            .filter((n) => !deleted.has(n.id))
+            .map((n) => (changed.has(n.id) ? changed.get(n.id) : n));
+          const known = new Set(prev.map((n) => n.id));
+          const added = data.changes.filter((n) => !known.has(n.id) && !deleted.has(n.id));
+          return [...added.reverse(), ...kept];
+        });
+        setUnreadCount(data.unread_count);
+        syncCursorRef.current = data.cursor;
+        hasMore = data.has_more;
+      }
+    } catch (err) {
+      console.error('Failed to sync notifications:', err);
+    }
+  }, [fetchNotifications, fetchUnreadCount]);
+
   // Mark notification as read with optimistic update
   const markAsRead = useCallback(async (notificationId) => {
     // Optimistic update
@@ -176,14 +215,16 @@ export const useNotifications = () => {
         
         // Only poll if:
         // - User is authenticated
+        // - The push socket is not connected
         // - Document is visible
         // - User was active in the last 5 minutes
         if (
           localStorage.getItem('token') &&
+          socketRef.current?.readyState !== WebSocket.OPEN &&
           isVisible &&
           inactiveTime < 5 * 60 * 1000
         ) {
-          fetchUnreadCount();
+          syncNotifications();
         }
       }, 2 * 60 * 1000); // Poll every 2 minutes instead of 30 seconds
     };
@@ -204,14 +245,111 @@ export const useNotifications = () => {
       document.removeEventListener('keydown', handleUserActivity);
       document.removeEventListener('mousemove', handleUserActivity);
     };
-  }, [fetchUnreadCount]);
+  }, [fetchUnreadCount, syncNotifications]);
+
+  // Push channel: events arrive as they happen, polling above is only the fallback
+  useEffect(() => {
+    if (!token || typeof WebSocket === 'undefined') return undefined;
+
+    let closed = false;
+    let retryTimer;
+    let attempts = 0;
+
+    const connect = () => {
+      const wsBase = apiClient.defaults.baseURL.replace(/^http/, 'ws');
+      const socket = new WebSocket(`${wsBase}/notifications/ws?token=${encodeURIComponent(token)}`);
+      socketRef.current = socket;
+
+      socket.onopen = () => {
+        attempts = 0;
+      };
+
+      socket.onmessage = (event) => {
+        let data;
+        try {
+          data = JSON.parse(event.data);
+        } catch {
+          return;
+        }
+        switch (data.type) {
+          case 'notification_created':
+            setNotifications((prev) => [data.notification, ...prev]);
+            setUnreadCount((prev) => prev + 1);
+            break;
+          case 'notification_updated':
+            // A merged alert: new content and unread again, in place since the
+            // feed keeps its created_at order (the count arrives as unread_count_updated)
+            setNotifications((prev) =>
+              prev.some((n) => n.id === data.notification.id)
+                ? prev.map((n) =>
+                    n.id === data.notification.id
+                      ? { ...data.notification, timestamp: n.timestamp }
+                      : n
+                  )
+                : [data.notification, ...prev]
+            );
+            break;
+          case 'notification_read':
+            setNotifications((prev) =>
+              prev.map((n) => (n.id === data.notification_id ? { ...n, read: true } : n))
+            );
+            break;
+          case 'notification_deleted':
+            setNotifications((prev) => prev.filter((n) => n.id !== data.notification_id));
+            break;
+          case 'notifications_read': {
+            // One chunk of a bulk mark-read; the count arrives as unread_count_updated
+            const ids = new Set(data.notification_ids);
+            setNotifications((prev) => prev.map((n) => (ids.has(n.id) ? { ...n, read: true } : n)));
+            break;
+          }
+          case 'notifications_deleted': {
+            const ids = new Set(data.notification_ids);
+            setNotifications((prev) => prev.filter((n) => !ids.has(n.id)));
+            break;
+          }
+          case 'notifications_cleared':
+            setNotifications([]);
+            setUnreadCount(0);
+            break;
+          case 'unread_count_updated':
+            setUnreadCount(data.count);
+            break;
+          default:
+            break;
+        }
+      };
+
+      socket.onclose = (event) => {
+        socketRef.current = null;
+        if (!closed && event.code !== 1008 && attempts < 5) {
+          retryTimer = setTimeout(connect, Math.min(1000 * 2 ** attempts, 30000));
+          attempts += 1;
+        }
+      };
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      socketRef.current?.close(1000);
+      socketRef.current = null;
+    };
+  }, [token]);
 
-  // Initial unread count fetch - don't fetch all notifications on mount
+  // Initial unread count fetch - don't fetch all notifications on mount;
+  // signing out drops the previous user's notifications
   useEffect(() => {
-    if (localStorage.getItem('token')) {
+    if (token) {
       fetchUnreadCount();
+    } else {
+      setNotifications([]);
+      setUnreadCount(0);
+      syncCursorRef.current = null;
     }
-  }, [fetchUnreadCount]);
+  }, [fetchUnreadCount, token]);
 
   return {
     notifications,
@@ -220,6 +358,7 @@ export const useNotifications = () => {
     error,
     fetchNotifications,
     fetchUnreadCount,
+    syncNotifications,
     markAsRead,
     markAllAsRead,
     deleteNotification,
@@ -107,6 +107,10 @@ const NotificationManagement = () => {
       if (notification.location) {
         params.location = notification.location;
       }
+      // Grouped rows carry the id of the shared message; prefer it over matching text
+      if (notification.message_id) {
+        params.message_id = notification.message_id;
+      }
 
       const response = await adminNotificationAPI.getNotificationUsers(params);
       setNotificationUsers(response.data.users || []);
@@ -66,6 +66,19 @@ class ChatService {
     }
   }
 
+  /**
+   * Search past conversations
+   */
+  async searchMessages(query, limit = 20, offset = 0) {
+    try {
+      const response = await chatAPI.searchMessages(query, limit, offset);
+      return response.data;
+    } catch (error) {
+      console.error('Failed to search messages:', error);
+      throw new Error(error.response?.data?.detail || 'Failed to search messages');
+    }
+  }
+
   /**
    * Send a message and get AI response
    */
@@ -197,6 +210,8 @@ class ChatService {
       createdAt: new Date(session.created_at),
       updatedAt: new Date(session.updated_at),
       messageCount: session.message_count || 0,
+      lastMessageAt: session.last_message_at ? new Date(session.last_message_at) : null,
+      lastMessagePreview: session.last_message_preview || '',
     };
   }
 }